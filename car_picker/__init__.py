@@ -0,0 +1 @@
+"""Car Picker quiz: Streamlit app, metadata builder and benchmarks."""
@@ -0,0 +1,428 @@
+"""Incremental analytics over the quiz logs.
+
+The quiz log is streamed in byte-bounded chunks, so logs larger than memory
+can be processed. Aggregates (answer counts, accuracy per make, confused
+pairs and a response-time quantile sketch) are stored in a checkpoint
+together with the byte offset reached in every CSV file. Re-running only
+reads rows appended since the last run.
+
+Offsets are keyed by inode, so a live file that ``storage`` rotates into a
+segment is resumed where it was left. The number of rows read from each
+file is kept as well: when a partly read file is rotated and compacted
+before the next run, the rows already counted are skipped in its archived
+copy by their ``source_row``. Archived segments that were read in full as
+CSV are skipped entirely.
+
+Usage::
+
+    python -m car_picker.app.analytics [--top 10] [--json] [--reset]
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import math
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from car_picker.app import log_archive, storage
+
+ANALYTICS_DIR = storage.RESULTS_DIR / "analytics"
+CHECKPOINT_PATH = ANALYTICS_DIR / "checkpoint.json"
+# Bytes of CSV parsed at once.
+CHUNK_BYTES = int(
+    os.environ.get("CAR_PICKER_ANALYTICS_CHUNK_BYTES", str(8 * 1024**2))
+)
+# Columns the aggregates need.
+ANALYTICS_COLUMNS = [
+    "is_correct",
+    "response_time_sec",
+    "correct_make_en",
+    "correct_model_en",
+    "correct_year",
+    "selected_make_en",
+    "selected_model_en",
+    "selected_year",
+]
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with logarithmic buckets.
+
+    Every positive value is counted in bucket ``ceil(log_gamma(value))``, so
+    quantiles are returned within relative error ``alpha``. Sketches with
+    the same ``alpha`` merge by adding bucket counts. Values below
+    ``min_value`` are counted as zero.
+    """
+
+    def __init__(self, alpha: float = 0.01, min_value: float = 1e-3) -> None:
+        self.alpha = alpha
+        self.min_value = min_value
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.buckets.values())
+
+    def add_many(self, values: np.ndarray) -> None:
+        values = values[~np.isnan(values)]
+        small = values < self.min_value
+        self.zero_count += int(small.sum())
+        keys = np.ceil(np.log(values[~small]) / self._log_gamma).astype(np.int64)
+        for key, count in zip(*np.unique(keys, return_counts=True)):
+            self.buckets[int(key)] = self.buckets.get(int(key), 0) + int(count)
+
+    def merge(self, other: QuantileSketch) -> None:
+        if other.alpha != self.alpha:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        self.zero_count += other.zero_count
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Return the ``q`` quantile (0..1), or ``None`` for an empty sketch."""
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                return 2 * self.gamma**key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_dict(self) -> dict:
+        return {
+            "alpha": self.alpha,
+            "min_value": self.min_value,
+            "zero_count": self.zero_count,
+            "buckets": {str(key): count for key, count in self.buckets.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> QuantileSketch:
+        sketch = cls(data["alpha"], data["min_value"])
+        sketch.zero_count = data["zero_count"]
+        sketch.buckets = {int(key): count for key, count in data["buckets"].items()}
+        return sketch
+
+
+def _car_keys(frame: pd.DataFrame, prefix: str) -> pd.Series:
+    return (
+        frame[f"{prefix}_make_en"]
+        + " "
+        + frame[f"{prefix}_model_en"]
+        + " "
+        + frame[f"{prefix}_year"]
+    )
+
+
+@dataclass
+class Aggregates:
+    """Running totals over every processed quiz log row."""
+
+    answered: int = 0
+    correct: int = 0
+    # make -> [answered, correct]
+    by_make: Dict[str, List[int]] = field(default_factory=dict)
+    # "correct car\tselected car" -> number of wrong answers
+    confusions: Dict[str, int] = field(default_factory=dict)
+    response_time: QuantileSketch = field(default_factory=QuantileSketch)
+
+    def update(self, frame: pd.DataFrame) -> None:
+        """Fold a chunk of quiz log rows (text columns) into the totals."""
+        if frame.empty:
+            return
+        frame = frame.astype(str)
+        is_correct = pd.to_numeric(frame["is_correct"], errors="coerce").fillna(0)
+        is_correct = is_correct.astype(bool)
+        self.answered += len(frame)
+        self.correct += int(is_correct.sum())
+
+        per_make = is_correct.groupby(frame["correct_make_en"]).agg(["size", "sum"])
+        for make, (answered, correct) in per_make.iterrows():
+            totals = self.by_make.setdefault(make, [0, 0])
+            totals[0] += int(answered)
+            totals[1] += int(correct)
+
+        wrong = frame[~is_correct]
+        if len(wrong):
+            pairs = _car_keys(wrong, "correct") + "\t" + _car_keys(wrong, "selected")
+            for pair, count in pairs.value_counts().items():
+                self.confusions[pair] = self.confusions.get(pair, 0) + int(count)
+
+        times = pd.to_numeric(frame["response_time_sec"], errors="coerce")
+        self.response_time.add_many(times.to_numpy(dtype=float))
+
+    def merge(self, other: Aggregates) -> None:
+        self.answered += other.answered
+        self.correct += other.correct
+        for make, (answered, correct) in other.by_make.items():
+            totals = self.by_make.setdefault(make, [0, 0])
+            totals[0] += answered
+            totals[1] += correct
+        for pair, count in other.confusions.items():
+            self.confusions[pair] = self.confusions.get(pair, 0) + count
+        self.response_time.merge(other.response_time)
+
+    def report(self, top: int = 10) -> dict:
+        """Return the headline numbers as a JSON-serialisable dict."""
+        by_make = sorted(
+            (
+                {"make": make, "answered": answered, "accuracy": correct / answered}
+                for make, (answered, correct) in self.by_make.items()
+            ),
+            key=lambda item: (-item["answered"], item["make"]),
+        )
+        confusions = sorted(
+            self.confusions.items(), key=lambda item: (-item[1], item[0])
+        )
+        return {
+            "answered": self.answered,
+            "accuracy": self.correct / self.answered if self.answered else None,
+            "by_make": by_make[:top],
+            "confused_pairs": [
+                dict(zip(("correct", "selected"), pair.split("\t")), count=count)
+                for pair, count in confusions[:top]
+            ],
+            "response_time_sec": {
+                f"p{round(q * 100)}": self.response_time.quantile(q)
+                for q in (0.5, 0.9, 0.95, 0.99)
+            },
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "answered": self.answered,
+            "correct": self.correct,
+            "by_make": self.by_make,
+            "confusions": self.confusions,
+            "response_time": self.response_time.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> Aggregates:
+        return cls(
+            answered=data["answered"],
+            correct=data["correct"],
+            by_make={make: list(totals) for make, totals in data["by_make"].items()},
+            confusions=dict(data["confusions"]),
+            response_time=QuantileSketch.from_dict(data["response_time"]),
+        )
+
+
+@dataclass
+class Checkpoint:
+    """Aggregates plus how far every log file has been read."""
+
+    aggregates: Aggregates = field(default_factory=Aggregates)
+    # "dev:inode" -> byte offset of the first unread row
+    offsets: Dict[str, int] = field(default_factory=dict)
+    # "dev:inode" -> rows read before that offset
+    rows: Dict[str, int] = field(default_factory=dict)
+    # Stems of segments read as CSV; their archived copies are skipped.
+    segments: List[str] = field(default_factory=list)
+    # Archive files already read.
+    archived: List[str] = field(default_factory=list)
+
+    @classmethod
+    def load(cls, path: Path) -> Checkpoint:
+        if not path.exists():
+            return cls()
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return cls(
+            aggregates=Aggregates.from_dict(data["aggregates"]),
+            offsets=dict(data["offsets"]),
+            rows=dict(data.get("rows", {})),
+            segments=list(data["segments"]),
+            archived=list(data["archived"]),
+        )
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        data = {
+            "aggregates": self.aggregates.to_dict(),
+            "offsets": self.offsets,
+            "rows": self.rows,
+            "segments": self.segments,
+            "archived": self.archived,
+        }
+        tmp_path.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+
+def iter_csv_chunks(
+    path: Path, offset: int, chunk_bytes: int = CHUNK_BYTES
+) -> Iterator[Tuple[pd.DataFrame, int]]:
+    """Yield ``(rows, next_offset)`` for complete rows after byte ``offset``.
+
+    A trailing line without a newline is still being written and is left
+    for the next run.
+    """
+    with path.open("rb") as handle:
+        header = handle.readline()
+        columns = header.decode("utf-8").strip().split(",")
+        offset = max(offset, len(header))
+        handle.seek(offset)
+        pending = b""
+        while True:
+            block = handle.read(chunk_bytes)
+            if not block:
+                return
+            block = pending + block
+            end = block.rfind(b"\n") + 1
+            if end == 0:
+                pending = block
+                continue
+            pending = block[end:]
+            offset += end
+            frame = pd.read_csv(
+                io.BytesIO(block[:end]),
+                names=columns,
+                usecols=ANALYTICS_COLUMNS,
+                dtype=str,
+                keep_default_na=False,
+            )
+            yield frame, offset
+
+
+def _segment_stem(archive_file: Path) -> str:
+    # Archive files are named "<segment stem>-<i>.parquet" by log_archive.
+    return archive_file.stem.rsplit("-", 1)[0]
+
+
+def update(
+    checkpoint: Checkpoint,
+    paths: Optional[Dict[str, Path]] = None,
+    segment_dir: Path = storage.SEGMENT_DIR,
+    archive_dir: Path = log_archive.ARCHIVE_DIR,
+    chunk_bytes: int = CHUNK_BYTES,
+    checkpoint_path: Optional[Path] = None,
+) -> int:
+    """Fold every unread quiz log row into ``checkpoint``; return the count.
+
+    When ``checkpoint_path`` is given the checkpoint is saved after every
+    chunk, so an interrupted run resumes without double counting.
+    """
+    processed = 0
+
+    def commit() -> None:
+        if checkpoint_path is not None:
+            checkpoint.save(checkpoint_path)
+
+    archive_root = archive_dir / "quiz_log"
+    if archive_root.exists():
+        import pyarrow.parquet as pq
+
+        seen_segments = set(checkpoint.segments)
+        seen_files = set(checkpoint.archived)
+        for archive_file in sorted(archive_root.rglob("*.parquet")):
+            name = str(archive_file.relative_to(archive_root))
+            if name in seen_files or _segment_stem(archive_file) in seen_segments:
+                continue
+            parquet = pq.ParquetFile(archive_file)
+            metadata = parquet.schema_arrow.metadata or {}
+            source = metadata.get(log_archive.SOURCE_KEY, b"").decode()
+            # Rows of the segment already read while it was a CSV file.
+            skip = checkpoint.rows.get(source, 0) if source else 0
+            columns = ANALYTICS_COLUMNS
+            if skip:
+                columns = [*columns, log_archive.SOURCE_ROW_COLUMN]
+            for batch in parquet.iter_batches(columns=columns):
+                frame = batch.to_pandas()
+                if skip:
+                    frame = frame[frame[log_archive.SOURCE_ROW_COLUMN] >= skip]
+                checkpoint.aggregates.update(frame)
+                processed += len(frame)
+            checkpoint.archived.append(name)
+            commit()
+
+    segments = set(storage.segment_paths("quiz_log", segment_dir))
+    live_keys = set()
+    for source in storage.csv_sources("quiz_log", paths, segment_dir):
+        stat = source.stat()
+        key = log_archive.source_key(stat)
+        live_keys.add(key)
+        if source in segments and source.stem not in checkpoint.segments:
+            checkpoint.segments.append(source.stem)
+        offset = checkpoint.offsets.get(key, 0)
+        if offset > stat.st_size:
+            # The inode was reused by a new file.
+            offset = 0
+            checkpoint.rows.pop(key, None)
+        for frame, offset in iter_csv_chunks(source, offset, chunk_bytes):
+            checkpoint.aggregates.update(frame)
+            checkpoint.offsets[key] = offset
+            checkpoint.rows[key] = checkpoint.rows.get(key, 0) + len(frame)
+            processed += len(frame)
+            commit()
+
+    # Forget files that were removed; compacted ones were skipped above.
+    checkpoint.offsets = {
+        key: offset for key, offset in checkpoint.offsets.items() if key in live_keys
+    }
+    checkpoint.rows = {
+        key: count for key, count in checkpoint.rows.items() if key in live_keys
+    }
+    commit()
+    return processed
+
+
+def _print_report(report: dict) -> None:
+    accuracy = report["accuracy"]
+    print(f"Answered: {report['answered']}")
+    print(f"Accuracy: {accuracy:.1%}" if accuracy is not None else "Accuracy: -")
+    percentiles = ", ".join(
+        f"{name}={value:.2f}" if value is not None else f"{name}=-"
+        for name, value in report["response_time_sec"].items()
+    )
+    print(f"Response time (s): {percentiles}")
+    print("Accuracy by make:")
+    for item in report["by_make"]:
+        print(f"  {item['make']}: {item['accuracy']:.1%} of {item['answered']}")
+    print("Most confused pairs:")
+    for item in report["confused_pairs"]:
+        print(f"  {item['correct']} -> {item['selected']}: {item['count']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Summarise the quiz logs.")
+    parser.add_argument(
+        "--checkpoint",
+        type=Path,
+        default=CHECKPOINT_PATH,
+        help="Checkpoint file (default: results/analytics/checkpoint.json)",
+    )
+    parser.add_argument(
+        "--reset", action="store_true", help="Ignore the checkpoint and start over"
+    )
+    parser.add_argument("--top", type=int, default=10, help="Rows per ranking")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    checkpoint = Checkpoint() if args.reset else Checkpoint.load(args.checkpoint)
+    processed = update(checkpoint, checkpoint_path=args.checkpoint)
+    report = checkpoint.aggregates.report(args.top)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"Processed {processed} new rows.")
+        _print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Loading of the labelled car catalog used by the quiz.
+
+pandas is imported when a catalog is first loaded, not with this module.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import weakref
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Tuple
+
+from car_picker.app import metrics, options
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Columns a row needs to be usable as a quiz question.
+REQUIRED_COLUMNS = ["image_path", "make_en", "model_en", "year"]
+
+
+def columnar_path(csv_path: Path) -> Path:
+    """Return the Arrow IPC artifact written next to ``csv_path``."""
+    return csv_path.with_suffix(".arrow")
+
+
+def _read_arrow(path: Path) -> pd.DataFrame | None:
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+    # The mapped file backs the table buffers, so it must outlive this call.
+    source = pa.memory_map(str(path), "r")
+    # Dictionary-encoded columns become pandas categoricals.
+    return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def read_catalog(csv_path: Path) -> pd.DataFrame:
+    """Read the raw catalog, preferring an up-to-date columnar artifact."""
+    import pandas as pd
+
+    arrow_path = columnar_path(csv_path)
+    if arrow_path.exists() and (
+        not csv_path.exists()
+        or arrow_path.stat().st_mtime_ns >= csv_path.stat().st_mtime_ns
+    ):
+        df = _read_arrow(arrow_path)
+        if df is not None:
+            return df
+    # Keep every value as text; empty cells stay "" rather than NaN.
+    return pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+
+
+def load_metadata(csv_path: Path) -> pd.DataFrame:
+    """Return the usable catalog rows with a positional index and labels."""
+    import pandas as pd
+
+    df = read_catalog(csv_path)
+    # Drop rows with missing essentials.
+    keep = pd.Series(True, index=df.index)
+    for column in REQUIRED_COLUMNS:
+        keep &= df[column].notna() & (df[column] != "")
+    valid = df[keep]
+
+    if "variant" not in valid:
+        valid = valid.assign(variant="")
+    for ko, en in (("make_ko", "make_en"), ("model_ko", "model_en")):
+        if ko not in valid:
+            valid = valid.assign(**{ko: valid[en]})
+            continue
+        missing = valid[ko].isna() | (valid[ko] == "")
+        if missing.any():
+            valid = valid.assign(
+                **{ko: valid[ko].astype(str).where(~missing, valid[en].astype(str))}
+            )
+
+    # Preserve original index for deterministic lookups.
+    valid = valid.reset_index(drop=True)
+    valid[options.LABEL_COLUMN] = options.build_option_labels(valid)
+    return valid
+
+
+# (mtime_ns, size) of the CSV and of the columnar artifact, 0s when missing.
+CatalogVersion = Tuple[int, int, int, int]
+
+
+def catalog_version(csv_path: Path) -> CatalogVersion:
+    """Return a signature that changes whenever the catalog files change."""
+    signature = []
+    for path in (csv_path, columnar_path(csv_path)):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            signature.extend((0, 0))
+        else:
+            signature.extend((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)  # type: ignore[return-value]
+
+
+@dataclass(eq=False)
+class Catalog:
+    """One loaded version of the catalog and its candidate index."""
+
+    path: Path
+    version: CatalogVersion
+    frame: pd.DataFrame
+    index: options.CatalogIndex
+
+
+class CatalogCache:
+    """Process-wide cache of catalog versions keyed by file signature.
+
+    The latest version of each path is held strongly; older versions are
+    only held weakly, so they are evicted once no session pins them any
+    more. Loading happens under a lock, so concurrent sessions that see a
+    new version trigger a single load.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._latest: Dict[Path, Catalog] = {}
+        self._versions: weakref.WeakValueDictionary[
+            Tuple[Path, CatalogVersion], Catalog
+        ] = weakref.WeakValueDictionary()
+
+    def get(self, csv_path: Path) -> Catalog:
+        """Return the catalog for the current on-disk version of ``csv_path``."""
+        version = catalog_version(csv_path)
+        with self._lock:
+            entry = self._versions.get((csv_path, version))
+            metrics.increment(
+                "catalog_cache_miss" if entry is None else "catalog_cache_hit"
+            )
+            if entry is None:
+                with metrics.timer("load_metadata"):
+                    frame = load_metadata(csv_path)
+                entry = Catalog(
+                    path=csv_path,
+                    version=version,
+                    frame=frame,
+                    index=options.build_catalog_index(frame),
+                )
+                self._versions[(csv_path, version)] = entry
+            self._latest[csv_path] = entry
+        return entry
+
+    def loaded_versions(self) -> int:
+        """Return how many catalog versions are still alive."""
+        return len(self._versions)
+
+
+CATALOG_CACHE = CatalogCache()
@@ -0,0 +1,218 @@
+"""Confusion index built from the quiz logs.
+
+``build`` counts, for every (make, model, year) that was shown, which other
+cars players picked instead, and keeps the top-K with their counts as
+weights. The index is written atomically as JSON; ``ConfusionStore`` reloads
+it when the file changes and resolves it against each catalog version into
+an ``options.ConfusionTable`` used by hard mode.
+
+Usage::
+
+    python -m car_picker.app.confusion [--top-k 8] [--min-support 3]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import threading
+import weakref
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from car_picker.app import analytics, catalog, log_archive, options, storage
+
+CONFUSION_INDEX_PATH = Path(
+    os.environ.get(
+        "CAR_PICKER_CONFUSION_INDEX",
+        str(storage.RESULTS_DIR / "confusion_index.json"),
+    )
+)
+# Confused cars kept per car.
+DEFAULT_TOP_K = 8
+# Wrong answers a car needs before its confusions are used.
+DEFAULT_MIN_SUPPORT = 3
+
+CarKey = Tuple[str, str, str]
+
+
+def _iter_log_frames(
+    paths: Optional[Dict[str, Path]],
+    segment_dir: Path,
+    archive_dir: Path,
+) -> Iterator[pd.DataFrame]:
+    archive_root = archive_dir / "quiz_log"
+    if archive_root.exists():
+        import pyarrow.parquet as pq
+
+        for archive_file in sorted(archive_root.rglob("*.parquet")):
+            parquet = pq.ParquetFile(archive_file)
+            for batch in parquet.iter_batches(columns=analytics.ANALYTICS_COLUMNS):
+                yield batch.to_pandas().astype(str)
+    for source in storage.csv_sources("quiz_log", paths, segment_dir):
+        for frame, _ in analytics.iter_csv_chunks(source, 0):
+            yield frame
+
+
+def count_confusions(frames: Iterator[pd.DataFrame]) -> Dict[CarKey, Counter]:
+    """Count wrong answers per (correct car, selected car).
+
+    Rows whose ``is_correct`` is blank or not a number are skipped.
+    """
+    counts: Dict[CarKey, Counter] = defaultdict(Counter)
+    correct_columns = ["correct_make_en", "correct_model_en", "correct_year"]
+    selected_columns = ["selected_make_en", "selected_model_en", "selected_year"]
+    for frame in frames:
+        is_correct = pd.to_numeric(frame["is_correct"], errors="coerce")
+        wrong = frame[is_correct == 0]
+        if wrong.empty:
+            continue
+        pairs = wrong.groupby(correct_columns + selected_columns).size()
+        for key, count in pairs.items():
+            counts[tuple(key[:3])][tuple(key[3:])] += int(count)
+    return counts
+
+
+def build(
+    top_k: int = DEFAULT_TOP_K,
+    min_support: int = DEFAULT_MIN_SUPPORT,
+    output: Path = CONFUSION_INDEX_PATH,
+    paths: Optional[Dict[str, Path]] = None,
+    segment_dir: Path = storage.SEGMENT_DIR,
+    archive_dir: Path = log_archive.ARCHIVE_DIR,
+) -> int:
+    """Rebuild the confusion index from every quiz log; return its car count."""
+    counts = count_confusions(_iter_log_frames(paths, segment_dir, archive_dir))
+    entries = []
+    for car, selected in sorted(counts.items()):
+        selected.pop(car, None)
+        if sum(selected.values()) < min_support:
+            continue
+        top = sorted(selected.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+        entries.append(
+            {"car": list(car), "confused": [[*other, weight] for other, weight in top]}
+        )
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output.with_name(f".{output.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(
+        json.dumps({"top_k": top_k, "min_support": min_support, "entries": entries}),
+        encoding="utf-8",
+    )
+    os.replace(tmp_path, output)
+    return len(entries)
+
+
+def resolve(entries: List[dict], frame: pd.DataFrame) -> options.ConfusionTable:
+    """Map index entries onto the row positions of one catalog frame."""
+    codes, by_car, cars = options.group_cars(frame)
+    code_of = {
+        car: code
+        for code, car in enumerate(cars.itertuples(index=False, name=None))
+    }
+    neighbors: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+    for entry in entries:
+        code = code_of.get(tuple(entry["car"]))
+        if code is None:
+            continue
+        others, weights = [], []
+        for *other, weight in entry["confused"]:
+            other_code = code_of.get(tuple(other))
+            if other_code is not None and other_code != code:
+                others.append(other_code)
+                weights.append(weight)
+        if others:
+            probabilities = np.asarray(weights, dtype=float)
+            neighbors[code] = (
+                np.asarray(others, dtype=np.int64),
+                probabilities / probabilities.sum(),
+            )
+    return options.ConfusionTable(
+        car_codes=codes,
+        by_car=by_car,
+        neighbors=neighbors,
+    )
+
+
+class ConfusionStore:
+    """Process-wide holder of the confusion index.
+
+    The file signature is checked on every ``get``; a rebuilt index is read
+    once and swapped in under the lock, so sessions see either the old or
+    the new index, never a mix. Resolved tables are cached per catalog.
+    """
+
+    def __init__(self, path: Path = CONFUSION_INDEX_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._signature: Optional[Tuple[int, int]] = None
+        self._entries: Optional[List[dict]] = None
+        self._tables: weakref.WeakKeyDictionary[
+            catalog.Catalog, options.ConfusionTable
+        ] = weakref.WeakKeyDictionary()
+
+    def _current_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(
+        self, session_catalog: catalog.Catalog
+    ) -> Optional[options.ConfusionTable]:
+        """Return the table for ``session_catalog``; ``None`` without an index."""
+        signature = self._current_signature()
+        with self._lock:
+            if signature != self._signature:
+                entries = None
+                if signature is not None:
+                    data = json.loads(self.path.read_text(encoding="utf-8"))
+                    entries = data["entries"]
+                self._entries = entries
+                self._signature = signature
+                self._tables = weakref.WeakKeyDictionary()
+            if self._entries is None:
+                return None
+            table = self._tables.get(session_catalog)
+            if table is None:
+                table = resolve(self._entries, session_catalog.frame)
+                self._tables[session_catalog] = table
+        return table
+
+
+CONFUSION_STORE = ConfusionStore()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Build the confusion index used by hard mode."
+    )
+    parser.add_argument(
+        "--top-k", type=int, default=DEFAULT_TOP_K, help="Confused cars kept per car"
+    )
+    parser.add_argument(
+        "--min-support",
+        type=int,
+        default=DEFAULT_MIN_SUPPORT,
+        help="Wrong answers a car needs before it gets an entry",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=CONFUSION_INDEX_PATH,
+        help="Index file (default: results/confusion_index.json)",
+    )
+    args = parser.parse_args()
+
+    count = build(args.top_k, args.min_support, args.output)
+    print(f"Wrote confusion index for {count} cars to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+"""Width-bounded image renditions served by the quiz.
+
+Originals under ``dataset/`` are much larger than the column they are shown
+in, so the app serves JPEG renditions capped at ``RENDITION_WIDTH`` pixels.
+Renditions live in an on-disk cache with size-bounded LRU eviction and are
+created lazily on first view or ahead of time by ``build_metadata.py``.
+Originals are read from the packed shards (``app.shards``) when present and
+from the loose files under ``dataset/`` otherwise. Renditions themselves
+are not packed: a byte-cache miss still reads one rendition file.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Union
+
+from car_picker.app import metrics, shards
+
+DATASET_DIR = Path(__file__).resolve().parents[1] / "dataset"
+RENDITION_DIR = Path(__file__).resolve().parents[1] / "cache" / "renditions"
+# Maximum rendition width in pixels.
+RENDITION_WIDTH = int(os.environ.get("CAR_PICKER_RENDITION_WIDTH", "960"))
+# Upper bound on the total size of cached renditions.
+RENDITION_BUDGET_BYTES = int(
+    os.environ.get("CAR_PICKER_RENDITION_BUDGET_BYTES", str(2 * 1024**3))
+)
+JPEG_QUALITY = 85
+# EXIF tag holding how the stored pixels must be rotated or mirrored.
+EXIF_ORIENTATION = 0x0112
+# Threads shared by every session for background image prefetching.
+PREFETCH_WORKERS = int(os.environ.get("CAR_PICKER_PREFETCH_WORKERS", "4"))
+# Prefetches queued or running at once; further requests are dropped.
+PREFETCH_MAX_IN_FLIGHT = int(os.environ.get("CAR_PICKER_PREFETCH_MAX_IN_FLIGHT", "16"))
+# Memory budget of the process-wide encoded image byte cache.
+IMAGE_CACHE_BYTES = int(
+    os.environ.get("CAR_PICKER_IMAGE_CACHE_BYTES", str(256 * 1024**2))
+)
+
+
+def rendition_path(
+    image_path: str, version: str, width: int, cache_dir: Path = RENDITION_DIR
+) -> Path:
+    """Return where the ``width`` rendition of ``image_path`` is stored.
+
+    ``version`` is the original's ``source_version``, so a replaced original
+    gets a new rendition and the stale one ages out of the LRU.
+    """
+    return cache_dir / f"w{width}" / f"{image_path}.{version}.jpg"
+
+
+# An original image: its loose file, or its bytes read from a shard.
+Original = Union[Path, bytes]
+
+
+def read_original(
+    image_path: str,
+    dataset_dir: Path = DATASET_DIR,
+    store: Optional[shards.ShardStore] = None,
+) -> Original:
+    """Locate the original of ``image_path``, preferring the packed shards.
+
+    Raises ``FileNotFoundError`` when it is neither packed nor on disk.
+    """
+    try:
+        data = (store if store is not None else shards.SHARDS).get(image_path)
+    except (OSError, ValueError):
+        data = None
+    if data is not None:
+        metrics.increment("shard_hit")
+        return data
+    source = dataset_dir / image_path
+    if not source.exists():
+        raise FileNotFoundError(f"Image not found: {source}")
+    return source
+
+
+def source_version(
+    image_path: str,
+    dataset_dir: Path = DATASET_DIR,
+    store: Optional[shards.ShardStore] = None,
+) -> Optional[str]:
+    """Return a short tag that changes whenever the original is replaced.
+
+    Packed originals are tagged by their pack, loose files by size and
+    mtime. Returns None when the original does not exist.
+    """
+    try:
+        tag = (store if store is not None else shards.SHARDS).pack_id(image_path)
+    except (OSError, ValueError):
+        tag = None
+    if tag is None:
+        try:
+            stat = os.stat(dataset_dir / image_path)
+        except OSError:
+            return None
+        tag = f"{stat.st_size}-{stat.st_mtime_ns}"
+    return hashlib.blake2b(tag.encode("utf-8"), digest_size=4).hexdigest()
+
+
+def _render_errors() -> tuple[type[Exception], ...]:
+    """Return what ``render_rendition`` raises for originals it cannot decode."""
+    from PIL import Image
+
+    return (OSError, ValueError, Image.DecompressionBombError)
+
+
+def render_rendition(source: Original, target: Path, width: int) -> int:
+    """Write a JPEG of ``source`` at most ``width`` pixels wide to ``target``.
+
+    The original's EXIF orientation is applied. Returns the size of the
+    written file in bytes.
+    """
+    from PIL import Image, ImageOps
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    try:
+        with Image.open(source) as image:
+            # The output carries no EXIF, so apply the orientation tag here.
+            # Orientations 5-8 store the pixels with width and height swapped.
+            orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+            shown_width = image.height if orientation in (5, 6, 7, 8) else image.width
+            scale = min(1.0, width / max(shown_width, 1))
+            # Let the JPEG decoder downscale while decoding when it can.
+            image.draft(
+                "RGB",
+                (max(1, int(image.width * scale)), max(1, int(image.height * scale))),
+            )
+            image = ImageOps.exif_transpose(image)
+            if image.width > width:
+                height = max(1, round(image.height * width / image.width))
+                image = image.resize((width, height), Image.Resampling.LANCZOS)
+            image.convert("RGB").save(
+                tmp_path, "JPEG", quality=JPEG_QUALITY, optimize=True
+            )
+        os.replace(tmp_path, target)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return target.stat().st_size
+
+
+class RenditionCache:
+    """On-disk rendition cache with size-bounded LRU eviction.
+
+    Recency is tracked in memory only, so a hit touches no file. File mtimes
+    record when each rendition was written, and a restarted process evicts
+    the oldest renders first. The existing cache is indexed on a background
+    thread; until it is, renditions are looked up on disk and nothing is
+    evicted.
+    """
+
+    def __init__(
+        self,
+        dataset_dir: Path = DATASET_DIR,
+        cache_dir: Path = RENDITION_DIR,
+        width: int = RENDITION_WIDTH,
+        budget_bytes: int = RENDITION_BUDGET_BYTES,
+        store: Optional[shards.ShardStore] = None,
+    ) -> None:
+        self.dataset_dir = dataset_dir
+        self.store = store
+        self.cache_dir = cache_dir
+        self.width = width
+        self.budget_bytes = budget_bytes
+        self._lock = threading.Lock()
+        # Renditions used by this process, most recent last; once the cache
+        # has been indexed, every rendition on disk.
+        self._entries: OrderedDict[Path, int] = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+        self._loader: Optional[threading.Thread] = None
+
+    def _load_entries(self) -> None:
+        """Index the renditions on disk, oldest first, without the lock held."""
+        found = []
+        root = self.cache_dir / f"w{self.width}"
+        if root.exists():
+            for path in root.rglob("*.jpg"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime_ns, path, stat.st_size))
+        found.sort()
+        with self._lock:
+            # Renditions used while scanning are the most recent ones.
+            recent = self._entries
+            entries = OrderedDict(
+                (path, size) for _, path, size in found if path not in recent
+            )
+            entries.update(recent)
+            self._entries = entries
+            self._total_bytes = sum(entries.values())
+            self._loaded = True
+            self._evict()
+
+    def _start_loading(self) -> None:
+        if self._loader is None:
+            self._loader = threading.Thread(
+                target=self._load_entries, name="rendition-index", daemon=True
+            )
+            self._loader.start()
+
+    def _evict(self) -> None:
+        entries = self._entries
+        while (
+            self._loaded and self._total_bytes > self.budget_bytes and len(entries) > 1
+        ):
+            path, size = entries.popitem(last=False)
+            self._total_bytes -= size
+            path.unlink(missing_ok=True)
+
+    def _record(self, target: Path, size: int) -> None:
+        with self._lock:
+            self._total_bytes += size - self._entries.pop(target, 0)
+            self._entries[target] = size
+            self._evict()
+
+    def _forget(self, target: Path) -> None:
+        with self._lock:
+            self._total_bytes -= self._entries.pop(target, 0)
+
+    def get(self, image_path: str) -> Original:
+        """Return the rendition of ``image_path``, creating it if needed.
+
+        Originals that cannot be rendered are returned as they are. Raises
+        ``FileNotFoundError`` when the original image does not exist. Another
+        process may evict the returned rendition; ``read`` renders it again.
+        """
+        version = source_version(image_path, self.dataset_dir, self.store)
+        if version is None:
+            raise FileNotFoundError(f"Image not found: {self.dataset_dir / image_path}")
+        target = rendition_path(image_path, version, self.width, self.cache_dir)
+        with self._lock:
+            self._start_loading()
+            cached = target in self._entries
+            if cached:
+                self._entries.move_to_end(target)
+            loaded = self._loaded
+        if cached:
+            metrics.increment("rendition_hit")
+            return target
+        if not loaded:
+            # Until the index is loaded, any rendition on disk may be a hit.
+            try:
+                size = target.stat().st_size
+            except FileNotFoundError:
+                pass
+            else:
+                self._record(target, size)
+                metrics.increment("rendition_hit")
+                return target
+
+        source = read_original(image_path, self.dataset_dir, self.store)
+        metrics.increment("rendition_render")
+        try:
+            size = render_rendition(source, target, self.width)
+        except _render_errors():
+            # Unreadable or unsupported originals are served as they are.
+            return source
+        self._record(target, size)
+        return target
+
+    def read(self, image_path: str) -> bytes:
+        """Return the bytes served for ``image_path``."""
+        found = self.get(image_path)
+        if isinstance(found, bytes):
+            return found
+        try:
+            return found.read_bytes()
+        except FileNotFoundError:
+            # Evicted by another process since it was indexed; render it again.
+            self._forget(found)
+            found = self.get(image_path)
+            return found if isinstance(found, bytes) else found.read_bytes()
+
+    def prune(self) -> None:
+        """Index the cache and evict the least recently used renditions."""
+        self._load_entries()
+
+
+def _render_if_missing(args: tuple[str, Path, Path, Path, int]) -> None:
+    image_path, dataset_dir, shard_dir, cache_dir, width = args
+    store = shards.open_store(shard_dir)
+    version = source_version(image_path, dataset_dir, store)
+    if version is None:
+        return
+    target = rendition_path(image_path, version, width, cache_dir)
+    if target.exists():
+        return
+    try:
+        render_rendition(read_original(image_path, dataset_dir, store), target, width)
+    except _render_errors():
+        pass
+
+
+def pregenerate(
+    image_paths: Iterable[str],
+    dataset_dir: Path = DATASET_DIR,
+    cache_dir: Path = RENDITION_DIR,
+    width: int = RENDITION_WIDTH,
+    workers: int = os.cpu_count() or 1,
+    shard_dir: Path = shards.SHARD_DIR,
+) -> None:
+    """Render missing renditions for ``image_paths`` on a process pool."""
+    jobs = (
+        (
+            image_path,
+            dataset_dir,
+            shard_dir,
+            cache_dir,
+            width,
+        )
+        for image_path in image_paths
+    )
+    if workers <= 1:
+        for job in jobs:
+            _render_if_missing(job)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for _ in pool.map(_render_if_missing, jobs, chunksize=64):
+                pass
+    RenditionCache(dataset_dir, cache_dir, width).prune()
+
+
+class ImageByteCache:
+    """Thread-safe LRU cache of encoded image bytes keyed by ``image_path``.
+
+    Entries are only added after the file was read successfully, so hits are
+    served without touching the filesystem. The total size is kept within
+    ``budget_bytes``; ``hits`` and ``misses`` count ``get`` lookups.
+    """
+
+    def __init__(self, budget_bytes: int = IMAGE_CACHE_BYTES) -> None:
+        self.budget_bytes = budget_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._total_bytes = 0
+
+    def __contains__(self, image_path: str) -> bool:
+        with self._lock:
+            return image_path in self._entries
+
+    def get(self, image_path: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._entries.get(image_path)
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(image_path)
+            return data
+
+    def put(self, image_path: str, data: bytes) -> None:
+        if len(data) > self.budget_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(image_path, b"")
+            self._total_bytes += len(data) - len(previous)
+            self._entries[image_path] = data
+            while self._total_bytes > self.budget_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "budget_bytes": self.budget_bytes,
+            }
+
+
+class Prefetcher:
+    """Load renditions into the byte cache on a shared thread pool.
+
+    At most ``max_in_flight`` loads are queued or running; requests beyond
+    that are dropped rather than queued. ``take`` lets a request for an
+    image that is being loaded wait for that load instead of repeating it.
+    """
+
+    def __init__(
+        self,
+        renditions: RenditionCache,
+        cache: ImageByteCache,
+        workers: int = PREFETCH_WORKERS,
+        max_in_flight: int = PREFETCH_MAX_IN_FLIGHT,
+    ) -> None:
+        self.renditions = renditions
+        self.cache = cache
+        self.max_in_flight = max_in_flight
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="image-prefetch"
+        )
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+
+    def prefetch(self, image_path: str) -> bool:
+        """Schedule ``image_path`` to be loaded; return whether it was queued."""
+        if image_path in self.cache:
+            return False
+        with self._lock:
+            if image_path in self._in_flight:
+                return False
+            if len(self._in_flight) >= self.max_in_flight:
+                metrics.increment("prefetch_dropped")
+                return False
+            # Submitted under the lock, so the load cannot finish and remove
+            # its entry before it was added.
+            self._in_flight[image_path] = self._pool.submit(self._load, image_path)
+        return True
+
+    def take(self, image_path: str) -> Optional[bytes]:
+        """Wait for the in-flight load of ``image_path`` and return its bytes.
+
+        A load that has not started yet is cancelled instead, so the caller
+        loads the image itself. Returns None when no load was in flight, it
+        was cancelled, or it failed.
+        """
+        with self._lock:
+            future = self._in_flight.get(image_path)
+            if future is None:
+                return None
+            if future.cancel():
+                del self._in_flight[image_path]
+                return None
+        metrics.increment("prefetch_wait")
+        return future.result()
+
+    def _load(self, image_path: str) -> Optional[bytes]:
+        try:
+            data = self.renditions.read(image_path)
+        except Exception:
+            # The request path loads the image again and reports failures;
+            # nothing to warm here.
+            metrics.increment("prefetch_error")
+            return None
+        else:
+            self.cache.put(image_path, data)
+            return data
+        finally:
+            with self._lock:
+                self._in_flight.pop(image_path, None)
+
+
+def load_image_bytes(image_path: str) -> bytes:
+    """Return the display bytes for ``image_path``, reading disk only on a miss."""
+    data = IMAGE_CACHE.get(image_path)
+    metrics.increment("image_cache_miss" if data is None else "image_cache_hit")
+    if data is None:
+        data = PREFETCHER.take(image_path)
+    if data is None:
+        data = RENDITIONS.read(image_path)
+        IMAGE_CACHE.put(image_path, data)
+    return data
+
+
+RENDITIONS = RenditionCache()
+IMAGE_CACHE = ImageByteCache()
+PREFETCHER = Prefetcher(RENDITIONS, IMAGE_CACHE)
@@ -0,0 +1,214 @@
+"""Columnar archive of closed quiz log segments.
+
+``compact`` turns the CSV segments rotated out by ``storage.CsvBackend`` into
+zstd-compressed Parquet files partitioned by UTC date and difficulty.
+``scan_logs`` reads the archive together with the segments that are not
+compacted yet and the live CSV, loading only the requested columns and
+partitions from the archive.
+
+Archived quiz log rows keep their position in the segment (``source_row``)
+and every file records the segment's inode, so incremental readers that
+had read part of the segment as CSV can skip those rows.
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+
+from car_picker.app import storage
+
+ARCHIVE_DIR = storage.RESULTS_DIR / "archive"
+PARTITION_COLUMNS = ["date", "difficulty"]
+# Difficulty of quiz_log rows whose session has no summary (yet).
+UNKNOWN_DIFFICULTY = "unknown"
+# Row number of an archived row within its segment, counted from 0.
+SOURCE_ROW_COLUMN = "source_row"
+# Parquet metadata key holding the ``source_key`` of the archived segment.
+SOURCE_KEY = b"car_picker.source"
+
+
+def source_key(stat: os.stat_result) -> str:
+    """Return the ``"dev:inode"`` key identifying a log file across renames."""
+    return f"{stat.st_dev}:{stat.st_ino}"
+
+
+_PANDAS_TYPES = {"INTEGER": "Int64", "REAL": "float64"}
+
+
+def _typed(frame: pd.DataFrame) -> pd.DataFrame:
+    """Convert numeric log columns from text; blanks become missing values."""
+    for column in frame.columns:
+        sql_type = storage.SQLITE_COLUMN_TYPES.get(column)
+        if sql_type is not None:
+            values = pd.to_numeric(frame[column], errors="coerce")
+            frame[column] = values.astype(_PANDAS_TYPES[sql_type])
+    return frame
+
+
+def _read_csv(path: Path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    return pd.read_csv(path, dtype=str, keep_default_na=False, usecols=columns)
+
+
+def _session_difficulties(
+    paths: Optional[Dict[str, Path]],
+    segment_dir: Path,
+    archive_dir: Path,
+) -> Dict[str, str]:
+    summaries = scan_logs(
+        "summary",
+        columns=["session_id", "difficulty"],
+        paths=paths,
+        segment_dir=segment_dir,
+        archive_dir=archive_dir,
+    )
+    return dict(zip(summaries["session_id"], summaries["difficulty"]))
+
+
+def _add_partitions(
+    table: str, frame: pd.DataFrame, difficulties: Optional[Dict[str, str]]
+) -> pd.DataFrame:
+    frame["date"] = frame["timestamp"].str.slice(0, 10)
+    if table == "summary":
+        difficulty = frame["difficulty"]
+    else:
+        difficulty = frame["session_id"].map(difficulties or {})
+    frame["difficulty"] = difficulty.fillna("").replace("", UNKNOWN_DIFFICULTY)
+    return frame
+
+
+def compact(
+    table: str,
+    paths: Optional[Dict[str, Path]] = None,
+    segment_dir: Path = storage.SEGMENT_DIR,
+    archive_dir: Path = ARCHIVE_DIR,
+) -> int:
+    """Move the closed segments of ``table`` into the Parquet archive.
+
+    Each segment becomes one file per (date, difficulty) partition named
+    after the segment, so re-running after an interruption overwrites
+    rather than duplicates. Rows carry ``SOURCE_ROW_COLUMN`` and files the
+    segment's ``source_key``. Segments are deleted once written. Returns
+    the number of archived rows.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    segments = storage.segment_paths(table, segment_dir)
+    difficulties = None
+    if table == "quiz_log" and segments:
+        difficulties = _session_difficulties(paths, segment_dir, archive_dir)
+
+    archived = 0
+    for segment in segments:
+        key = source_key(segment.stat())
+        frame = _typed(_read_csv(segment))
+        if len(frame):
+            frame = _add_partitions(table, frame, difficulties)
+            frame[SOURCE_ROW_COLUMN] = range(len(frame))
+            arrow_table = pa.Table.from_pandas(frame, preserve_index=False)
+            arrow_table = arrow_table.replace_schema_metadata(
+                {**(arrow_table.schema.metadata or {}), SOURCE_KEY: key.encode()}
+            )
+            pq.write_to_dataset(
+                arrow_table,
+                root_path=str(archive_dir / table),
+                partition_cols=PARTITION_COLUMNS,
+                basename_template=f"{segment.stem}-{{i}}.parquet",
+                existing_data_behavior="overwrite_or_ignore",
+                compression="zstd",
+            )
+            archived += len(frame)
+        segment.unlink()
+    return archived
+
+
+def _scan_archive(
+    root: Path,
+    columns: List[str],
+    start_date: Optional[str],
+    end_date: Optional[str],
+    difficulties: Optional[Sequence[str]],
+) -> Optional[pd.DataFrame]:
+    if not root.exists():
+        return None
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    partitioning = ds.partitioning(
+        pa.schema([(column, pa.string()) for column in PARTITION_COLUMNS]),
+        flavor="hive",
+    )
+    dataset = ds.dataset(str(root), format="parquet", partitioning=partitioning)
+    condition = None
+    for expression in (
+        ds.field("date") >= start_date if start_date else None,
+        ds.field("date") <= end_date if end_date else None,
+        ds.field("difficulty").isin(list(difficulties)) if difficulties else None,
+    ):
+        if expression is not None:
+            condition = expression if condition is None else condition & expression
+    return dataset.to_table(columns=columns, filter=condition).to_pandas()
+
+
+def scan_logs(
+    table: str,
+    columns: Optional[Sequence[str]] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    difficulties: Optional[Sequence[str]] = None,
+    *,
+    paths: Optional[Dict[str, Path]] = None,
+    segment_dir: Path = storage.SEGMENT_DIR,
+    archive_dir: Path = ARCHIVE_DIR,
+) -> pd.DataFrame:
+    """Return rows of ``table`` from the archive, closed segments and live CSV.
+
+    ``columns`` may include the ``date`` and ``difficulty`` partition
+    columns. Dates are inclusive ``YYYY-MM-DD`` bounds on the UTC date of
+    ``timestamp``. Only the needed columns and partitions of the archive
+    are read; CSV sources are filtered after reading.
+    """
+    wanted = list(columns) if columns is not None else [
+        *storage.TABLES[table],
+        *PARTITION_COLUMNS,
+    ]
+    frames = []
+    archived = _scan_archive(
+        archive_dir / table, wanted, start_date, end_date, difficulties
+    )
+    if archived is not None:
+        frames.append(archived)
+
+    sources = storage.csv_sources(table, paths, segment_dir)
+    needs_partitions = bool(
+        start_date or end_date or difficulties or set(wanted) & set(PARTITION_COLUMNS)
+    )
+    read_columns = [c for c in storage.TABLES[table] if c in wanted]
+    if needs_partitions:
+        extra = ["timestamp", "difficulty" if table == "summary" else "session_id"]
+        read_columns = list(dict.fromkeys([*read_columns, *extra]))
+    session_difficulty = None
+    if sources and table == "quiz_log" and needs_partitions:
+        session_difficulty = _session_difficulties(paths, segment_dir, archive_dir)
+
+    for source in sources:
+        frame = _typed(_read_csv(source, read_columns))
+        if needs_partitions:
+            frame = _add_partitions(table, frame, session_difficulty)
+            keep = pd.Series(True, index=frame.index)
+            if start_date:
+                keep &= frame["date"] >= start_date
+            if end_date:
+                keep &= frame["date"] <= end_date
+            if difficulties:
+                keep &= frame["difficulty"].isin(list(difficulties))
+            frame = frame[keep]
+        frames.append(frame[wanted])
+
+    if not frames:
+        return pd.DataFrame(columns=wanted)
+    return _typed(pd.concat(frames, ignore_index=True))
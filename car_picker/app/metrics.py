@@ -0,0 +1,228 @@
+"""Lightweight timing and counter instrumentation.
+
+Enabled with ``CAR_PICKER_METRICS=1``. Phase timings are aggregated into
+histograms and counters track cache hits and misses; ``end_rerun`` also
+returns the timings of the rerun that ran on the calling thread, which
+the app keeps per browser session for its debug panel. The
+registry is exported either as Prometheus text (rewritten at most every
+``EXPORT_INTERVAL_SEC``) or as JSON lines (one line per rerun) under
+``results/metrics/``, one file per process.
+
+When disabled, ``timer`` returns a shared no-op context manager and
+``increment``/``observe`` return after a single flag check.
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("CAR_PICKER_METRICS", "0").lower() in ("1", "true", "yes")
+# "prometheus" or "jsonl".
+EXPORT_FORMAT = os.environ.get("CAR_PICKER_METRICS_FORMAT", "prometheus")
+METRICS_DIR = Path(
+    os.environ.get(
+        "CAR_PICKER_METRICS_DIR",
+        str(Path(__file__).resolve().parents[1] / "results" / "metrics"),
+    )
+)
+# Minimum seconds between two Prometheus exports.
+EXPORT_INTERVAL_SEC = float(os.environ.get("CAR_PICKER_METRICS_INTERVAL", "5"))
+# Histogram bucket upper bounds in seconds.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations in seconds."""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Return the upper bound of the bucket holding the ``q`` quantile."""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip((*BUCKETS, float("inf")), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    """Thread-safe histograms and counters plus per-thread rerun timings."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+        self._local = threading.local()
+        self._last_export = 0.0
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+        phases = getattr(self._local, "phases", None)
+        if phases is not None:
+            phases[name] = phases.get(name, 0.0) + seconds
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def begin_rerun(self) -> None:
+        self._local.phases = {}
+        self._local.started = time.perf_counter()
+
+    def end_rerun(self) -> Dict[str, float]:
+        """Close the current rerun and return its phase timings."""
+        phases = getattr(self._local, "phases", None)
+        if phases is None:
+            return {}
+        self._local.phases = None
+        phases["rerun"] = time.perf_counter() - self._local.started
+        self.observe("rerun", phases["rerun"])
+        return phases
+
+    def counter_values(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+    def summary(self) -> List[Dict[str, object]]:
+        """Return count and approximate p50/p95 per phase."""
+        with self._lock:
+            return [
+                {
+                    "phase": name,
+                    "count": histogram.count,
+                    "p50_ms": (histogram.quantile(0.5) or 0) * 1000,
+                    "p95_ms": (histogram.quantile(0.95) or 0) * 1000,
+                }
+                for name, histogram in sorted(self.histograms.items())
+            ]
+
+    def to_prometheus(self) -> str:
+        metric = "car_picker_phase_seconds"
+        lines = [f"# TYPE {metric} histogram"]
+        with self._lock:
+            for name, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip((*BUCKETS, "+Inf"), histogram.counts):
+                    cumulative += count
+                    labels = f'phase="{name}",le="{bound}"'
+                    lines.append(f"{metric}_bucket{{{labels}}} {cumulative}")
+                lines.append(f'{metric}_sum{{phase="{name}"}} {histogram.total}')
+                lines.append(f'{metric}_count{{phase="{name}"}} {histogram.count}')
+            lines.append("# TYPE car_picker_events_total counter")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'car_picker_events_total{{event="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, phases: Dict[str, float], directory: Path = METRICS_DIR) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        if EXPORT_FORMAT == "jsonl":
+            record = {
+                "timestamp": time.time(),
+                "pid": os.getpid(),
+                "phases": phases,
+            }
+            path = directory / f"metrics-{os.getpid()}.jsonl"
+            with path.open("a", encoding="utf-8") as handle:
+                handle.write(json.dumps(record) + "\n")
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_export < EXPORT_INTERVAL_SEC:
+                return
+            self._last_export = now
+        path = directory / f"metrics-{os.getpid()}.prom"
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        tmp_path.write_text(self.to_prometheus(), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+
+REGISTRY = MetricsRegistry()
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> _Timer:
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        REGISTRY.observe(self.name, time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> _NullTimer:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        return None
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name: str):
+    """Return a context manager that records the duration of phase ``name``."""
+    return _Timer(name) if ENABLED else _NULL_TIMER
+
+
+def observe(name: str, seconds: float) -> None:
+    if ENABLED:
+        REGISTRY.observe(name, seconds)
+
+
+def increment(name: str, amount: int = 1) -> None:
+    if ENABLED:
+        REGISTRY.increment(name, amount)
+
+
+def begin_rerun() -> None:
+    if ENABLED:
+        REGISTRY.begin_rerun()
+
+
+def end_rerun() -> Dict[str, float]:
+    """Finish the current rerun, export the registry and return its timings."""
+    if not ENABLED:
+        return {}
+    phases = REGISTRY.end_rerun()
+    try:
+        REGISTRY.export(phases)
+    except Exception:
+        # Runs in the app's ``finally``; a failed export must not end the rerun.
+        logger.exception("Exporting metrics failed")
+        REGISTRY.increment("metrics_export_error")
+    return phases
+
@@ -1,12 +1,44 @@
-"""Utilities for generating quiz options."""
+"""Utilities for generating quiz options.
+
+The sampling core works on NumPy arrays: a ``CatalogIndex`` can be built
+from plain make/model/year arrays with ``index_from_columns`` and options
+drawn for a sequence of labels. pandas is only imported by the helpers that
+take or return frames, so headless tools that stay on arrays never load it.
+"""
 
 from __future__ import annotations
 
 import random
+import sys
 from dataclasses import dataclass
-from typing import Iterable, List, Sequence
+from typing import TYPE_CHECKING, Dict, Iterable, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from car_picker.app import metrics
+
+if TYPE_CHECKING:
+    import pandas as pd
 
-import pandas as pd
+    # A metadata frame or a sequence of display labels indexed by row position.
+    Labels = Union[pd.DataFrame, Sequence[str]]
+
+# Column holding the precomputed display label of each row.
+LABEL_COLUMN = "label"
+# Columns of CatalogIndex.bucket_counts: rows sharing the make, rows of the
+# same model from another year, rows of the same year, and rows of the same
+# year from another make (the year bucket of easy mode).
+SAME_MAKE, SAME_MODEL, SAME_YEAR, OTHER_MAKE_YEAR = range(4)
+# Bucket counts saturate here; no plan asks for more rows from one bucket.
+BUCKET_COUNT_CAP = np.iinfo(np.uint8).max
+# Buckets up to this size are copied and shuffled; larger ones are sampled.
+SMALL_BUCKET = 64
+# Random draws allowed per wanted row before a large bucket is scanned.
+BUCKET_DRAWS_PER_ROW = 8
+# Batches drawn by the rejection-sampling fill before it falls back to a scan.
+FILL_ROUNDS = 4
+# Below this share of acceptable rows the fill scans the catalog directly.
+MIN_FILL_ACCEPTANCE = 0.05
 
 
 @dataclass(frozen=True)
@@ -38,26 +70,520 @@ def build_option_label(row: pd.Series) -> str:
     return " ".join(str(part) for part in components if part)
 
 
-def _candidate_indices(
-    df: pd.DataFrame, mask: pd.Series, exclude: Sequence[int]
-) -> List[int]:
-    indices: List[int] = []
+def _bilingual(ko: pd.Series, en: pd.Series) -> pd.Series:
+    return (ko + "(" + en + ")").where(ko != "", en)
+
+
+def build_option_labels(df: pd.DataFrame) -> pd.Series:
+    """Vectorized ``build_option_label`` for every row of ``df``.
+
+    Rows sharing make, model, year and variant share one interned label, so
+    the result is returned as a categorical Series.
+    """
+    import pandas as pd
+
+    columns = ["make_ko", "make_en", "model_ko", "model_en", "year", "variant"]
+    text = {
+        column: (
+            # Works for categorical columns too, where fillna("") would fail.
+            df[column].astype(str).where(df[column].notna(), "")
+            if column in df
+            else pd.Series("", index=df.index)
+        )
+        for column in columns
+    }
+    parts = [
+        _bilingual(text["make_ko"], text["make_en"]),
+        _bilingual(text["model_ko"], text["model_en"]),
+        text["year"],
+        text["variant"],
+    ]
+    label = parts[0]
+    for part in parts[1:]:
+        label = label + (" " + part).where(part != "", "")
+    return label.str.strip().astype("category")
+
+
+@dataclass(frozen=True)
+class CatalogIndex:
+    """Row positions of the metadata frame grouped by make, model and year.
+
+    Codes are dense integers per row; each ``by_*`` tuple is indexed by the
+    matching code and holds the ascending row positions sharing that value.
+    ``bucket_counts`` holds the saturated size of each distractor bucket per
+    row (see ``SAME_MAKE`` and friends) and ``question_pools`` the rows whose
+    buckets can fill each difficulty's plan.
+    """
+
+    make_codes: np.ndarray
+    model_codes: np.ndarray
+    year_codes: np.ndarray
+    make_model_codes: np.ndarray
+    by_make: Tuple[np.ndarray, ...]
+    by_make_model: Tuple[np.ndarray, ...]
+    by_model: Tuple[np.ndarray, ...]
+    by_year: Tuple[np.ndarray, ...]
+    bucket_counts: np.ndarray
+    question_pools: Dict[str, np.ndarray]
+
+    def __len__(self) -> int:
+        return len(self.make_codes)
+
+
+def _group_positions(codes: np.ndarray, n_groups: int) -> Tuple[np.ndarray, ...]:
+    # A stable sort keeps positions ascending inside every group.
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes, minlength=n_groups)
+    return tuple(np.split(order, np.cumsum(counts)[:-1]))
+
+
+def _factorize(values: object) -> Tuple[np.ndarray, int]:
+    """Return dense integer codes for ``values`` and the number of distinct ones.
+
+    Uses the hash-based ``pandas.factorize`` when pandas is already loaded
+    (it always is for frames) and a sort-based ``np.unique`` otherwise. Only
+    equality of codes matters, so the two numberings are interchangeable.
+    """
+    pd = sys.modules.get("pandas")
+    if pd is not None:
+        # pandas.factorize only takes arrays and Series, not plain sequences.
+        if not hasattr(values, "dtype"):
+            values = np.asarray(values)
+        codes, uniques = pd.factorize(values)
+        return codes, len(uniques)
+    uniques, codes = np.unique(np.asarray(values), return_inverse=True)
+    return codes.reshape(-1), len(uniques)
+
+
+def index_from_columns(
+    make: Sequence[object], model: Sequence[object], year: Sequence[object]
+) -> CatalogIndex:
+    """Group row positions by make, (make, model), model and year.
+
+    Takes one array-like per column, aligned by row position.
+    """
+    make_codes, n_makes = _factorize(make)
+    model_codes, n_models = _factorize(model)
+    year_codes, n_years = _factorize(year)
+    make_model_codes, n_make_models = _factorize(
+        make_codes.astype(np.int64) * max(n_models, 1) + model_codes
+    )
+    bucket_counts = _bucket_counts(
+        make_codes, model_codes, year_codes, n_makes, n_models, n_years
+    )
+
+    return CatalogIndex(
+        make_codes=make_codes,
+        model_codes=model_codes,
+        year_codes=year_codes,
+        make_model_codes=make_model_codes,
+        by_make=_group_positions(make_codes, n_makes),
+        by_make_model=_group_positions(make_model_codes, n_make_models),
+        by_model=_group_positions(model_codes, n_models),
+        by_year=_group_positions(year_codes, n_years),
+        bucket_counts=bucket_counts,
+        question_pools=_question_pools(bucket_counts),
+    )
+
+
+def _bucket_counts(
+    make_codes: np.ndarray,
+    model_codes: np.ndarray,
+    year_codes: np.ndarray,
+    n_makes: int,
+    n_models: int,
+    n_years: int,
+) -> np.ndarray:
+    """Return the ``(rows, 4)`` uint8 bucket sizes seen by the sampler per row."""
+
+    def sizes(codes: np.ndarray, n_groups: int) -> np.ndarray:
+        return np.bincount(codes, minlength=n_groups)[codes]
+
+    model_year, n_model_years = _factorize(
+        model_codes.astype(np.int64) * max(n_years, 1) + year_codes
+    )
+    make_year, n_make_years = _factorize(
+        make_codes.astype(np.int64) * max(n_years, 1) + year_codes
+    )
+    year_sizes = sizes(year_codes, n_years)
+    counts = np.stack(
+        [
+            sizes(make_codes, n_makes) - 1,
+            sizes(model_codes, n_models) - sizes(model_year, n_model_years),
+            year_sizes - 1,
+            year_sizes - sizes(make_year, n_make_years),
+        ],
+        axis=1,
+    )
+    return np.minimum(counts, BUCKET_COUNT_CAP).astype(np.uint8)
+
+
+def _question_pools(bucket_counts: np.ndarray) -> Dict[str, np.ndarray]:
+    """Return, per difficulty, the rows whose buckets cover the whole plan."""
+    pools = {}
+    for difficulty, plan in DIFFICULTY_PLANS.items():
+        year_bucket = OTHER_MAKE_YEAR if difficulty == "easy" else SAME_YEAR
+        feasible = (
+            (bucket_counts[:, SAME_MAKE] >= plan["same_make"])
+            & (bucket_counts[:, SAME_MODEL] >= plan["same_model"])
+            & (bucket_counts[:, year_bucket] >= plan["same_year"])
+        )
+        pools[difficulty] = np.flatnonzero(feasible).astype(np.int32)
+    return pools
+
+
+def question_pool(index: CatalogIndex, difficulty: str, wanted: int) -> np.ndarray:
+    """Return the rows to draw ``wanted`` questions of ``difficulty`` from.
+
+    These are the rows that fill the difficulty's plan from their buckets;
+    when fewer than ``wanted`` rows qualify, every row is returned.
+    """
+    pool = index.question_pools.get(difficulty, index.question_pools["medium"])
+    if len(pool) >= min(wanted, len(index)):
+        return pool
+    return np.arange(len(index), dtype=np.int32)
+
+
+def build_catalog_index(df: pd.DataFrame) -> CatalogIndex:
+    """Build the ``CatalogIndex`` of a metadata frame.
+
+    The frame must use a default ``RangeIndex`` so row positions and index
+    labels coincide, as produced by ``load_metadata``.
+    """
+    import pandas as pd
+
+    if not df.index.equals(pd.RangeIndex(len(df))):
+        raise ValueError("The dataframe must use a default RangeIndex.")
+    return index_from_columns(df["make_en"], df["model_en"], df["year"])
+
+
+@dataclass(frozen=True)
+class ConfusionTable:
+    """Cars players most often confuse with each car, resolved to row positions.
+
+    ``car_codes`` gives the (make, model, year) code of every row and
+    ``by_car`` the ascending row positions of each code. ``neighbors`` maps a
+    car code to the codes of its most-confused cars and their sampling
+    probabilities; cars without enough logged answers are absent.
+    """
+
+    car_codes: np.ndarray
+    by_car: Tuple[np.ndarray, ...]
+    neighbors: Dict[int, Tuple[np.ndarray, np.ndarray]]
+
+
+def group_cars(
+    df: pd.DataFrame,
+) -> Tuple[np.ndarray, Tuple[np.ndarray, ...], pd.DataFrame]:
+    """Group rows by (make, model, year).
+
+    Returns a dense car code per row, the row positions of each code and a
+    frame holding the make, model and year text of each code.
+    """
+    keys = df[["make_en", "model_en", "year"]].astype(str)
+    codes = keys.groupby(list(keys.columns), sort=False).ngroup().to_numpy()
+    _, first_rows = np.unique(codes, return_index=True)
+    cars = keys.iloc[first_rows].reset_index(drop=True)
+    return codes, _group_positions(codes, len(cars)), cars
+
+
+DIFFICULTY_PLANS: Dict[str, Dict[str, int]] = {
+    "easy": {
+        "same_make": 2,
+        "same_model": 1,
+        "same_year": 1,
+    },
+    "medium": {
+        "same_make": 4,
+        "same_model": 2,
+        "same_year": 2,
+    },
+    "hard": {
+        # Drawn from the ConfusionTable when one is given.
+        "confused": 4,
+        "same_make": 6,
+        "same_model": 3,
+        "same_year": 1,
+    },
+}
+
+
+def _candidate_indices(bucket: np.ndarray, exclude: Sequence[int]) -> List[int]:
     excluded = set(exclude)
-    for idx in df[mask].index.tolist():
-        if idx in excluded:
-            continue
-        indices.append(int(idx))
-    return indices
+    return [idx for idx in bucket.tolist() if idx not in excluded]
+
+
+class _OptionSampler:
+    """Draw option rows for one difficulty, sharing scratch state across calls."""
+
+    def __init__(
+        self,
+        index: CatalogIndex,
+        total_options: int,
+        difficulty: str,
+        rng: random.Random,
+        confusion: ConfusionTable | None = None,
+    ) -> None:
+        self.index = index
+        self.confusion = confusion
+        self.total_options = total_options
+        self.difficulty = difficulty
+        self.plan = DIFFICULTY_PLANS.get(difficulty, DIFFICULTY_PLANS["medium"])
+        self.rng = rng
+        self._generator: np.random.Generator | None = None
+        self._taken: np.ndarray | None = None
+        self._make_masks: Dict[int, np.ndarray] = {}
+
+    @property
+    def generator(self) -> np.random.Generator:
+        if self._generator is None:
+            self._generator = np.random.default_rng(self.rng.getrandbits(64))
+        return self._generator
+
+    def _same_make_mask(self, make_code: int) -> np.ndarray:
+        mask = self._make_masks.get(make_code)
+        if mask is None:
+            mask = self.index.make_codes == make_code
+            self._make_masks[make_code] = mask
+        return mask
+
+    def _reject_sample(
+        self, count: int, exclude: set[int], other_make: int | None = None
+    ) -> List[int] | None:
+        """Draw ``count`` distinct rows outside ``exclude`` by rejection sampling.
+
+        With ``other_make`` only rows of other makes are accepted. Returns
+        None when the acceptable rows are too few or too rare, or when
+        ``FILL_ROUNDS`` batches were not enough.
+        """
+        index = self.index
+        n_rows = len(index)
+        available = n_rows - len(exclude)
+        if other_make is not None:
+            make_rows = len(index.by_make[other_make])
+            excluded_same = sum(
+                1 for row in exclude if index.make_codes[row] == other_make
+            )
+            available -= make_rows - excluded_same
+        if available < count or available < n_rows * MIN_FILL_ACCEPTANCE:
+            return None
+
+        acceptance = available / n_rows
+        picked: List[int] = []
+        seen = set(exclude)
+        for _ in range(FILL_ROUNDS):
+            size = int((count - len(picked)) / acceptance * 1.5) + 8
+            draws = self.generator.integers(n_rows, size=size)
+            if other_make is not None:
+                draws = draws[index.make_codes[draws] != other_make]
+            for row in draws.tolist():
+                if row in seen:
+                    continue
+                seen.add(row)
+                picked.append(row)
+                if len(picked) == count:
+                    return picked
+        return None
+
+    def _sample_fill(
+        self, selected: set[int], needed: int, make_code: int
+    ) -> List[int] | None:
+        """Fill without scanning the catalog, or return None to fall back."""
+        if self.difficulty == "easy":
+            return self._reject_sample(needed, selected, other_make=make_code)
+        if self.difficulty != "hard":
+            return self._reject_sample(needed, selected)
+        # Hard mode takes what is left of the make bucket first.
+        candidates = _candidate_indices(self.index.by_make[make_code], selected)
+        count = min(needed, len(candidates))
+        picked = (
+            self.generator.choice(candidates, size=count, replace=False).tolist()
+            if count
+            else []
+        )
+        if count == needed:
+            return picked
+        rest = self._reject_sample(
+            needed - count, selected | set(candidates), other_make=make_code
+        )
+        return None if rest is None else picked + rest
+
+    def _fill_remaining(
+        self, selected: set[int], needed: int, make_code: int
+    ) -> List[int]:
+        """Sample ``needed`` unselected rows, ordered by the difficulty preference.
+
+        Easy mode draws from other manufacturers first and hard mode from the
+        correct manufacturer first; medium samples the whole catalog uniformly.
+        Rows are drawn by rejection sampling; only when that gives up are the
+        candidate pools built by scanning the catalog.
+        """
+        picked = self._sample_fill(selected, needed, make_code)
+        if picked is not None:
+            return picked
+        metrics.increment("option_fill_scan")
+
+        if self._taken is None:
+            self._taken = np.zeros(len(self.index), dtype=bool)
+        taken = self._taken
+        selected_positions = list(selected)
+        taken[selected_positions] = True
+        try:
+            if self.difficulty in ("easy", "hard"):
+                same_make = self._same_make_mask(make_code)
+                preferred = same_make if self.difficulty == "hard" else ~same_make
+                pools = [
+                    np.flatnonzero(preferred & ~taken),
+                    np.flatnonzero(~preferred & ~taken),
+                ]
+            else:
+                pools = [np.flatnonzero(~taken)]
+        finally:
+            taken[selected_positions] = False
+
+        picked: List[int] = []
+        for pool in pools:
+            count = min(needed - len(picked), len(pool))
+            if count <= 0:
+                continue
+            picked.extend(
+                self.generator.choice(pool, size=count, replace=False).tolist()
+            )
+        return picked
+
+    def _add_confused(self, correct_idx: int, selected: set[int], target: int) -> None:
+        """Add up to ``target`` rows of cars players confused with the answer.
+
+        Cars are drawn by weight from the top-K list and a row is picked from
+        each, so the cost is O(K) regardless of the catalog size.
+        """
+        table = self.confusion
+        if table is None or target <= 0:
+            return
+        entry = table.neighbors.get(int(table.car_codes[correct_idx]))
+        if entry is None:
+            return
+        cars, probabilities = entry
+        count = min(target, len(cars))
+        drawn = self.generator.choice(cars, size=count, replace=False, p=probabilities)
+        for car in drawn.tolist():
+            rows = table.by_car[car]
+            row_idx = int(rows[self.generator.integers(len(rows))])
+            selected.add(row_idx)
+            if len(selected) >= self.total_options:
+                return
+
+    def sample(self, correct_idx: int) -> List[int]:
+        """Return shuffled option row positions including ``correct_idx``."""
+        index = self.index
+        rng = self.rng
+        total_options = self.total_options
+        plan = self.plan
+        selected_set = {correct_idx}
+        make_code = int(index.make_codes[correct_idx])
+        year_code = int(index.year_codes[correct_idx])
+
+        def try_add(
+            bucket: np.ndarray,
+            target: int,
+            skip_make: int | None = None,
+            skip_year: int | None = None,
+        ) -> None:
+            target = min(target, total_options - len(selected_set))
+            if target <= 0:
+                return
+            if len(bucket) > SMALL_BUCKET:
+                # Draw positions at random; rows already chosen or in the
+                # skipped make/year are rejected, within a bounded budget.
+                for _ in range(BUCKET_DRAWS_PER_ROW * target):
+                    row = int(bucket[rng.randrange(len(bucket))])
+                    if (
+                        row in selected_set
+                        or index.make_codes[row] == skip_make
+                        or index.year_codes[row] == skip_year
+                    ):
+                        continue
+                    selected_set.add(row)
+                    target -= 1
+                    if target == 0:
+                        return
+            if skip_make is not None:
+                bucket = bucket[index.make_codes[bucket] != skip_make]
+            if skip_year is not None:
+                bucket = bucket[index.year_codes[bucket] != skip_year]
+            candidates = _candidate_indices(bucket, selected_set)
+            rng.shuffle(candidates)
+            selected_set.update(candidates[:target])
+
+        # Logged confusions first; the buckets fill whatever they leave.
+        self._add_confused(correct_idx, selected_set, plan.get("confused", 0))
+
+        # Strategy buckets based on the plan.
+        try_add(index.by_make[make_code], target=plan["same_make"])
+        try_add(
+            index.by_model[index.model_codes[correct_idx]],
+            target=plan["same_model"],
+            skip_year=year_code,
+        )
+        try_add(
+            index.by_year[year_code],
+            target=plan["same_year"],
+            skip_make=make_code if self.difficulty == "easy" else None,
+        )
+
+        # Fill the remaining slots. For easy mode, prefer different manufacturers.
+        if len(selected_set) < total_options:
+            selected_set.update(
+                self._fill_remaining(
+                    selected_set, total_options - len(selected_set), make_code
+                )
+            )
+
+        selected_list = list(selected_set)
+        if len(selected_list) < total_options:
+            raise RuntimeError(
+                f"Unable to collect {total_options} options from dataset "
+                f"(only {len(selected_list)})"
+            )
+
+        # Shuffle so the correct answer moves around.
+        rng.shuffle(selected_list)
+        return selected_list[:total_options]
+
+
+def option_label(df: Labels, row_idx: int) -> str:
+    """Return the display label of a row, preferring the precomputed column."""
+    if not hasattr(df, "columns"):
+        return str(df[row_idx])
+    if LABEL_COLUMN in df:
+        return str(df[LABEL_COLUMN].iat[row_idx])
+    return build_option_label(df.loc[row_idx])
+
+
+def option_items(df: Labels, rows: Iterable[int]) -> List[OptionItem]:
+    """Build OptionItems for the given row positions."""
+    return [
+        OptionItem(row_idx=int(idx), label=option_label(df, int(idx))) for idx in rows
+    ]
 
 
 def generate_options(
-    df: pd.DataFrame,
+    df: Labels,
     correct_idx: int,
     total_options: int = 10,
     difficulty: str = "medium",
     rng: random.Random | None = None,
+    index: CatalogIndex | None = None,
+    confusion: ConfusionTable | None = None,
 ) -> List[OptionItem]:
-    """Return a randomized list of OptionItems including the correct answer."""
+    """Return a randomized list of OptionItems including the correct answer.
+
+    Pass the ``CatalogIndex`` built once for ``df`` so each distractor bucket
+    is drawn in time proportional to its size; without it the index is
+    rebuilt on every call. ``df`` may also be a sequence of labels when an
+    ``index`` is given. In hard mode a ``ConfusionTable`` for ``df``
+    supplies distractors players actually picked for this car.
+    """
     if rng is None:
         rng = random.Random()
 
@@ -67,122 +593,52 @@ def generate_options(
 
     total_options = max(2, min(total_options, available_count))
 
-    if correct_idx not in df.index:
+    if not 0 <= correct_idx < available_count:
         raise KeyError(f"Index {correct_idx} not in dataframe")
 
-    correct_row = df.loc[correct_idx]
-    selected_set = {int(correct_idx)}
-
-    difficulty = difficulty.lower()
-
-    difficulty_plan = {
-        "easy": {
-            "same_make": 2,
-            "same_model": 1,
-            "same_year": 1,
-        },
-        "medium": {
-            "same_make": 4,
-            "same_model": 2,
-            "same_year": 2,
-        },
-        "hard": {
-            "same_make": 6,
-            "same_model": 3,
-            "same_year": 1,
-        },
-    }
-    plan = difficulty_plan.get(
-        difficulty,
-        difficulty_plan["medium"],
-    )
+    if index is None:
+        index = build_catalog_index(df)
 
-    def try_add(mask: pd.Series, target: int, *, different_make: bool = False) -> None:
-        if len(selected_set) >= total_options or target <= 0:
-            return
-        candidates = _candidate_indices(df, mask, selected_set)
-        if different_make:
-            candidates = [
-                idx
-                for idx in candidates
-                if df.loc[idx, "make_en"] != correct_row["make_en"]
-            ]
-        rng.shuffle(candidates)
-        for candidate_idx in candidates[:target]:
-            selected_set.add(candidate_idx)
-            if len(selected_set) >= total_options:
-                return
+    sampler = _OptionSampler(index, total_options, difficulty.lower(), rng, confusion)
+    return option_items(df, sampler.sample(int(correct_idx)))
 
-    # Strategy buckets based on the plan.
-    try_add(
-        df["make_en"].eq(correct_row["make_en"]) & (df.index != correct_idx),
-        target=plan["same_make"],
-    )
 
-    try_add(
-        df["model_en"].eq(correct_row["model_en"])
-        & (df["year"] != correct_row["year"])
-        & (df.index != correct_idx),
-        target=plan["same_model"],
-    )
+def generate_options_batch(
+    df: Labels,
+    question_order: Sequence[int],
+    difficulty: str = "medium",
+    rng: random.Random | None = None,
+    *,
+    total_options: int = 10,
+    index: CatalogIndex | None = None,
+    confusion: ConfusionTable | None = None,
+) -> np.ndarray:
+    """Pregenerate the option rows for every question of a session.
 
-    try_add(
-        df["year"].eq(correct_row["year"]) & (df.index != correct_idx),
-        target=plan["same_year"],
-        different_make=(difficulty == "easy"),
-    )
+    Returns an ``(len(question_order), total_options)`` array of row
+    positions; row ``i`` holds the shuffled options for ``question_order[i]``.
+    The scratch array, make masks and sampling generator are shared across
+    the batch instead of being rebuilt per question. Only ``len(df)`` is
+    used when an ``index`` is given.
+    """
+    if rng is None:
+        rng = random.Random()
 
-    # Fill the remaining slots. For easy mode, prefer different manufacturers.
-    if len(selected_set) < total_options:
-        remaining_indices = [
-            int(idx) for idx in df.index.tolist() if int(idx) not in selected_set
-        ]
-        if difficulty == "easy":
-            rng.shuffle(remaining_indices)
-            different_make_indices = [
-                idx
-                for idx in remaining_indices
-                if df.loc[idx, "make_en"] != correct_row["make_en"]
-            ]
-            same_make_indices = [
-                idx
-                for idx in remaining_indices
-                if df.loc[idx, "make_en"] == correct_row["make_en"]
-            ]
-            ordered_indices = different_make_indices + same_make_indices
-        elif difficulty == "hard":
-            rng.shuffle(remaining_indices)
-            same_make_indices = [
-                idx
-                for idx in remaining_indices
-                if df.loc[idx, "make_en"] == correct_row["make_en"]
-            ]
-            different_make_indices = [
-                idx
-                for idx in remaining_indices
-                if df.loc[idx, "make_en"] != correct_row["make_en"]
-            ]
-            ordered_indices = same_make_indices + different_make_indices
-        else:
-            rng.shuffle(remaining_indices)
-            ordered_indices = remaining_indices
-
-        for idx in ordered_indices:
-            selected_set.add(idx)
-            if len(selected_set) >= total_options:
-                break
-
-    selected_list = list(selected_set)
-    if len(selected_list) < total_options:
-        raise RuntimeError(
-            f"Unable to collect {total_options} options from dataset "
-            f"(only {len(selected_list)})"
-        )
+    available_count = len(df)
+    if available_count == 0:
+        raise ValueError("The dataframe is empty; cannot generate options.")
 
-    # Shuffle before building OptionItems so the correct answer moves around.
-    rng.shuffle(selected_list)
+    total_options = max(2, min(total_options, available_count))
 
-    return [
-        OptionItem(row_idx=idx, label=build_option_label(df.loc[idx]))
-        for idx in selected_list[:total_options]
-    ]
+    order = np.asarray(question_order, dtype=np.int64)
+    if order.size and (order.min() < 0 or order.max() >= available_count):
+        raise KeyError("question_order contains indices outside the dataframe")
+
+    if index is None:
+        index = build_catalog_index(df)
+
+    sampler = _OptionSampler(index, total_options, difficulty.lower(), rng, confusion)
+    rows = np.empty((len(order), total_options), dtype=np.int32)
+    for question, correct_idx in enumerate(order.tolist()):
+        rows[question] = sampler.sample(correct_idx)
+    return rows
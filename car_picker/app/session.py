@@ -0,0 +1,245 @@
+"""Quiz session engine, independent of the Streamlit UI.
+
+``QuizSession`` owns the lifecycle of one quiz: the question order and
+pregenerated options, answers, score, ending early and the summary.
+Responses and the summary are handed to a log sink (the ``storage`` module
+by default). The Streamlit app keeps one ``QuizSession`` per browser
+session and only renders it; the load generator drives many of them
+headlessly.
+"""
+
+from __future__ import annotations
+
+import random
+import time
+import uuid
+from typing import Callable, Dict, List, NamedTuple, Optional, Protocol
+
+import numpy as np
+
+from car_picker.app import catalog, metrics, options, scoring, storage
+
+# Score from which a player may end the quiz before the last question.
+END_EARLY_SCORE = 60
+# Options shown per question.
+TOTAL_OPTIONS = 10
+
+
+class LogSink(Protocol):
+    def log_response(self, row: Dict[str, object]) -> None: ...
+
+    def log_summary(self, row: Dict[str, object]) -> None: ...
+
+
+class Answer(NamedTuple):
+    """One answered question."""
+
+    question: int
+    selected_row: int
+    correct_row: int
+    is_correct: bool
+    response_time_sec: float
+
+
+class QuizSession:
+    """State and rules of a single quiz session.
+
+    State is kept compact: the question order and option rows are int32
+    arrays, answers are tuples, and option labels are looked up from the
+    pinned catalog when needed.
+    """
+
+    __slots__ = (
+        "catalog",
+        "difficulty",
+        "session_id",
+        "question_order",
+        "option_rows",
+        "current_index",
+        "score",
+        "history",
+        "ended_early",
+        "summary_logged",
+        "question_started",
+        "_clock",
+        "_log",
+    )
+
+    def __init__(
+        self,
+        session_catalog: catalog.Catalog,
+        difficulty: str = "medium",
+        *,
+        rng: Optional[random.Random] = None,
+        confusion: Optional[options.ConfusionTable] = None,
+        total_questions: int = scoring.TOTAL_QUESTIONS,
+        log: LogSink = storage,
+        clock: Callable[[], float] = time.time,
+        session_id: Optional[str] = None,
+    ) -> None:
+        frame = session_catalog.frame
+        if len(frame) == 0:
+            raise ValueError(
+                "No labeled images found. Please generate `car_labels.csv`."
+            )
+        rng = rng or random.Random()
+
+        self.catalog = session_catalog
+        self.difficulty = difficulty.lower()
+        self.session_id = session_id or uuid.uuid4().hex[:8]
+        # Only rows whose buckets can fill this difficulty's plan are asked.
+        pool = options.question_pool(
+            session_catalog.index, self.difficulty, total_questions
+        )
+        self.question_order = pool[
+            rng.sample(range(len(pool)), min(total_questions, len(pool)))
+        ].astype(np.int32)
+        # Every question's options are drawn up front; submits only look them up.
+        with metrics.timer("generate_options"):
+            self.option_rows = options.generate_options_batch(
+                frame,
+                self.question_order,
+                self.difficulty,
+                rng,
+                total_options=min(TOTAL_OPTIONS, len(frame)),
+                index=session_catalog.index,
+                confusion=confusion,
+            )
+        self.current_index = 0
+        self.score = 0
+        self.history: List[Answer] = []
+        self.ended_early = False
+        self.summary_logged = False
+        self._clock = clock
+        self._log = log
+        self.question_started = clock()
+
+    @property
+    def total_questions(self) -> int:
+        return len(self.question_order)
+
+    @property
+    def finished(self) -> bool:
+        return self.ended_early or self.current_index >= self.total_questions
+
+    @property
+    def can_end(self) -> bool:
+        """Whether the player may end the quiz now."""
+        reached_end = self.current_index >= self.total_questions
+        return self.score >= END_EARLY_SCORE or reached_end
+
+    def label(self, row_idx: int) -> str:
+        return options.option_label(self.catalog.frame, row_idx)
+
+    def current_row(self) -> int:
+        """Return the catalog row of the current question."""
+        if self.finished:
+            raise RuntimeError("The quiz has finished.")
+        return int(self.question_order[self.current_index])
+
+    def image_path(self, row_idx: int) -> str:
+        return str(self.catalog.frame["image_path"].iat[row_idx])
+
+    def next_image_path(self) -> Optional[str]:
+        """Return the image of the question after the current one, if any."""
+        next_index = self.current_index + 1
+        if next_index >= self.total_questions:
+            return None
+        return self.image_path(int(self.question_order[next_index]))
+
+    def current_options(self) -> List[options.OptionItem]:
+        """Return the shuffled options of the current question."""
+        if self.finished:
+            raise RuntimeError("The quiz has finished.")
+        return options.option_items(
+            self.catalog.frame, self.option_rows[self.current_index]
+        )
+
+    def submit(self, selected_row: int) -> Answer:
+        """Record the answer to the current question and move to the next one."""
+        correct_row = self.current_row()
+        if selected_row not in self.option_rows[self.current_index]:
+            raise ValueError(f"Row {selected_row} is not an option of this question")
+        response_time = self._clock() - self.question_started
+        is_correct = selected_row == correct_row
+        self.score += scoring.score_answer(is_correct)
+        answer = Answer(
+            question=self.current_index + 1,
+            selected_row=int(selected_row),
+            correct_row=correct_row,
+            is_correct=is_correct,
+            response_time_sec=round(response_time, 2),
+        )
+        self._log.log_response(self._response_row(answer, response_time))
+        self.history.append(answer)
+
+        self.current_index += 1
+        self.question_started = self._clock()
+        if self.finished:
+            self._log_summary()
+        return answer
+
+    def end_early(self) -> None:
+        """End the quiz before the last question."""
+        if not self.can_end:
+            raise RuntimeError(
+                f"The quiz can only be ended early from {END_EARLY_SCORE} points."
+            )
+        self.ended_early = True
+        self._log_summary()
+
+    @property
+    def correct_answers(self) -> int:
+        return sum(1 for answer in self.history if answer.is_correct)
+
+    @property
+    def total_time(self) -> float:
+        return sum(answer.response_time_sec for answer in self.history)
+
+    def summary(self) -> Dict[str, object]:
+        """Return the summary log row of the session."""
+        total_time = self.total_time
+        average_time = total_time / len(self.history) if self.history else 0.0
+        return {
+            "session_id": self.session_id,
+            "timestamp": storage.utc_timestamp(),
+            "total_questions": self.total_questions,
+            "correct_answers": self.correct_answers,
+            "total_score": self.score,
+            "total_time_sec": round(total_time, 2),
+            "average_response_time_sec": round(average_time, 2),
+            "difficulty": self.difficulty,
+            "ended_early": int(self.ended_early),
+        }
+
+    def _log_summary(self) -> None:
+        if not self.summary_logged:
+            self._log.log_summary(self.summary())
+            self.summary_logged = True
+
+    def _response_row(
+        self, answer: Answer, response_time: float
+    ) -> Dict[str, object]:
+        frame = self.catalog.frame
+
+        def value(column: str, row_idx: int) -> object:
+            return frame[column].iat[row_idx] if column in frame else ""
+
+        correct, selected = answer.correct_row, answer.selected_row
+        return {
+            "session_id": self.session_id,
+            "timestamp": storage.utc_timestamp(),
+            "question_idx": answer.question,
+            "image_path": value("image_path", correct),
+            "selected_make_en": value("make_en", selected),
+            "selected_model_en": value("model_en", selected),
+            "selected_year": value("year", selected),
+            "selected_variant": value("variant", selected),
+            "correct_make_en": value("make_en", correct),
+            "correct_model_en": value("model_en", correct),
+            "correct_year": value("year", correct),
+            "correct_variant": value("variant", correct),
+            "is_correct": int(answer.is_correct),
+            "score_after_question": self.score,
+            "response_time_sec": round(response_time, 2),
+        }
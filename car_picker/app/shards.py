@@ -0,0 +1,446 @@
+"""Packed image shards with a sorted offset index.
+
+Millions of small JPEGs are slow to walk, back up and read from a cold
+cache. ``pack`` concatenates images from a dataset directory, a zip file or
+a tar archive (read in place, never extracted) into a few large shard
+files. Next to them it writes an index keyed by ``image_path``:
+
+* ``keys-<pack>.npy``: sorted 64-bit blake2b hashes of the image paths.
+* ``locations-<pack>.npy``: ``(shard, offset, length)`` rows aligned with
+  the keys.
+* ``paths-<pack>.txt``: the image paths in pack order, for listing.
+* ``shards.json``: the manifest naming the current pack. It is replaced
+  atomically and written last, so readers never see a partial pack.
+
+``ShardStore`` memory-maps the index and every shard of the pack, so
+looking an image up costs a binary search over the mapped keys and a slice
+of the mapped shard, with no per-image ``open`` or ``stat``. The manifest
+is checked for a new pack at most every ``MANIFEST_CHECK_INTERVAL_SEC``.
+Paths missing from the pack, and every path while no readable pack exists,
+return None and callers fall back to the loose file::
+
+    python -m car_picker.app.shards pack car_picker/dataset
+    python -m car_picker.app.shards pack images.tar.gz --strip-components 1
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import tarfile
+import threading
+import time
+import uuid
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import IO, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+SHARD_DIR = Path(
+    os.environ.get(
+        "CAR_PICKER_SHARD_DIR", str(Path(__file__).resolve().parents[1] / "shards")
+    )
+)
+MANIFEST_NAME = "shards.json"
+FORMAT_VERSION = 1
+# A new shard is started once the current one reaches this size.
+DEFAULT_SHARD_BYTES = 1 << 30
+# Minimum seconds between two checks of the manifest for a new pack.
+MANIFEST_CHECK_INTERVAL_SEC = float(
+    os.environ.get("CAR_PICKER_SHARD_CHECK_INTERVAL", "1.0")
+)
+# Image extensions packed from every source, like the metadata scanner.
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png")
+
+# (image_path, data) pairs produced by the pack sources.
+SourceImage = Tuple[str, bytes]
+
+
+def path_key(image_path: str) -> int:
+    """Return the 64-bit index key of ``image_path``."""
+    digest = hashlib.blake2b(image_path.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _strip(name: str, components: int) -> Optional[str]:
+    parts = PurePosixPath(name).parts[components:]
+    return "/".join(parts) if parts else None
+
+
+def iter_directory(root: Path) -> Iterator[SourceImage]:
+    """Yield the images under ``root`` in the metadata scanner's order."""
+    from car_picker.data import build_metadata
+
+    for path in build_metadata.iter_image_files(root):
+        yield path.relative_to(root).as_posix(), path.read_bytes()
+
+
+def iter_zip(path: Path, strip_components: int = 0) -> Iterator[SourceImage]:
+    """Yield the images stored in a zip file without extracting it."""
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.endswith(IMAGE_SUFFIXES):
+                continue
+            image_path = _strip(info.filename, strip_components)
+            if image_path:
+                yield image_path, archive.read(info)
+
+
+def iter_tar(path: Path, strip_components: int = 0) -> Iterator[SourceImage]:
+    """Stream the images of a (possibly compressed) tar archive."""
+    with tarfile.open(path, mode="r|*") as archive:
+        for member in archive:
+            if not member.isfile() or not member.name.endswith(IMAGE_SUFFIXES):
+                continue
+            image_path = _strip(member.name, strip_components)
+            handle = archive.extractfile(member)
+            if image_path and handle is not None:
+                yield image_path, handle.read()
+
+
+def iter_source(source: Path, strip_components: int = 0) -> Iterator[SourceImage]:
+    """Yield the images of a directory, zip file or tar archive."""
+    if source.is_dir():
+        return iter_directory(source)
+    if zipfile.is_zipfile(source):
+        return iter_zip(source, strip_components)
+    if tarfile.is_tarfile(source):
+        return iter_tar(source, strip_components)
+    raise ValueError(f"Not a directory, zip file or tar archive: {source}")
+
+
+def _write_atomically(path: Path, write) -> None:
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def pack(
+    images: Iterator[SourceImage],
+    shard_dir: Path = SHARD_DIR,
+    shard_bytes: int = DEFAULT_SHARD_BYTES,
+) -> Dict[str, object]:
+    """Write ``images`` into a new pack under ``shard_dir`` and return its manifest.
+
+    A path seen twice keeps its first image. Files of the previous pack are
+    removed once the new manifest is in place; stores that already mapped
+    it keep reading the old pack until they notice the new manifest.
+    """
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    pack_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:12]}"
+    shard_names: List[str] = []
+    paths: List[str] = []
+    keys: List[int] = []
+    locations: List[Tuple[int, int, int]] = []
+    seen: Dict[int, str] = {}
+    handle: Optional[IO[bytes]] = None
+    written = 0
+    try:
+        for image_path, data in images:
+            key = path_key(image_path)
+            other = seen.get(key)
+            if other is not None:
+                if other == image_path:
+                    continue
+                raise ValueError(f"Index key collision: {other} and {image_path}")
+            seen[key] = image_path
+            if handle is None or (written and written + len(data) > shard_bytes):
+                if handle is not None:
+                    handle.close()
+                shard_names.append(f"pack-{pack_id}-{len(shard_names):05d}.bin")
+                handle = (shard_dir / shard_names[-1]).open("wb")
+                written = 0
+            handle.write(data)
+            paths.append(image_path)
+            keys.append(key)
+            locations.append((len(shard_names) - 1, written, len(data)))
+            written += len(data)
+    except BaseException:
+        for name in shard_names:
+            (shard_dir / name).unlink(missing_ok=True)
+        raise
+    finally:
+        if handle is not None:
+            handle.close()
+
+    order = np.argsort(np.asarray(keys, dtype=np.uint64), kind="stable")
+    manifest = {
+        "version": FORMAT_VERSION,
+        "pack": pack_id,
+        "shards": shard_names,
+        "keys": f"keys-{pack_id}.npy",
+        "locations": f"locations-{pack_id}.npy",
+        "paths": f"paths-{pack_id}.txt",
+        "images": len(paths),
+        "bytes": int(sum(length for _, _, length in locations)),
+    }
+    np.save(shard_dir / manifest["keys"], np.asarray(keys, dtype=np.uint64)[order])
+    np.save(
+        shard_dir / manifest["locations"],
+        np.asarray(locations, dtype=np.uint64).reshape(-1, 3)[order],
+    )
+    (shard_dir / manifest["paths"]).write_text(
+        "".join(f"{path}\n" for path in paths), encoding="utf-8"
+    )
+
+    previous = _read_manifest(shard_dir)
+    _write_atomically(
+        shard_dir / MANIFEST_NAME,
+        lambda tmp: tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8"),
+    )
+    if previous is not None:
+        current = set(_pack_files(manifest))
+        for name in _pack_files(previous):
+            if name not in current:
+                try:
+                    (shard_dir / name).unlink(missing_ok=True)
+                except OSError:
+                    # Still mapped on platforms that forbid removing it.
+                    pass
+    return manifest
+
+
+def _pack_files(manifest: Dict[str, object]) -> List[str]:
+    return [
+        *manifest["shards"],
+        manifest["keys"],
+        manifest["locations"],
+        manifest["paths"],
+    ]
+
+
+def _read_manifest(shard_dir: Path) -> Optional[Dict[str, object]]:
+    try:
+        manifest = json.loads((shard_dir / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    if manifest.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported shard format in {shard_dir}: {manifest}")
+    return manifest
+
+
+class _Shard:
+    """One shard file, memory-mapped, or read with ``pread`` if it cannot be."""
+
+    def __init__(self, path: Path) -> None:
+        self._fd = os.open(path, os.O_RDONLY)
+        try:
+            self._map: Optional[mmap.mmap] = mmap.mmap(
+                self._fd, 0, access=mmap.ACCESS_READ
+            )
+        except (OSError, ValueError):
+            # Empty files and file systems without mmap support.
+            self._map = None
+        else:
+            os.close(self._fd)
+            self._fd = -1
+
+    def read(self, offset: int, length: int) -> bytes:
+        if self._map is not None:
+            return self._map[offset : offset + length]
+        return os.pread(self._fd, length, offset)
+
+    def __del__(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+
+
+class _Pack(NamedTuple):
+    """A loaded pack: its manifest, mapped index and opened shards."""
+
+    manifest: Dict[str, object]
+    keys: np.ndarray
+    locations: np.ndarray
+    shards: List[_Shard]
+
+
+def _open_pack(shard_dir: Path) -> Optional[_Pack]:
+    manifest = _read_manifest(shard_dir)
+    if manifest is None:
+        return None
+    # Every file is opened up front, so the pack stays readable after a
+    # repack removes it.
+    return _Pack(
+        manifest,
+        np.load(shard_dir / manifest["keys"], mmap_mode="r"),
+        np.load(shard_dir / manifest["locations"], mmap_mode="r"),
+        [_Shard(shard_dir / name) for name in manifest["shards"]],
+    )
+
+
+def _manifest_version(shard_dir: Path) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(shard_dir / MANIFEST_NAME)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ShardStore:
+    """Read-only view of the current pack under ``shard_dir``.
+
+    The pack is loaded on first use and replaced when the manifest's mtime
+    or size changes, checked at most every ``check_interval`` seconds. A
+    directory without a pack, or whose pack cannot be read, is an empty
+    store. ``reload`` forces the next lookup to check the manifest.
+    """
+
+    def __init__(
+        self,
+        shard_dir: Path = SHARD_DIR,
+        check_interval: float = MANIFEST_CHECK_INTERVAL_SEC,
+    ) -> None:
+        self.shard_dir = shard_dir
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._pack: Optional[_Pack] = None
+        self._version: Optional[Tuple[int, int]] = None
+        self._checked = float("-inf")
+
+    def _current(self) -> Optional[_Pack]:
+        if time.monotonic() - self._checked < self.check_interval:
+            return self._pack
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked < self.check_interval:
+                return self._pack
+            version = _manifest_version(self.shard_dir)
+            if version != self._version:
+                try:
+                    self._pack = _open_pack(self.shard_dir)
+                except (OSError, ValueError, KeyError):
+                    # Half-written or removed under us: retry on the next check.
+                    self._pack = None
+                    version = None
+                self._version = version
+            self._checked = now
+            return self._pack
+
+    def reload(self) -> None:
+        with self._lock:
+            self._checked = float("-inf")
+
+    def __len__(self) -> int:
+        pack = self._current()
+        return 0 if pack is None else len(pack.keys)
+
+    def _locate(
+        self, pack: _Pack, image_path: str
+    ) -> Optional[Tuple[int, int, int]]:
+        keys = pack.keys
+        key = np.uint64(path_key(image_path))
+        position = int(np.searchsorted(keys, key))
+        if position == len(keys) or keys[position] != key:
+            return None
+        shard, offset, length = pack.locations[position].tolist()
+        return shard, offset, length
+
+    def __contains__(self, image_path: str) -> bool:
+        pack = self._current()
+        return pack is not None and self._locate(pack, image_path) is not None
+
+    def pack_id(self, image_path: str) -> Optional[str]:
+        """Return the id of the pack holding ``image_path``, if it is packed."""
+        pack = self._current()
+        if pack is None or self._locate(pack, image_path) is None:
+            return None
+        return str(pack.manifest["pack"])
+
+    def get(self, image_path: str) -> Optional[bytes]:
+        """Return the bytes of ``image_path``, or None when it is not packed."""
+        pack = self._current()
+        if pack is None:
+            return None
+        location = self._locate(pack, image_path)
+        if location is None:
+            return None
+        shard, offset, length = location
+        try:
+            return pack.shards[shard].read(offset, length)
+        except OSError:
+            return None
+
+    def iter_entries(self) -> Iterator[Tuple[str, int, int]]:
+        """Yield ``(image_path, length, mtime_ns)`` in pack order.
+
+        ``mtime_ns`` is the modification time of the image's shard, so a
+        repack shows every image as changed.
+        """
+        pack = self._current()
+        if pack is None:
+            return
+        mtimes = [
+            (self.shard_dir / name).stat().st_mtime_ns
+            for name in pack.manifest["shards"]
+        ]
+        paths_file = self.shard_dir / pack.manifest["paths"]
+        with paths_file.open(encoding="utf-8") as fh:
+            for line in fh:
+                image_path = line.rstrip("\n")
+                location = self._locate(pack, image_path)
+                if location is not None:
+                    yield image_path, location[2], mtimes[location[0]]
+
+
+SHARDS = ShardStore()
+# Stores shared within a process, keyed by shard directory.
+_STORES: Dict[Path, ShardStore] = {SHARD_DIR: SHARDS}
+
+
+def open_store(shard_dir: Path = SHARD_DIR) -> ShardStore:
+    """Return this process's store for ``shard_dir``, creating it once."""
+    store = _STORES.get(shard_dir)
+    if store is None:
+        store = _STORES.setdefault(shard_dir, ShardStore(shard_dir))
+    return store
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Image shard tools.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    pack_parser = commands.add_parser(
+        "pack", help="Pack a dataset directory, zip file or tar archive"
+    )
+    pack_parser.add_argument("source", type=Path, help="Directory, .zip or .tar[.*]")
+    pack_parser.add_argument(
+        "--output",
+        type=Path,
+        default=SHARD_DIR,
+        help="Shard directory (default: car_picker/shards)",
+    )
+    pack_parser.add_argument(
+        "--shard-bytes",
+        type=int,
+        default=DEFAULT_SHARD_BYTES,
+        help="Target size of each shard file (default: 1 GiB)",
+    )
+    pack_parser.add_argument(
+        "--strip-components",
+        type=int,
+        default=0,
+        help="Leading path components to drop from archive member names",
+    )
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        manifest = pack(
+            iter_source(args.source, args.strip_components),
+            args.output,
+            args.shard_bytes,
+        )
+        print(
+            f"Packed {manifest['images']} images ({manifest['bytes']} bytes) into "
+            f"{len(manifest['shards'])} shard(s) under {args.output}"
+        )
+
+
+if __name__ == "__main__":
+    main()
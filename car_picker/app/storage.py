@@ -1,11 +1,35 @@
-"""CSV persistence helpers for the quiz app."""
+"""Persistence helpers for the quiz logs.
+
+Rows are handed to a background writer thread that batches them and passes
+them to a storage backend, so answering a question does not wait on file
+I/O. The CSV backend is the default; ``CAR_PICKER_LOG_BACKEND=sqlite``
+selects a SQLite database in WAL mode instead.
+"""
 
 from __future__ import annotations
 
+import argparse
+import atexit
 import csv
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict
+from typing import IO, Dict, Iterator, List, Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore[assignment]
+
+from car_picker.app import metrics
+
+logger = logging.getLogger(__name__)
 
 QUIZ_LOG_COLUMNS = [
     "session_id",
@@ -40,28 +64,485 @@ SUMMARY_COLUMNS = [
 RESULTS_DIR = Path(__file__).resolve().parents[1] / "results"
 QUIZ_LOG_PATH = RESULTS_DIR / "quiz_log.csv"
 SUMMARY_PATH = RESULTS_DIR / "summary.csv"
+# Closed CSV segments, one directory per table.
+SEGMENT_DIR = RESULTS_DIR / "segments"
+LOG_DB_PATH = Path(
+    os.environ.get("CAR_PICKER_LOG_DB", str(RESULTS_DIR / "quiz_logs.sqlite3"))
+)
+# Storage backend for quiz logs: "csv" or "sqlite".
+LOG_BACKEND = os.environ.get("CAR_PICKER_LOG_BACKEND", "csv")
+# The active CSV is moved to SEGMENT_DIR once it exceeds this size (0 = never)
+# or, with daily rotation, when it was last written on an earlier UTC day.
+LOG_ROTATE_BYTES = int(os.environ.get("CAR_PICKER_LOG_ROTATE_BYTES", str(64 * 1024**2)))
+LOG_ROTATE_DAILY = os.environ.get("CAR_PICKER_LOG_ROTATE_DAILY", "1") != "0"
+
+# What the background writer does after writing each batch: "fsync" forces
+# CSV rows to disk; for SQLite it maps to PRAGMA synchronous
+# ("none" = OFF, "flush" = NORMAL, "fsync" = FULL). CSV batches are always
+# flushed so that processes sharing a file do not interleave rows.
+DURABILITY_POLICIES = ("none", "flush", "fsync")
+LOG_DURABILITY = os.environ.get("CAR_PICKER_LOG_DURABILITY", "flush")
+# A batch is written once it holds this many rows ...
+LOG_BATCH_SIZE = int(os.environ.get("CAR_PICKER_LOG_BATCH_SIZE", "64"))
+# ... or once its oldest row has waited this long.
+LOG_FLUSH_INTERVAL_SEC = float(
+    os.environ.get("CAR_PICKER_LOG_FLUSH_INTERVAL", "1.0")
+)
+# A batch whose write keeps failing is dropped after this many attempts,
+# one flush interval apart.
+LOG_WRITE_ATTEMPTS = int(os.environ.get("CAR_PICKER_LOG_WRITE_ATTEMPTS", "3"))
+
+
+@contextmanager
+def _locked(handle: IO[str]) -> Iterator[None]:
+    """Hold an exclusive ``flock`` on ``handle`` where the platform has one."""
+    if fcntl is None:
+        yield
+        return
+    fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def _write_rows(
+    handle: IO[str], columns: list[str], rows: List[Dict[str, object]]
+) -> None:
+    """Append ``rows`` to a locked CSV, writing the header into empty files.
+
+    Rows are flushed before the caller releases the lock, so processes
+    sharing the file never interleave.
+    """
+    writer = csv.DictWriter(handle, fieldnames=columns)
+    if os.fstat(handle.fileno()).st_size == 0:
+        writer.writeheader()
+    writer.writerows(rows)
+    handle.flush()
+
+
+# Column names of each log table.
+TABLES: Dict[str, list[str]] = {
+    "quiz_log": QUIZ_LOG_COLUMNS,
+    "summary": SUMMARY_COLUMNS,
+}
+# SQLite column types; columns not listed are stored as TEXT.
+SQLITE_COLUMN_TYPES = {
+    "question_idx": "INTEGER",
+    "is_correct": "INTEGER",
+    "score_after_question": "INTEGER",
+    "response_time_sec": "REAL",
+    "total_questions": "INTEGER",
+    "correct_answers": "INTEGER",
+    "total_score": "INTEGER",
+    "total_time_sec": "REAL",
+    "average_response_time_sec": "REAL",
+    "ended_early": "INTEGER",
+}
+
+
+def segment_paths(table: str, segment_dir: Path = SEGMENT_DIR) -> List[Path]:
+    """Return the closed CSV segments of ``table``, oldest first."""
+    root = segment_dir / table
+    if not root.exists():
+        return []
+    return sorted(root.glob(f"{table}-*.csv"))
+
+
+def _same_file(handle: IO[str], path: Path) -> bool:
+    try:
+        current = os.stat(path)
+    except FileNotFoundError:
+        return False
+    opened = os.fstat(handle.fileno())
+    return (opened.st_dev, opened.st_ino) == (current.st_dev, current.st_ino)
+
+
+class CsvBackend:
+    """Append log rows to ``quiz_log.csv`` and ``summary.csv``.
+
+    Each batch is written under an exclusive lock, so several worker
+    processes can share the files. Before writing, the active file is moved
+    to ``segment_dir`` when it is due for rotation; processes still holding
+    the old file notice the rename under the lock and reopen.
+    """
+
+    def __init__(
+        self,
+        paths: Optional[Dict[str, Path]] = None,
+        segment_dir: Path = SEGMENT_DIR,
+        rotate_bytes: int = LOG_ROTATE_BYTES,
+        rotate_daily: bool = LOG_ROTATE_DAILY,
+    ) -> None:
+        self.paths = paths or {"quiz_log": QUIZ_LOG_PATH, "summary": SUMMARY_PATH}
+        self.segment_dir = segment_dir
+        self.rotate_bytes = rotate_bytes
+        self.rotate_daily = rotate_daily
+        self._handles: Dict[str, IO[str]] = {}
+
+    def _handle(self, table: str) -> IO[str]:
+        handle = self._handles.get(table)
+        if handle is None:
+            path = self.paths[table]
+            path.parent.mkdir(parents=True, exist_ok=True)
+            handle = self._handles[table] = path.open("a", encoding="utf-8", newline="")
+        return handle
+
+    def _rotation_due(self, handle: IO[str]) -> bool:
+        stat = os.fstat(handle.fileno())
+        if stat.st_size == 0:
+            return False
+        if self.rotate_bytes and stat.st_size >= self.rotate_bytes:
+            return True
+        if self.rotate_daily:
+            last_write = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+            return last_write.date() < datetime.now(tz=timezone.utc).date()
+        return False
+
+    def _rotate(self, table: str) -> Path:
+        target_dir = self.segment_dir / table
+        target_dir.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(tz=timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        target = target_dir / f"{table}-{stamp}-{os.getpid()}.csv"
+        os.replace(self.paths[table], target)
+        return target
+
+    def write(self, table: str, rows: List[Dict[str, object]]) -> None:
+        path = self.paths[table]
+        while True:
+            handle = self._handle(table)
+            with _locked(handle):
+                if _same_file(handle, path):
+                    if not self._rotation_due(handle):
+                        _write_rows(handle, TABLES[table], rows)
+                        return
+                    self._rotate(table)
+            # Rotated by us or another process: continue in a fresh file.
+            self._handles.pop(table).close()
+
+    def sync(self, durability: str) -> None:
+        if durability == "fsync":
+            for handle in self._handles.values():
+                os.fsync(handle.fileno())
+
+    def close(self) -> None:
+        for handle in self._handles.values():
+            handle.close()
+        self._handles.clear()
+
+
+class SQLiteBackend:
+    """Store log rows in a SQLite database in WAL mode.
+
+    Each batch is inserted with one prepared ``executemany`` statement in a
+    single transaction. WAL lets several worker processes append while
+    readers keep working. The durability policy maps to ``synchronous``.
+    """
+
+    _SYNCHRONOUS = {"none": "OFF", "flush": "NORMAL", "fsync": "FULL"}
+
+    def __init__(self, db_path: Path = LOG_DB_PATH, durability: str = "flush") -> None:
+        self.db_path = db_path
+        self.durability = durability
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self._SYNCHRONOUS[self.durability]}")
+            with conn:
+                for table, columns in TABLES.items():
+                    definition = ", ".join(
+                        f"{column} {SQLITE_COLUMN_TYPES.get(column, 'TEXT')}"
+                        for column in columns
+                    )
+                    conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({definition})")
+                    for column in ("session_id", "timestamp"):
+                        conn.execute(
+                            f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} "
+                            f"ON {table} ({column})"
+                        )
+            self._conn = conn
+        return self._conn
+
+    def write(self, table: str, rows: List[Dict[str, object]]) -> None:
+        columns = TABLES[table]
+        statement = (
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})"
+        )
+        conn = self.connect()
+        with conn:
+            conn.executemany(
+                statement, ([row.get(column) for column in columns] for row in rows)
+            )
+
+    def sync(self, durability: str) -> None:
+        # Commits already honour the synchronous pragma.
+        pass
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
 
 
-def _append_row(path: Path, columns: list[str], row: Dict[str, object]) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    file_exists = path.exists() and path.stat().st_size > 0
-    with path.open("a", encoding="utf-8", newline="") as handle:
-        writer = csv.DictWriter(handle, fieldnames=columns)
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow(row)
+LogBackend = Union[CsvBackend, SQLiteBackend]
+
+
+def make_backend(
+    name: str = LOG_BACKEND, durability: str = LOG_DURABILITY
+) -> LogBackend:
+    """Return the log backend called ``name`` ("csv" or "sqlite")."""
+    if name == "csv":
+        return CsvBackend()
+    if name == "sqlite":
+        return SQLiteBackend(LOG_DB_PATH, durability)
+    raise ValueError(f"Unknown log backend {name!r}; expected 'csv' or 'sqlite'")
+
+
+class _LogWriter:
+    """Background thread that batches log rows and hands them to a backend.
+
+    A failed write is logged and counted (``log_write_error``) and retried
+    with the next batch; rows that still cannot be written after
+    ``LOG_WRITE_ATTEMPTS`` attempts are dropped (``log_rows_dropped``).
+    """
+
+    _FLUSH = object()
+    _STOP = object()
+
+    def __init__(
+        self,
+        backend: Optional[LogBackend] = None,
+        batch_size: int = LOG_BATCH_SIZE,
+        flush_interval: float = LOG_FLUSH_INTERVAL_SEC,
+        durability: str = LOG_DURABILITY,
+    ) -> None:
+        if durability not in DURABILITY_POLICIES:
+            raise ValueError(
+                f"Unknown durability policy {durability!r}; "
+                f"expected one of {DURABILITY_POLICIES}"
+            )
+        self.backend = backend if backend is not None else make_backend()
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, table: str, row: Dict[str, object]) -> None:
+        self._ensure_started()
+        self._queue.put((table, dict(row)))
+
+    def log_response(self, row: Dict[str, object]) -> None:
+        self.submit("quiz_log", row)
+
+    def log_summary(self, row: Dict[str, object]) -> None:
+        self.submit("summary", row)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Write every row submitted so far; return ``False`` on timeout."""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put((self._FLUSH, done))
+        return done.wait(timeout)
+
+    def close(self) -> None:
+        """Drain pending rows, stop the thread and close the backend."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put((self._STOP, None))
+            thread.join()
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="quiz-log-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _write(self, pending: Dict[str, List[Dict[str, object]]]) -> bool:
+        """Write ``pending``, removing each table once written.
+
+        Returns ``False`` when the backend raised.
+        """
+        try:
+            for table in list(pending):
+                self.backend.write(table, pending[table])
+                del pending[table]
+            if self.durability != "none":
+                self.backend.sync(self.durability)
+        except Exception:
+            logger.exception("Writing quiz logs failed")
+            metrics.increment("log_write_error")
+            return False
+        return True
+
+    def _run(self) -> None:
+        pending: Dict[str, List[Dict[str, object]]] = {}
+        pending_count = 0
+        failures = 0
+        deadline: Optional[float] = None
+        while True:
+            timeout = None
+            if deadline is not None:
+                timeout = max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is not None and item[0] not in (self._FLUSH, self._STOP):
+                table, row = item
+                pending.setdefault(table, []).append(row)
+                pending_count += 1
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if pending_count < self.batch_size:
+                    continue
+                # After a failure, wait out the interval before retrying.
+                if failures and time.monotonic() < deadline:
+                    continue
+
+            stopping = item is not None and item[0] is self._STOP
+            if pending:
+                with metrics.timer("log_write"):
+                    written = self._write(pending)
+                failures = 0 if written else failures + 1
+                if pending and (failures >= LOG_WRITE_ATTEMPTS or stopping):
+                    dropped = sum(len(rows) for rows in pending.values())
+                    logger.error(
+                        "Dropped %d quiz log rows after %d failed writes",
+                        dropped,
+                        failures,
+                    )
+                    metrics.increment("log_rows_dropped", dropped)
+                    pending.clear()
+                    failures = 0
+            pending_count = sum(len(rows) for rows in pending.values())
+            deadline = (
+                time.monotonic() + self.flush_interval if pending else None
+            )
+
+            if item is not None and item[0] is self._FLUSH:
+                item[1].set()
+            elif stopping:
+                try:
+                    self.backend.close()
+                except Exception:
+                    logger.exception("Closing the quiz log backend failed")
+                return
+
+
+_WRITER = _LogWriter()
+atexit.register(_WRITER.close)
 
 
 def log_response(row: Dict[str, object]) -> None:
-    """Append a single question response to the quiz log CSV."""
-    _append_row(QUIZ_LOG_PATH, QUIZ_LOG_COLUMNS, row)
+    """Append a single question response to the quiz log."""
+    _WRITER.log_response(row)
 
 
 def log_summary(row: Dict[str, object]) -> None:
-    """Append a session summary to the summary CSV."""
-    _append_row(SUMMARY_PATH, SUMMARY_COLUMNS, row)
+    """Append a session summary to the summary log."""
+    _WRITER.log_summary(row)
+
+
+def flush_logs(timeout: Optional[float] = None) -> bool:
+    """Block until every logged row has been handed to the backend."""
+    return _WRITER.flush(timeout)
+
+
+def csv_sources(
+    table: str,
+    paths: Optional[Dict[str, Path]] = None,
+    segment_dir: Path = SEGMENT_DIR,
+) -> List[Path]:
+    """Return the closed segments and the active CSV of ``table``, oldest first."""
+    paths = paths or {"quiz_log": QUIZ_LOG_PATH, "summary": SUMMARY_PATH}
+    sources = segment_paths(table, segment_dir)
+    if paths[table].exists():
+        sources.append(paths[table])
+    return sources
+
+
+def migrate_csv_to_sqlite(
+    db_path: Path = LOG_DB_PATH,
+    paths: Optional[Dict[str, Path]] = None,
+    segment_dir: Path = SEGMENT_DIR,
+    batch_size: int = 10_000,
+) -> Dict[str, int]:
+    """Import existing CSV logs, including closed segments, into SQLite.
+
+    Returns the number of imported rows per table. Run it once before
+    switching ``CAR_PICKER_LOG_BACKEND`` to ``sqlite``; running it twice
+    imports the rows twice.
+    """
+    backend = SQLiteBackend(db_path, durability="none")
+    imported: Dict[str, int] = {}
+    try:
+        for table in TABLES:
+            imported[table] = 0
+            for path in csv_sources(table, paths, segment_dir):
+                with path.open("r", encoding="utf-8", newline="") as handle:
+                    batch: List[Dict[str, object]] = []
+                    for record in csv.DictReader(handle):
+                        batch.append(dict(record))
+                        if len(batch) >= batch_size:
+                            backend.write(table, batch)
+                            imported[table] += len(batch)
+                            batch = []
+                    if batch:
+                        backend.write(table, batch)
+                        imported[table] += len(batch)
+    finally:
+        backend.close()
+    return imported
 
 
 def utc_timestamp() -> str:
     """Return an ISO formatted UTC timestamp."""
     return datetime.now(tz=timezone.utc).isoformat()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Quiz log maintenance tools.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate = commands.add_parser(
+        "migrate", help="Import the CSV logs into the SQLite backend"
+    )
+    migrate.add_argument(
+        "--db",
+        type=Path,
+        default=LOG_DB_PATH,
+        help="SQLite database to import into (default: results/quiz_logs.sqlite3)",
+    )
+    commands.add_parser(
+        "compact", help="Convert closed CSV segments into the Parquet archive"
+    )
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        imported = migrate_csv_to_sqlite(args.db)
+        for table, count in imported.items():
+            print(f"Imported {count} {table} rows into {args.db}")
+    elif args.command == "compact":
+        from car_picker.app import log_archive
+
+        # Summaries first, so quiz_log rows can pick up their difficulty.
+        for table in ("summary", "quiz_log"):
+            count = log_archive.compact(table)
+            print(f"Archived {count} {table} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,13 @@
 from __future__ import annotations
 
-import random
-import sys
-import time
-import uuid
 from pathlib import Path
 from typing import Optional
 
-import pandas as pd
 import streamlit as st
 
-ROOT_DIR = Path(__file__).resolve().parents[1]
-if str(ROOT_DIR) not in sys.path:
-    sys.path.append(str(ROOT_DIR))
-
-from app import options, scoring, storage  # noqa: E402
+from car_picker.app import catalog, confusion, images, metrics, scoring, session
 
 DATA_DIR = Path(__file__).resolve().parents[1] / "data"
-DATASET_DIR = Path(__file__).resolve().parents[1] / "dataset"
 LABELS_CSV = DATA_DIR / "car_labels.csv"
 
 DIFFICULTY_LABELS = {
@@ -36,62 +26,32 @@ def configure_page() -> None:
     )
 
 
-@st.cache_data(show_spinner=False)
-def load_metadata(csv_path: Path) -> pd.DataFrame:
-    df = pd.read_csv(csv_path)
-    # Drop rows with missing essentials.
-    valid = df[
-        df["image_path"].notna()
-        & df["make_en"].notna()
-        & df["model_en"].notna()
-        & df["year"].notna()
-    ].copy()
-    valid["image_path"] = valid["image_path"].astype(str)
-    valid["make_en"] = valid["make_en"].astype(str)
-    valid["model_en"] = valid["model_en"].astype(str)
-    valid["year"] = valid["year"].astype(str)
-    valid["variant"] = valid.get("variant", "").fillna("")
-    valid["make_ko"] = valid.get("make_ko", valid["make_en"]).fillna(valid["make_en"])
-    valid["model_ko"] = valid.get("model_ko", valid["model_en"]).fillna(
-        valid["model_en"]
-    )
-    # Preserve original index for deterministic lookups.
-    return valid.reset_index(drop=True)
-
-
-def init_session_state(df: pd.DataFrame, difficulty: str) -> None:
-    if st.session_state.get("quiz_initialized"):
-        return
-
-    total_available = len(df)
-    if total_available == 0:
-        st.error("No labeled images found. Please generate `car_labels.csv`.")
-        st.stop()
-
-    total_questions = min(scoring.TOTAL_QUESTIONS, total_available)
-    question_order = random.sample(range(total_available), total_questions)
-
-    st.session_state.update(
-        {
-            "quiz_initialized": True,
-            "session_id": uuid.uuid4().hex[:8],
-            "question_order": question_order,
-            "current_question_idx": 0,
-            "total_questions": total_questions,
-            "score": 0,
-            "history": [],
-            "question_start_ts": time.time(),
-            "current_options": None,
-            "summary_logged": False,
-            "ended_early": False,
-            "difficulty": difficulty,
-        }
-    )
+def get_quiz(difficulty: str) -> session.QuizSession:
+    """Return this browser session's quiz, starting one if needed.
+
+    A new quiz pins the current catalog version, so its questions stay valid
+    even if the metadata is rebuilt while it is played.
+    """
+    quiz = st.session_state.get("quiz")
+    if quiz is None:
+        session_catalog = catalog.CATALOG_CACHE.get(LABELS_CSV)
+        confusion_table = None
+        if difficulty == "hard":
+            confusion_table = confusion.CONFUSION_STORE.get(session_catalog)
+        try:
+            quiz = session.QuizSession(
+                session_catalog, difficulty, confusion=confusion_table
+            )
+        except ValueError as exc:
+            st.error(str(exc))
+            st.stop()
+        st.session_state["quiz"] = quiz
+        st.session_state["difficulty"] = quiz.difficulty
+    return quiz
 
 
 def reset_session(*, difficulty: Optional[str] = None) -> None:
     selected_difficulty = (difficulty or st.session_state.get("difficulty", "medium")).lower()
-    load_metadata.clear()  # type: ignore[attr-defined]
     st.session_state.clear()
     st.session_state["difficulty"] = selected_difficulty
 
@@ -125,205 +85,108 @@ def display_header() -> None:
     )
 
 
-def get_current_dataframe_row(df: pd.DataFrame) -> pd.Series:
-    idx = st.session_state["question_order"][st.session_state["current_question_idx"]]
-    return df.loc[idx]
-
-
-def ensure_current_options(df: pd.DataFrame) -> list[options.OptionItem]:
-    if st.session_state.get("current_options") is None:
-        correct_idx = st.session_state["question_order"][st.session_state["current_question_idx"]]
-        rng = random.Random()
-        st.session_state["current_options"] = options.generate_options(
-            df,
-            correct_idx,
-            total_options=min(10, len(df)),
-            difficulty=st.session_state.get("difficulty", "medium"),
-            rng=rng,
-        )
-        if len(st.session_state["current_options"]) != min(10, len(df)):
-            raise RuntimeError("Failed to generate the expected number of options.")
-    return st.session_state["current_options"]
-
-
-def load_image_path(image_path: str) -> Path:
-    absolute_path = DATASET_DIR / image_path
-    if not absolute_path.exists():
-        raise FileNotFoundError(f"Image not found: {absolute_path}")
-    return absolute_path
-
-
-def display_status() -> None:
-    current = st.session_state["current_question_idx"] + 1
-    total = st.session_state["total_questions"]
-    score = st.session_state["score"]
-    difficulty = st.session_state.get("difficulty", "medium")
-    st.markdown(f"**진행 상황 / Progress:** {current} / {total}")
-    st.markdown(f"**점수 / Score:** {score} / {scoring.max_score()}")
-    st.markdown(f"**난이도 / Difficulty:** {difficulty_label(difficulty)}")
-    if st.session_state["history"]:
-        last = st.session_state["history"][-1]
+def display_status(quiz: session.QuizSession) -> None:
+    current = quiz.current_index + 1
+    st.markdown(f"**진행 상황 / Progress:** {current} / {quiz.total_questions}")
+    st.markdown(f"**점수 / Score:** {quiz.score} / {scoring.max_score()}")
+    st.markdown(f"**난이도 / Difficulty:** {difficulty_label(quiz.difficulty)}")
+    if quiz.history:
+        last = quiz.history[-1]
         message = (
             "✅ 정답! / Correct!"
-            if last["is_correct"]
-            else f"❌ 오답 / Incorrect: 정답은 {last['correct_label']}"
+            if last.is_correct
+            else f"❌ 오답 / Incorrect: 정답은 {quiz.label(last.correct_row)}"
         )
         st.info(message)
 
 
-def display_image(correct_row: pd.Series) -> None:
+def display_image(image_path: str) -> None:
     try:
-        image_path = load_image_path(correct_row["image_path"])
-        st.image(str(image_path), use_column_width=True)
+        image_bytes = images.load_image_bytes(image_path)
+        st.image(image_bytes, use_column_width=True)
     except FileNotFoundError as exc:
         st.error(str(exc))
 
 
-def log_response(
-    correct_row: pd.Series,
-    selected_row: pd.Series,
-    is_correct: bool,
-    response_time: float,
-) -> None:
-    storage.log_response(
-        {
-            "session_id": st.session_state["session_id"],
-            "timestamp": storage.utc_timestamp(),
-            "question_idx": st.session_state["current_question_idx"] + 1,
-            "image_path": correct_row["image_path"],
-            "selected_make_en": selected_row.get("make_en", ""),
-            "selected_model_en": selected_row.get("model_en", ""),
-            "selected_year": selected_row.get("year", ""),
-            "selected_variant": selected_row.get("variant", ""),
-            "correct_make_en": correct_row.get("make_en", ""),
-            "correct_model_en": correct_row.get("model_en", ""),
-            "correct_year": correct_row.get("year", ""),
-            "correct_variant": correct_row.get("variant", ""),
-            "is_correct": int(is_correct),
-            "score_after_question": st.session_state["score"],
-            "response_time_sec": round(response_time, 2),
-        }
-    )
-
-
-def log_summary(total_time: float) -> None:
-    if st.session_state.get("summary_logged"):
-        return
-
-    history = st.session_state["history"]
-    correct_answers = sum(1 for item in history if item["is_correct"])
-    average_time = total_time / len(history) if history else 0.0
-
-    storage.log_summary(
-        {
-            "session_id": st.session_state["session_id"],
-            "timestamp": storage.utc_timestamp(),
-            "total_questions": st.session_state["total_questions"],
-            "correct_answers": correct_answers,
-            "total_score": st.session_state["score"],
-            "total_time_sec": round(total_time, 2),
-            "average_response_time_sec": round(average_time, 2),
-            "difficulty": st.session_state.get("difficulty", "medium"),
-            "ended_early": int(st.session_state["ended_early"]),
-        }
-    )
-    st.session_state["summary_logged"] = True
-
-
-def handle_submission(
-    df: pd.DataFrame,
-    correct_row: pd.Series,
-    selected_option: Optional[options.OptionItem],
-) -> None:
-    if selected_option is None:
-        st.warning("보기를 선택해 주세요. Please choose an option.")
-        return
-
-    response_time = time.time() - st.session_state["question_start_ts"]
-    selected_row = df.loc[selected_option.row_idx]
-    is_correct = selected_option.row_idx == correct_row.name
-
-    st.session_state["score"] += scoring.score_answer(is_correct)
+def prefetch_next_image(quiz: session.QuizSession) -> None:
+    """Warm the next question's image while the current one is answered."""
+    next_image = quiz.next_image_path()
+    if next_image is not None:
+        images.PREFETCHER.prefetch(next_image)
 
-    log_response(correct_row, selected_row, is_correct, response_time)
-
-    st.session_state["history"].append(
-        {
-            "question": st.session_state["current_question_idx"] + 1,
-            "selected_label": selected_option.label,
-            "correct_label": options.build_option_label(correct_row),
-            "is_correct": is_correct,
-            "response_time_sec": round(response_time, 2),
-        }
-    )
-
-    st.session_state["current_question_idx"] += 1
-    st.session_state["current_options"] = None
-    st.session_state["question_start_ts"] = time.time()
-    st.session_state.pop("selected_option", None)
-
-
-def has_finished() -> bool:
-    reached_end = st.session_state["current_question_idx"] >= st.session_state["total_questions"]
-    return reached_end or st.session_state.get("ended_early", False)
-
-
-def display_summary() -> None:
-    total_time = (
-        sum(entry["response_time_sec"] for entry in st.session_state["history"])
-        if st.session_state["history"]
-        else 0.0
-    )
-    log_summary(total_time)
 
+def display_summary(quiz: session.QuizSession) -> None:
     st.success("퀴즈가 종료되었습니다! / Quiz complete!")
     st.metric(
         label="최종 점수 / Final Score",
-        value=f"{st.session_state['score']} / {scoring.max_score()}",
-    )
-    st.write(
-        f"선택 난이도 / Difficulty: {difficulty_label(st.session_state.get('difficulty', 'medium'))}"
+        value=f"{quiz.score} / {scoring.max_score()}",
     )
+    st.write(f"선택 난이도 / Difficulty: {difficulty_label(quiz.difficulty)}")
+    st.write(f"정답 수 / Correct answers: {quiz.correct_answers}")
+    st.write(f"총 소요 시간 / Total time: {quiz.total_time:.2f}s")
 
-    correct_answers = sum(1 for entry in st.session_state["history"] if entry["is_correct"])
-    st.write(f"정답 수 / Correct answers: {correct_answers}")
-    st.write(f"총 소요 시간 / Total time: {total_time:.2f}s")
-
-    if st.session_state["history"]:
+    if quiz.history:
         st.subheader("문항별 기록 / Question Review")
-        for entry in st.session_state["history"]:
+        for entry in quiz.history:
             st.write(
-                f"Q{entry['question']}: {'✅' if entry['is_correct'] else '❌'} "
-                f"{entry['selected_label']} "
-                f"(정답 / Correct: {entry['correct_label']}, "
-                f"응답 시간 / Response time: {entry['response_time_sec']}s)"
+                f"Q{entry.question}: {'✅' if entry.is_correct else '❌'} "
+                f"{quiz.label(entry.selected_row)} "
+                f"(정답 / Correct: {quiz.label(entry.correct_row)}, "
+                f"응답 시간 / Response time: {entry.response_time_sec}s)"
             )
 
     if st.button("다시 시작 / Restart Quiz"):
-        reset_session(difficulty=st.session_state.get("difficulty", "medium"))
+        reset_session(difficulty=quiz.difficulty)
         st.rerun()
 
 
-def main() -> None:
+def display_debug_panel() -> None:
+    """Show this session's previous rerun timings and the process-wide counters."""
+    if not metrics.ENABLED:
+        return
+    if not st.sidebar.checkbox("타이밍 보기 / Show timings"):
+        return
+    with st.sidebar.expander("디버그 / Debug", expanded=True):
+        st.caption("직전 실행 / Last rerun (ms)")
+        st.table(
+            {
+                phase: round(seconds * 1000, 2)
+                for phase, seconds in sorted(
+                    st.session_state.get("last_rerun_timings", {}).items()
+                )
+            }
+        )
+        st.caption("누적 / All reruns")
+        st.table(metrics.REGISTRY.summary())
+        counters = metrics.REGISTRY.counter_values()
+        if counters:
+            st.caption("카운터 / Counters")
+            st.table(counters)
+
+
+def run_quiz() -> None:
     configure_page()
     difficulty = select_difficulty()
-    df = load_metadata(LABELS_CSV)
-    init_session_state(df, difficulty)
+    display_debug_panel()
+    with metrics.timer("get_quiz"):
+        quiz = get_quiz(difficulty)
 
     display_header()
 
-    if has_finished():
-        display_summary()
+    if quiz.finished:
+        display_summary(quiz)
         return
 
-    correct_row = get_current_dataframe_row(df)
-    display_status()
+    display_status(quiz)
 
     col_image, col_options = st.columns([3, 2])
-    with col_image:
-        display_image(correct_row)
+    with col_image, metrics.timer("display_image"):
+        display_image(quiz.image_path(quiz.current_row()))
+    with metrics.timer("prefetch"):
+        prefetch_next_image(quiz)
 
-    possible_options = ensure_current_options(df)
+    with metrics.timer("current_options"):
+        possible_options = quiz.current_options()
     with col_options:
         st.subheader("정답 선택 / Select the correct car")
         selected = st.radio(
@@ -336,24 +199,34 @@ def main() -> None:
 
         submit_clicked = st.button("제출 / Submit", type="primary")
         if submit_clicked:
-            handle_submission(df, correct_row, selected)
-            if st.session_state["score"] >= 60 and not st.session_state["ended_early"]:
-                st.session_state["ended_early_allowed"] = True
-            st.rerun()
+            if selected is None:
+                st.warning("보기를 선택해 주세요. Please choose an option.")
+            else:
+                with metrics.timer("submit"):
+                    quiz.submit(selected.row_idx)
+                st.session_state.pop("selected_option", None)
+                st.rerun()
 
-        can_end = (
-            st.session_state["score"] >= 60
-            or st.session_state["current_question_idx"] + 1
-            > st.session_state["total_questions"]
-        )
         end_now = st.button(
             "종료 / End Quiz",
-            disabled=not can_end,
+            disabled=not quiz.can_end,
         )
-        if end_now and can_end:
-            st.session_state["ended_early"] = True
+        if end_now and quiz.can_end:
+            quiz.end_early()
             st.rerun()
 
 
+def main() -> None:
+    metrics.begin_rerun()
+    try:
+        run_quiz()
+    finally:
+        # Also runs when st.rerun()/st.stop() end the script early.
+        phases = metrics.end_rerun()
+        if phases:
+            # Per session, so the panel never shows another session's rerun.
+            st.session_state["last_rerun_timings"] = phases
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1 @@
+"""Benchmarks and load generation on synthetic data."""
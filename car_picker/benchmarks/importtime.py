@@ -0,0 +1,106 @@
+"""Import-time budget for the headless quiz core.
+
+Imports the core modules in a fresh interpreter with ``python -X importtime``
+and checks that the best of ``--repeat`` runs stays under the budget and
+that none of the heavy optional dependencies were loaded on the way::
+
+    python -m car_picker.benchmarks.importtime --budget-ms 150
+
+Exits with status 1 when the budget is exceeded or a forbidden module was
+imported, and lists the modules with the largest self time.
+"""
+
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+from typing import Dict, List, NamedTuple
+
+CORE_MODULES = [
+    "car_picker.app.metrics",
+    "car_picker.app.scoring",
+    "car_picker.app.options",
+    "car_picker.app.storage",
+    "car_picker.app.catalog",
+    "car_picker.app.session",
+]
+# Dependencies the core must only import lazily.
+FORBIDDEN_MODULES = ["pandas", "pyarrow", "streamlit", "PIL"]
+DEFAULT_BUDGET_MS = 150.0
+
+
+class ImportProfile(NamedTuple):
+    total_us: int
+    self_us: Dict[str, int]
+
+
+def profile_imports(modules: List[str]) -> ImportProfile:
+    """Import ``modules`` in a new interpreter and parse its importtime log."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules)}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total_us = 0
+    self_us: Dict[str, int] = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, cumulative, name = line[len("import time:") :].split("|")
+        if not own.strip().isdigit():
+            continue  # The header line.
+        module = name.strip()
+        self_us[module] = int(own)
+        # Top-level entries of the package add up to the whole import.
+        if not name[1:].startswith(" ") and module.split(".")[0] == "car_picker":
+            total_us += int(cumulative)
+    return ImportProfile(total_us, self_us)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check the core import-time budget.")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=DEFAULT_BUDGET_MS,
+        help="Allowed cumulative import time of the core modules",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Fresh interpreters to time"
+    )
+    parser.add_argument(
+        "--top", type=int, default=10, help="Slowest modules to list by self time"
+    )
+    args = parser.parse_args()
+
+    profiles = [profile_imports(CORE_MODULES) for _ in range(max(1, args.repeat))]
+    best = min(profiles, key=lambda profile: profile.total_us)
+    total_ms = best.total_us / 1000
+
+    print(f"Core import time: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    slowest = sorted(best.self_us.items(), key=lambda item: item[1], reverse=True)
+    for module, own in slowest[: args.top]:
+        print(f"  {own / 1000:8.2f} ms  {module}")
+
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f"{total_ms:.1f} ms exceeds the {args.budget_ms:.0f} ms budget")
+    loaded = sorted(
+        module
+        for module in best.self_us
+        if module.split(".")[0] in FORBIDDEN_MODULES
+    )
+    if loaded:
+        roots = sorted({module.split(".")[0] for module in loaded})
+        failures.append(f"eagerly imported {', '.join(roots)}")
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("Within budget.")
+
+
+if __name__ == "__main__":
+    main()
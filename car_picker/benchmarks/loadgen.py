@@ -0,0 +1,196 @@
+"""Headless load generator for the quiz engine and the log storage.
+
+Simulates ``--players`` concurrent players spread over ``--processes``
+worker processes. Each worker keeps its players' ``QuizSession`` objects
+alive at the same time and advances them round-robin, one operation per
+player per turn, logging through a real storage backend in a temporary
+results directory. Reports throughput and p50/p95/p99 latency per
+operation::
+
+    python -m car_picker.benchmarks.loadgen --players 200 --processes 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from car_picker.app import catalog, options, session, storage
+from car_picker.benchmarks import synthetic
+
+OPERATIONS = ["start", "options", "submit", "end_early", "flush"]
+
+Latencies = Dict[str, List[float]]
+
+
+def _make_backend(name: str, results_dir: Path) -> storage.LogBackend:
+    if name == "sqlite":
+        return storage.SQLiteBackend(results_dir / "quiz_logs.sqlite3")
+    return storage.CsvBackend(
+        {
+            "quiz_log": results_dir / "quiz_log.csv",
+            "summary": results_dir / "summary.csv",
+        },
+        segment_dir=results_dir / "segments",
+    )
+
+
+def run_worker(
+    worker: int,
+    players: int,
+    sessions_per_player: int,
+    catalog_csv: Path,
+    results_dir: Path,
+    backend: str,
+    difficulty: str,
+    accuracy: float,
+    end_early: float,
+    seed: int,
+) -> Latencies:
+    """Play ``sessions_per_player`` quizzes for each of ``players`` players."""
+    rng = random.Random(seed + worker)
+    session_catalog = catalog.CatalogCache().get(catalog_csv)
+    writer = storage._LogWriter(_make_backend(backend, results_dir))
+    latencies: Latencies = {operation: [] for operation in OPERATIONS}
+
+    def timed(operation: str, call):
+        start = time.perf_counter()
+        result = call()
+        latencies[operation].append(time.perf_counter() - start)
+        return result
+
+    def start_quiz() -> session.QuizSession:
+        quiz_rng = random.Random(rng.getrandbits(64))
+        return session.QuizSession(
+            session_catalog, difficulty, rng=quiz_rng, log=writer
+        )
+
+    remaining = [sessions_per_player] * players
+    quizzes: List[Optional[session.QuizSession]] = [None] * players
+    while any(remaining):
+        for player in range(players):
+            quiz = quizzes[player]
+            if quiz is None:
+                if remaining[player] == 0:
+                    continue
+                quizzes[player] = timed("start", start_quiz)
+                continue
+            if quiz.can_end and not quiz.finished and rng.random() < end_early:
+                timed("end_early", quiz.end_early)
+            else:
+                choices = timed("options", quiz.current_options)
+                correct_row = quiz.current_row()
+                if rng.random() < accuracy:
+                    selected = correct_row
+                else:
+                    selected = rng.choice(choices).row_idx
+                timed("submit", lambda: quiz.submit(selected))
+            if quiz.finished:
+                quizzes[player] = None
+                remaining[player] -= 1
+    timed("flush", writer.close)
+    return latencies
+
+
+def _report(latencies: Latencies, elapsed: float) -> None:
+    print(
+        f"{'operation':<10} {'count':>8} {'ops/s':>10} "
+        f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    )
+    for operation in OPERATIONS:
+        values = np.asarray(latencies[operation]) * 1000
+        if values.size == 0:
+            continue
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        print(
+            f"{operation:<10} {values.size:>8} {values.size / elapsed:>10.0f} "
+            f"{p50:>9.3f} {p95:>9.3f} {p99:>9.3f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Simulate concurrent quiz players.")
+    parser.add_argument("--players", type=int, default=100, help="Concurrent players")
+    parser.add_argument("--processes", type=int, default=4, help="Worker processes")
+    parser.add_argument(
+        "--sessions", type=int, default=3, help="Quizzes played by every player"
+    )
+    parser.add_argument(
+        "--rows", type=int, default=10_000, help="Rows of the synthetic catalog"
+    )
+    parser.add_argument(
+        "--catalog", type=Path, help="Use this car_labels.csv, not a synthetic one"
+    )
+    parser.add_argument(
+        "--backend", choices=["csv", "sqlite"], default="csv", help="Log backend"
+    )
+    parser.add_argument(
+        "--difficulty", choices=list(options.DIFFICULTY_PLANS), default="medium"
+    )
+    parser.add_argument(
+        "--accuracy", type=float, default=0.5, help="Chance a player answers right"
+    )
+    parser.add_argument(
+        "--end-early",
+        type=float,
+        default=0.3,
+        help="Chance a player ends the quiz once allowed",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    processes = max(1, min(args.processes, args.players))
+    with tempfile.TemporaryDirectory(prefix="car-picker-load-") as tmp:
+        workdir = Path(tmp)
+        catalog_csv = args.catalog or synthetic.write_catalog(
+            args.rows, workdir / "car_labels.csv", args.seed
+        )
+        results_dir = workdir / "results"
+        results_dir.mkdir()
+        shares = [
+            args.players // processes + (worker < args.players % processes)
+            for worker in range(processes)
+        ]
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [
+                pool.submit(
+                    run_worker,
+                    worker,
+                    players,
+                    args.sessions,
+                    catalog_csv,
+                    results_dir,
+                    args.backend,
+                    args.difficulty,
+                    args.accuracy,
+                    args.end_early,
+                    args.seed,
+                )
+                for worker, players in enumerate(shares)
+            ]
+            merged: Latencies = {operation: [] for operation in OPERATIONS}
+            for future in futures:
+                for operation, values in future.result().items():
+                    merged[operation].extend(values)
+        elapsed = time.perf_counter() - start
+
+    sessions = len(merged["start"])
+    print(
+        f"{args.players} players x {args.sessions} sessions on {processes} processes "
+        f"({args.backend} logs): {sessions} sessions in {elapsed:.2f}s, "
+        f"{sessions / elapsed:.1f} sessions/s"
+    )
+    _report(merged, elapsed)
+
+
+if __name__ == "__main__":
+    main()
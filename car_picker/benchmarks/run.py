@@ -0,0 +1,272 @@
+"""Benchmarks for option generation, catalog loading, metadata builds and logging.
+
+Every benchmark reports the best wall time of ``--repeat`` runs and the
+peak traced Python allocation (``tracemalloc``) of one extra run, so the
+memory probe does not slow down the timed runs (worker processes of the
+build pipeline are not traced). Results are written as
+JSON and can be compared against a stored baseline::
+
+    python -m car_picker.benchmarks.run --sizes 1k,100k --save-baseline
+    python -m car_picker.benchmarks.run --sizes 1k,100k --threshold 0.2
+
+The second run exits with status 1 when any benchmark got slower, or used
+more memory, than the baseline by more than the threshold.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from car_picker.app import catalog, options, storage
+from car_picker.benchmarks import loadgen, synthetic
+from car_picker.data import build_metadata
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_OUTPUT = BENCH_DIR.parent / "results" / "benchmarks" / "latest.json"
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+DEFAULT_THRESHOLD = 0.25
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+# Questions generated per option benchmark run.
+OPTION_CALLS = 200
+# Rows logged per storage benchmark run.
+LOG_ROWS = 2_000
+
+Result = Dict[str, float]
+
+
+def measure(run: Callable[[], object], repeat: int, ops: int = 1) -> Result:
+    """Return the best time of ``repeat`` runs and the peak traced memory."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds": best,
+        "seconds_per_op": best / ops,
+        "ops_per_sec": ops / best if best else float("inf"),
+        "peak_bytes": peak,
+    }
+
+
+def bench_options(rows: int, repeat: int) -> Dict[str, Result]:
+    frame = synthetic.make_catalog(rows)
+    frame[options.LABEL_COLUMN] = options.build_option_labels(frame)
+    index = options.build_catalog_index(frame)
+    questions = random.Random(0).sample(range(rows), min(OPTION_CALLS, rows))
+    results = {}
+    for difficulty in options.DIFFICULTY_PLANS:
+        rng = random.Random(1)
+
+        def run() -> None:
+            for correct_idx in questions:
+                options.generate_options(
+                    frame, correct_idx, 10, difficulty, rng, index=index
+                )
+
+        results[f"generate_options[{difficulty}]"] = measure(
+            run, repeat, ops=len(questions)
+        )
+    return results
+
+
+def bench_load_metadata(rows: int, repeat: int, workdir: Path) -> Dict[str, Result]:
+    csv_path = synthetic.write_catalog(rows, workdir / "csv" / "car_labels.csv")
+    results = {
+        "load_metadata[csv]": measure(
+            lambda: catalog.load_metadata(csv_path), repeat, ops=rows
+        )
+    }
+    arrow_csv = synthetic.write_catalog(rows, workdir / "arrow" / "car_labels.csv")
+    if build_metadata.write_arrow(arrow_csv, catalog.columnar_path(arrow_csv)):
+        results["load_metadata[arrow]"] = measure(
+            lambda: catalog.load_metadata(arrow_csv), repeat, ops=rows
+        )
+    return results
+
+
+def bench_build_metadata(files: int, repeat: int, workdir: Path) -> Dict[str, Result]:
+    root, _ = synthetic.make_filename_tree(files, workdir / "dataset")
+    output = workdir / "car_labels.csv"
+
+    def run() -> None:
+        image_files = build_metadata.iter_image_files(root)
+        rows = build_metadata.iter_label_rows(image_files, root, {}, {})
+        build_metadata.write_csv(rows, output)
+        build_metadata.write_arrow(output, output.with_suffix(".arrow"))
+
+    return {"build_metadata[end_to_end]": measure(run, repeat, ops=files)}
+
+
+def bench_log_writer(repeat: int, workdir: Path) -> Dict[str, Result]:
+    row = {column: "0" for column in storage.QUIZ_LOG_COLUMNS}
+    results = {}
+    for backend in ("csv", "sqlite"):
+        runs = iter(range(repeat + 1))
+
+        def run() -> None:
+            # A fresh directory per run, so every run starts from empty logs.
+            results_dir = workdir / f"logs-{backend}-{next(runs)}"
+            writer = storage._LogWriter(loadgen._make_backend(backend, results_dir))
+            for _ in range(LOG_ROWS):
+                writer.log_response(row)
+            writer.close()
+
+        results[f"storage.log_writer[{backend}]"] = measure(
+            run, repeat, ops=LOG_ROWS
+        )
+    return results
+
+
+def run_benchmarks(sizes: List[str], tree_sizes: List[str], repeat: int) -> dict:
+    results: Dict[str, Result] = {}
+    with tempfile.TemporaryDirectory(prefix="car-picker-bench-") as tmp:
+        workdir = Path(tmp)
+        for size in sizes:
+            rows = SIZES[size]
+            for name, result in bench_options(rows, repeat).items():
+                results[f"{name}@{size}"] = result
+            size_dir = workdir / f"catalog-{size}"
+            for name, result in bench_load_metadata(rows, repeat, size_dir).items():
+                results[f"{name}@{size}"] = result
+        for size in tree_sizes:
+            tree_dir = workdir / f"tree-{size}"
+            for name, result in bench_build_metadata(
+                SIZES[size], repeat, tree_dir
+            ).items():
+                results[f"{name}@{size}"] = result
+        results.update(bench_log_writer(repeat, workdir))
+    return {
+        "meta": {
+            "created": datetime.now(tz=timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[str]:
+    """Return a description of every benchmark that regressed past ``threshold``."""
+    regressions = []
+    for name, before in baseline["results"].items():
+        after = current["results"].get(name)
+        if after is None:
+            continue
+        for metric in ("seconds", "peak_bytes"):
+            if before[metric] and after[metric] > before[metric] * (1 + threshold):
+                change = after[metric] / before[metric] - 1
+                regressions.append(
+                    f"{name} {metric}: {before[metric]:.4g} -> {after[metric]:.4g} "
+                    f"(+{change:.0%})"
+                )
+    return regressions
+
+
+def _print_results(results: Dict[str, Result]) -> None:
+    width = max(len(name) for name in results)
+    for name, result in results.items():
+        print(
+            f"{name:<{width}}  {result['seconds'] * 1000:10.2f} ms  "
+            f"{result['ops_per_sec']:12.0f} ops/s  "
+            f"{result['peak_bytes'] / 1024**2:8.1f} MiB"
+        )
+
+
+def _parse_sizes(value: str) -> List[str]:
+    sizes = [size.strip().lower() for size in value.split(",") if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            f"Unknown size(s) {unknown}; choose from {list(SIZES)}"
+        )
+    return sizes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the car_picker benchmarks.")
+    parser.add_argument(
+        "--sizes",
+        type=_parse_sizes,
+        default=["1k", "100k"],
+        help="Catalog sizes for option and load benchmarks (1k,10k,100k,1m)",
+    )
+    parser.add_argument(
+        "--tree-sizes",
+        type=_parse_sizes,
+        default=["1k", "10k"],
+        help="Number of synthetic files for the build_metadata benchmark",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Timed runs per benchmark"
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=DEFAULT_OUTPUT,
+        help="Where to write the results (default: results/benchmarks/latest.json)",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=DEFAULT_BASELINE,
+        help="Baseline to compare against (default: benchmarks/baseline.json)",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Allowed relative slowdown or memory growth before failing",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Store these results as the new baseline instead of comparing",
+    )
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.sizes, args.tree_sizes, max(1, args.repeat))
+    _print_results(report["results"])
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Wrote results to {args.output}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Saved baseline to {args.baseline}")
+        return
+    if not args.baseline.exists():
+        print("No baseline to compare against; run with --save-baseline first.")
+        return
+
+    regressions = compare(
+        report, json.loads(args.baseline.read_text(encoding="utf-8")), args.threshold
+    )
+    if regressions:
+        print(f"Regressions beyond {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"No regressions beyond {args.threshold:.0%}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Synthetic catalogs and filename trees for the benchmarks.
+
+Makes follow a Zipf-like popularity curve, every make has a skewed number
+of models and every model is sold over a run of consecutive years, which
+mirrors the shape of the scraped dataset.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+MAKES = [
+    "Acura", "Alfa Romeo", "Aston Martin", "Audi", "Bentley", "BMW", "Buick",
+    "Cadillac", "Chevrolet", "Chrysler", "Dodge", "Ferrari", "FIAT", "Ford",
+    "Genesis", "GMC", "Honda", "Hyundai", "INFINITI", "Jaguar", "Jeep", "Kia",
+    "Lamborghini", "Land Rover", "Lexus", "Lincoln", "Lotus", "Maserati",
+    "Mazda", "McLaren", "Mercedes-Benz", "MINI", "Mitsubishi", "Nissan",
+    "Porsche", "Ram", "Rolls-Royce", "smart", "Subaru", "Tesla", "Toyota",
+    "Volkswagen", "Volvo",
+]
+FIRST_YEAR = 1995
+LAST_YEAR = 2021
+DRIVETRAINS = ["FWD", "RWD", "AWD", "4WD"]
+BODIES = ["4dr", "2dr", "SUV", "Pickup", "Van", "Convertible"]
+
+
+def _zipf_weights(count: int, exponent: float = 1.1) -> np.ndarray:
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _model_table(rng: np.random.Generator) -> pd.DataFrame:
+    """Return one row per (make, model) with its popularity and year range."""
+    make_weights = _zipf_weights(len(MAKES))
+    rng.shuffle(make_weights)
+    records = []
+    for make, make_weight in zip(MAKES, make_weights):
+        n_models = int(rng.integers(3, 31))
+        model_weights = _zipf_weights(n_models)
+        for number, model_weight in enumerate(model_weights):
+            first = int(rng.integers(FIRST_YEAR, LAST_YEAR))
+            span = int(rng.integers(3, 16))
+            records.append(
+                (
+                    make,
+                    f"{make.split()[0][:3].upper()}{number + 1}",
+                    first,
+                    min(LAST_YEAR, first + span),
+                    make_weight * model_weight,
+                )
+            )
+    table = pd.DataFrame(
+        records, columns=["make", "model", "first_year", "last_year", "weight"]
+    )
+    table["weight"] /= table["weight"].sum()
+    return table
+
+
+def make_catalog(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Return a catalog frame with the columns of ``car_labels.csv``."""
+    rng = np.random.default_rng(seed)
+    models = _model_table(rng)
+    picks = rng.choice(len(models), size=rows, p=models["weight"].to_numpy())
+    chosen = models.iloc[picks].reset_index(drop=True)
+    spans = (chosen["last_year"] - chosen["first_year"] + 1).to_numpy()
+    years = chosen["first_year"].to_numpy() + (rng.random(rows) * spans).astype(int)
+    variants = np.asarray(DRIVETRAINS)[rng.integers(len(DRIVETRAINS), size=rows)]
+
+    make = chosen["make"].str.replace(" ", "-")
+    image_path = (
+        make
+        + "_"
+        + chosen["model"]
+        + "_"
+        + years.astype(str)
+        + "_"
+        + pd.Series(np.arange(rows)).astype(str)
+        + ".jpg"
+    )
+    return pd.DataFrame(
+        {
+            "image_path": image_path,
+            "make_ko": chosen["make"],
+            "make_en": chosen["make"],
+            "model_ko": chosen["model"],
+            "model_en": chosen["model"],
+            "year": years.astype(str),
+            "variant": variants,
+            "source_url": "",
+            "notes": "",
+        }
+    )
+
+
+def write_catalog(rows: int, path: Path, seed: int = 0) -> Path:
+    """Write a synthetic ``car_labels.csv`` with ``rows`` rows to ``path``."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    make_catalog(rows, seed).to_csv(path, index=False)
+    return path
+
+
+def make_filename_tree(
+    files: int, root: Path, seed: int = 0, per_directory: int = 2_000
+) -> Tuple[Path, int]:
+    """Create empty image files named like the dataset under ``root``.
+
+    Files are spread over sub-directories of ``per_directory`` entries so the
+    scanner's directory fan-out is exercised. Returns the root and the file
+    count.
+    """
+    rng = np.random.default_rng(seed)
+    catalog = make_catalog(files, seed)
+    specs = rng.integers(10, 99, size=(files, 9))
+    drivetrains = rng.integers(len(DRIVETRAINS), size=files)
+    bodies = rng.integers(len(BODIES), size=files)
+    for position, row in enumerate(catalog.itertuples(index=False)):
+        directory = root / f"part{position // per_directory:04d}"
+        if position % per_directory == 0:
+            directory.mkdir(parents=True, exist_ok=True)
+        spec = "_".join(map(str, specs[position]))
+        name = (
+            f"{row.make_en.replace(' ', '-')}_{row.model_en}_{row.year}_{spec}_"
+            f"{DRIVETRAINS[drivetrains[position]]}_5_4_{BODIES[bodies[position]]}_"
+            f"{position:x}.jpg"
+        )
+        (directory / name).touch()
+    return root, files
@@ -0,0 +1 @@
+"""Metadata generation for the car catalog."""
@@ -8,7 +8,16 @@ Running this script will scan all images, extract basic metadata, and write a
 CSV with the schema required by the quiz application:
 
     image_path, make_ko, make_en, model_ko, model_en, year,
-    variant, source_url, notes
+    variant, source_url, notes, content_hash, phash, duplicate_of
+
+followed by the spec columns encoded in the filename (``SPEC_COLUMNS``).
+Filenames are parsed a chunk at a time with one compiled regular
+expression; ``variant`` is "drivetrain body" and rows whose make, model or
+year cannot be parsed keep the reason in ``notes``.
+
+The hash columns are only filled in with ``--hash``. With ``--shards`` the
+image list comes from the index of a pack written by ``app.shards``
+instead of a directory scan, and hashed images are read from the pack.
 
 Translations default to their English counterparts, but you can supply an
 external JSON file to override them with proper Korean labels.
@@ -18,15 +27,52 @@ from __future__ import annotations
 
 import argparse
 import csv
+import hashlib
+import io
 import json
-from dataclasses import dataclass
+import os
+import re
+import tempfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import Dict, Iterable, Optional
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    TYPE_CHECKING,
+    TypeVar,
+)
+
+if TYPE_CHECKING:
+    from car_picker.app.shards import ShardStore
 
 # Default location of the dataset relative to this script.
 DEFAULT_DATASET_DIR = Path(__file__).resolve().parents[1] / "dataset"
 # Default location for the generated CSV.
 DEFAULT_OUTPUT_CSV = Path(__file__).resolve().parent / "car_labels.csv"
+# Image extensions picked up by the scanner (matched case-sensitively).
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png")
+# Default number of scanner threads and parser processes.
+DEFAULT_WORKERS = os.cpu_count() or 1
+# Number of files parsed at once (and handed to a parser process at a time).
+PARSE_CHUNK_SIZE = 5000
+# Smaller chunks when the workers also hash images, which takes far longer
+# per file, so the pool stays busy and the last chunks do not form a tail.
+HASH_CHUNK_SIZE = 200
+# Number of rows buffered before each CSV write.
+WRITE_BATCH_SIZE = 1000
+# Bytes of CSV converted into each Arrow record batch. The streaming reader
+# reads a few blocks ahead per thread, so this bounds the conversion memory.
+ARROW_BLOCK_BYTES = 1024**2
 # Original data attribution.
 SOURCE_URL = (
     "https://github.com/nicolas-gervais/"
@@ -67,6 +113,22 @@ DEFAULT_MODEL_TRANSLATIONS: Dict[str, str] = {
     "Sorento": "쏘렌토",
 }
 
+# Columns stored dictionary-encoded in the columnar (Arrow IPC) artifact.
+DICTIONARY_COLUMNS = [
+    "make_ko",
+    "make_en",
+    "model_ko",
+    "model_en",
+    "year",
+    "variant",
+    "source_url",
+    "drivetrain",
+    "body",
+]
+
+# Columns of the incremental-mode manifest written next to the output CSV.
+MANIFEST_COLUMNS = ["image_path", "size", "mtime_ns"]
+
 # CSV column order used across the app.
 CSV_COLUMNS = [
     "image_path",
@@ -78,11 +140,65 @@ CSV_COLUMNS = [
     "variant",
     "source_url",
     "notes",
+    "content_hash",
+    "phash",
+    "duplicate_of",
+    "msrp",
+    "wheel_size",
+    "horsepower",
+    "displacement",
+    "cylinders",
+    "width",
+    "height",
+    "length",
+    "mpg",
+    "drivetrain",
+    "passengers",
+    "doors",
+    "body",
 ]
 
+# Filename fields after make, model and year, in order: MSRP in $1000s,
+# front wheel size (in), SAE net horsepower, displacement (0.1 L), cylinders,
+# width, height and length (in), combined MPG, drivetrain, passenger
+# capacity, passenger doors and body style. A random id ends the name.
+SPEC_COLUMNS = CSV_COLUMNS[CSV_COLUMNS.index("msrp") :]
+# Spec columns holding integers; "nan" and other non-digit tokens stay empty.
+NUMERIC_SPEC_COLUMNS = [
+    column for column in SPEC_COLUMNS if column not in ("drivetrain", "body")
+]
+# Longest numeric spec token kept; longer ones would overflow the int32
+# columns of the Arrow catalog, so they stay empty like malformed ones.
+MAX_SPEC_DIGITS = 9
+
+
+def _spec_field(column: str) -> str:
+    # A group only captures a well-formed value; anything else leaves it None.
+    if column in NUMERIC_SPEC_COLUMNS:
+        return rf"_(?:(?P<{column}>\d{{1,{MAX_SPEC_DIGITS}}})|[^_]*)"
+    return rf"_(?:nan|(?P<{column}>[^_]*))"
+
+
+# Make_Model_Year, optionally followed by every spec field and the id. Names
+# with other trailing tokens still yield make, model and year.
+FILENAME_PATTERN = re.compile(
+    r"^(?P<make>[^_]+)_(?P<model>[^_]+)_(?P<year>\d{4})[^_]*"
+    r"(?:"
+    + "".join(_spec_field(column) for column in SPEC_COLUMNS)
+    + r"_[^_]*|_.*)?$"
+)
+# Groups of FILENAME_PATTERN, in order.
+FILENAME_FIELDS = ["make", "model", "year", *SPEC_COLUMNS]
+
+# Largest Hamming distance between perceptual hashes treated as near-identical.
+DEFAULT_NEAR_DUPLICATE_DISTANCE = 3
+# Each of the ``distance + 1`` bands of a 64-bit hash needs at least one bit.
+MAX_NEAR_DUPLICATE_DISTANCE = 63
+
+
+class LabelRow(NamedTuple):
+    """One CSV record; fields are stored in ``CSV_COLUMNS`` order."""
 
-@dataclass
-class LabelRow:
     image_path: str
     make_ko: str
     make_en: str
@@ -92,19 +208,25 @@ class LabelRow:
     variant: str
     source_url: str
     notes: str
+    content_hash: str = ""
+    phash: str = ""
+    duplicate_of: str = ""
+    msrp: str = ""
+    wheel_size: str = ""
+    horsepower: str = ""
+    displacement: str = ""
+    cylinders: str = ""
+    width: str = ""
+    height: str = ""
+    length: str = ""
+    mpg: str = ""
+    drivetrain: str = ""
+    passengers: str = ""
+    doors: str = ""
+    body: str = ""
 
     def to_csv_row(self) -> Dict[str, str]:
-        return {
-            "image_path": self.image_path,
-            "make_ko": self.make_ko,
-            "make_en": self.make_en,
-            "model_ko": self.model_ko,
-            "model_en": self.model_en,
-            "year": self.year,
-            "variant": self.variant,
-            "source_url": self.source_url,
-            "notes": self.notes,
-        }
+        return dict(zip(CSV_COLUMNS, self))
 
 
 def load_translations(path: Optional[Path]) -> tuple[Dict[str, str], Dict[str, str]]:
@@ -133,73 +255,805 @@ def load_translations(path: Optional[Path]) -> tuple[Dict[str, str], Dict[str, s
     return make_translations, model_translations
 
 
-def iter_image_files(root: Path) -> Iterable[Path]:
-    """Yield image files recursively from the dataset directory."""
+# A scanned image: absolute path, size in bytes and mtime in nanoseconds.
+# Size and mtime are only filled in when the scan was asked to stat files.
+ScannedFile = Tuple[str, int, int]
+
+
+def _scan_directory(
+    path: str, with_stat: bool = False
+) -> tuple[List[ScannedFile], List[str]]:
+    """Return the sorted image files and subdirectories directly under ``path``."""
+    files: List[ScannedFile] = []
+    subdirs: List[str] = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.name.endswith(IMAGE_SUFFIXES) and entry.is_file():
+                if with_stat:
+                    stat = entry.stat()
+                    files.append((entry.path, stat.st_size, stat.st_mtime_ns))
+                else:
+                    files.append((entry.path, 0, 0))
+    files.sort()
+    subdirs.sort()
+    return files, subdirs
+
+
+def _walk(root: Path, workers: int, with_stat: bool) -> Iterator[ScannedFile]:
     if not root.exists():
         raise FileNotFoundError(f"Dataset directory does not exist: {root}")
 
-    for suffix in (".jpg", ".jpeg", ".png"):
-        yield from root.rglob(f"*{suffix}")
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending: List[Future] = [pool.submit(_scan_directory, str(root), with_stat)]
+        while pending:
+            files, subdirs = pending.pop().result()
+            # Reversed so the first subdirectory is popped next.
+            pending.extend(
+                pool.submit(_scan_directory, d, with_stat) for d in reversed(subdirs)
+            )
+            yield from files
+
+
+def iter_image_files(root: Path, workers: int = DEFAULT_WORKERS) -> Iterator[Path]:
+    """Yield image files recursively from the dataset directory.
+
+    The tree is walked once with ``os.scandir``; subdirectories are listed
+    ahead of time on a thread pool while results are yielded depth-first in
+    sorted order, so the output order is deterministic.
+    """
+    for name, _, _ in _walk(root, workers, with_stat=False):
+        yield Path(name)
+
+
+def iter_image_stats(
+    root: Path, workers: int = DEFAULT_WORKERS
+) -> Iterator[tuple[Path, int, int]]:
+    """Like ``iter_image_files`` but also yield each file's size and mtime_ns."""
+    for name, size, mtime_ns in _walk(root, workers, with_stat=True):
+        yield Path(name), size, mtime_ns
+
+
+def iter_shard_stats(
+    shard_dir: Path, dataset_root: Path
+) -> Iterator[tuple[Path, int, int]]:
+    """Like ``iter_image_stats`` but list the images packed in ``shard_dir``.
+
+    Paths are placed under ``dataset_root`` even though no loose file needs
+    to exist there; the mtime is that of the image's shard.
+    """
+    from car_picker.app.shards import ShardStore
+
+    store = ShardStore(shard_dir)
+    if len(store) == 0:
+        raise FileNotFoundError(f"No image pack found in: {shard_dir}")
+    for image_path, size, mtime_ns in store.iter_entries():
+        yield dataset_root / image_path, size, mtime_ns
+
+
+def _parse_error(name: str) -> str:
+    if name.count("_") < 2:
+        return f"Unexpected filename format: {name}"
+    return f"Could not parse year from: {name}"
 
 
 def parse_metadata_from_filename(path: Path) -> tuple[str, str, str]:
     """Extract make, model, year from the dataset filename."""
-    name = path.stem
-    # Filenames are under-scored, make sure we have enough tokens.
-    parts = name.split("_")
-    if len(parts) < 3:
-        raise ValueError(f"Unexpected filename format: {path.name}")
+    match = FILENAME_PATTERN.match(path.stem)
+    if match is None:
+        raise ValueError(_parse_error(path.stem))
+    return match["make"], match["model"], match["year"]
 
-    make = parts[0]
-    model = parts[1]
-    year_token = parts[2]
 
-    # Attempt to extract a 4-digit year.
-    year = ""
-    for token in (year_token, year_token[:4]):
-        if len(token) >= 4 and token[:4].isdigit():
-            year = token[:4]
-            break
+def parse_filenames(paths: Sequence[Path]) -> Dict[str, List[str]]:
+    """Parse a batch of dataset filenames with ``FILENAME_PATTERN``.
 
-    if not year:
-        raise ValueError(f"Could not parse year from: {path.name}")
-
-    return make, model, year
+    Returns one list per ``FILENAME_FIELDS`` entry plus ``variant`` and
+    ``error``, aligned with ``paths``. Missing or malformed values are "";
+    ``error`` is only set when make, model or year could not be parsed.
+    """
+    match = FILENAME_PATTERN.match
+    unmatched = (None,) * len(FILENAME_FIELDS)
+    groups = [
+        found.groups() if (found := match(path.stem)) else unmatched
+        for path in paths
+    ]
+    columns = {
+        field: [value or "" for value in values]
+        for field, values in zip(FILENAME_FIELDS, zip(*groups))
+    } or {field: [] for field in FILENAME_FIELDS}
+    columns["variant"] = [
+        f"{drivetrain} {body}".strip()
+        for drivetrain, body in zip(columns["drivetrain"], columns["body"])
+    ]
+    columns["error"] = [
+        "" if year else _parse_error(path.name)
+        for path, year in zip(paths, columns["year"])
+    ]
+    return columns
 
 
-def build_row(
-    path: Path,
+def build_rows(
+    paths: Sequence[Path],
     dataset_root: Path,
     make_trans: Dict[str, str],
     model_trans: Dict[str, str],
+) -> List[LabelRow]:
+    """Build the rows of ``paths``, recording parse failures in ``notes``."""
+    parsed = parse_filenames(paths)
+    errors = parsed["error"]
+    count = len(paths)
+    # Scanned paths all live under the dataset root.
+    prefix = len(os.path.join(dataset_root, ""))
+    columns = {
+        **parsed,
+        "image_path": [str(path)[prefix:].replace(os.sep, "/") for path in paths],
+        "make_ko": [make_trans.get(make, make) for make in parsed["make"]],
+        "make_en": parsed["make"],
+        "model_ko": [model_trans.get(model, model) for model in parsed["model"]],
+        "model_en": parsed["model"],
+        "source_url": [SOURCE_URL] * count,
+        "notes": [f"parse_error: {error}" if error else "" for error in errors],
+    }
+    blank = [""] * count
+    return list(
+        map(
+            LabelRow._make,
+            zip(*(columns.get(column, blank) for column in CSV_COLUMNS)),
+        )
+    )
+
+
+def difference_hash(data: bytes) -> str:
+    """Return the 64-bit difference hash of an encoded image as hex.
+
+    Returns "" when Pillow or NumPy is missing or the image cannot be decoded.
+    """
+    try:
+        import numpy as np
+        from PIL import Image
+    except ImportError:
+        return ""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # Let the JPEG decoder downscale; only a 9x8 thumbnail is needed.
+            image.draft("L", (64, 64))
+            pixels = np.asarray(image.convert("L").resize((9, 8)), dtype=np.int16)
+    except OSError:
+        return ""
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return np.packbits(bits).tobytes().hex()
+
+
+def hash_row(
+    row: LabelRow, dataset_root: Path, store: Optional[ShardStore] = None
 ) -> LabelRow:
-    relative_path = path.relative_to(dataset_root).as_posix()
-    make_en, model_en, year = parse_metadata_from_filename(path)
-
-    make_ko = make_trans.get(make_en, make_en)
-    model_ko = model_trans.get(model_en, model_en)
-
-    return LabelRow(
-        image_path=relative_path,
-        make_ko=make_ko,
-        make_en=make_en,
-        model_ko=model_ko,
-        model_en=model_en,
-        year=year,
-        variant="",
-        source_url=SOURCE_URL,
-        notes="",
+    """Fill in the exact (blake2b) and perceptual hashes of a row's image.
+
+    The image is read from ``store`` when it is packed there.
+    """
+    data = store.get(row.image_path) if store is not None else None
+    if data is None:
+        try:
+            data = (dataset_root / row.image_path).read_bytes()
+        except OSError:
+            return row
+    return row._replace(
+        content_hash=hashlib.blake2b(data, digest_size=16).hexdigest(),
+        phash=difference_hash(data),
     )
 
 
-def write_csv(rows: Iterable[LabelRow], output_path: Path) -> None:
+class DuplicateIndex:
+    """Find exact and near-duplicate images in a single streaming pass.
+
+    Exact duplicates share a content hash. Near duplicates have perceptual
+    hashes within ``max_distance`` bits. Each 64-bit hash is split into
+    ``max_distance + 1`` bands, so by the pigeonhole principle any match
+    shares at least one band exactly. Only hashes in the same band bucket
+    are compared, never all pairs.
+
+    Duplicates are registered with the path of their original, so a chain
+    of near duplicates (A~B, B~C) links every image to A even when A and C
+    are further apart than ``max_distance``.
+    """
+
+    def __init__(self, max_distance: int = DEFAULT_NEAR_DUPLICATE_DISTANCE) -> None:
+        if not 0 <= max_distance <= MAX_NEAR_DUPLICATE_DISTANCE:
+            raise ValueError(
+                f"max_distance must be between 0 and {MAX_NEAR_DUPLICATE_DISTANCE}, "
+                f"got {max_distance}"
+            )
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        width = 64 // bands
+        self._bands = [
+            (start, 64 - start if band == bands - 1 else width)
+            for band, start in enumerate(range(0, width * bands, width))
+        ]
+        # Content hash -> path of the original.
+        self._exact: Dict[str, str] = {}
+        # Band key -> (phash, path of the original) of every hashed image.
+        self._buckets: Dict[tuple[int, int], List[tuple[int, str]]] = {}
+
+    def _band_keys(self, value: int) -> Iterator[tuple[int, int]]:
+        for band, (start, width) in enumerate(self._bands):
+            yield band, (value >> start) & ((1 << width) - 1)
+
+    def find(self, row: LabelRow) -> str:
+        """Return the path ``row`` duplicates and register it if it is new."""
+        if not row.content_hash:
+            return ""
+        original = self._exact.get(row.content_hash)
+        if original is not None:
+            return original
+        original = self._find_near(row)
+        self._exact[row.content_hash] = original or row.image_path
+        return original
+
+    def _find_near(self, row: LabelRow) -> str:
+        if not row.phash or self.max_distance <= 0:
+            return ""
+        value = int(row.phash, 16)
+        keys = list(self._band_keys(value))
+        original = next(
+            (
+                other_original
+                for key in keys
+                for other, other_original in self._buckets.get(key, ())
+                if (value ^ other).bit_count() <= self.max_distance
+            ),
+            "",
+        )
+        for key in keys:
+            self._buckets.setdefault(key, []).append(
+                (value, original or row.image_path)
+            )
+        return original
+
+
+def mark_duplicates(
+    rows: Iterable[LabelRow],
+    max_distance: int = DEFAULT_NEAR_DUPLICATE_DISTANCE,
+) -> Iterator[LabelRow]:
+    """Set ``duplicate_of`` on rows whose image was already seen.
+
+    The first occurrence in row order is kept as the original.
+    """
+    index = DuplicateIndex(max_distance)
+    for row in rows:
+        yield row._replace(duplicate_of=index.find(row))
+
+
+def _drop_duplicates(
+    rows: Iterable[LabelRow],
+    manifest: Optional[Dict[str, tuple[int, int]]] = None,
+) -> Iterator[LabelRow]:
+    for row in rows:
+        if not row.duplicate_of:
+            yield row
+        elif manifest is not None:
+            # Re-examine dropped files next time in case their original goes away.
+            # Streamed manifests leave out rows missing from the CSV by themselves.
+            manifest.pop(row.image_path, None)
+
+
+# Per-process parser state, set once by ``_init_parser``.
+_PARSER_STATE: (
+    tuple[Path, Dict[str, str], Dict[str, str], bool, Optional[ShardStore]] | None
+) = None
+
+
+def _open_shards(shard_dir: Optional[Path]) -> Optional[ShardStore]:
+    if shard_dir is None:
+        return None
+    from car_picker.app import shards
+
+    return shards.open_store(shard_dir)
+
+
+def _init_parser(
+    dataset_root: Path,
+    make_trans: Dict[str, str],
+    model_trans: Dict[str, str],
+    hash_images: bool = False,
+    shard_dir: Optional[Path] = None,
+) -> None:
+    global _PARSER_STATE
+    store = _open_shards(shard_dir) if hash_images else None
+    _PARSER_STATE = (dataset_root, make_trans, model_trans, hash_images, store)
+
+
+def _parse_chunk(paths: List[Path]) -> List[LabelRow]:
+    assert _PARSER_STATE is not None, "parser process was not initialised"
+    dataset_root, make_trans, model_trans, hash_images, store = _PARSER_STATE
+    rows = build_rows(paths, dataset_root, make_trans, model_trans)
+    if hash_images:
+        rows = [hash_row(row, dataset_root, store) for row in rows]
+    return rows
+
+
+def _hash_chunk(rows: List[LabelRow]) -> List[LabelRow]:
+    assert _PARSER_STATE is not None, "parser process was not initialised"
+    dataset_root, _, _, _, store = _PARSER_STATE
+    return [hash_row(row, dataset_root, store) for row in rows]
+
+
+T = TypeVar("T")
+
+
+def _chunked(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def iter_label_rows(
+    paths: Iterable[Path],
+    dataset_root: Path,
+    make_trans: Dict[str, str],
+    model_trans: Dict[str, str],
+    workers: int = DEFAULT_WORKERS,
+    hash_images: bool = False,
+    shard_dir: Optional[Path] = None,
+) -> Iterator[LabelRow]:
+    """Parse ``paths`` into rows on a process pool, preserving input order.
+
+    Paths are sent to the workers in chunks of ``PARSE_CHUNK_SIZE`` (or
+    ``HASH_CHUNK_SIZE`` when hashing) with a bounded number of chunks in
+    flight. ``workers <= 1`` parses in-process.
+    With ``hash_images`` the workers also fill in the image hashes, reading
+    packed images from ``shard_dir`` when it is given.
+    """
+    initargs = (dataset_root, make_trans, model_trans, hash_images, shard_dir)
+    chunk_size = HASH_CHUNK_SIZE if hash_images else PARSE_CHUNK_SIZE
+    for rows in _map_chunks(
+        _parse_chunk, _chunked(paths, chunk_size), workers, initargs
+    ):
+        yield from rows
+
+
+def _chunk_unhashed(rows: Iterable[LabelRow]) -> Iterator[List[LabelRow]]:
+    """Group ``rows`` into chunks of ``HASH_CHUNK_SIZE`` rows lacking a hash.
+
+    Rows that already have one ride along, up to ``PARSE_CHUNK_SIZE`` rows
+    per chunk, so long runs of them do not pile up in memory.
+    """
+    chunk: List[LabelRow] = []
+    unhashed = 0
+    for row in rows:
+        chunk.append(row)
+        unhashed += not row.content_hash
+        if unhashed >= HASH_CHUNK_SIZE or len(chunk) >= PARSE_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+            unhashed = 0
+    if chunk:
+        yield chunk
+
+
+def iter_hashed_rows(
+    rows: Iterable[LabelRow],
+    dataset_root: Path,
+    workers: int = DEFAULT_WORKERS,
+    shard_dir: Optional[Path] = None,
+) -> Iterator[LabelRow]:
+    """Fill in the hashes of rows that lack them on a process pool, in order.
+
+    Only rows without a hash are sent to the workers.
+    """
+    initargs = (dataset_root, {}, {}, True, shard_dir)
+    # Chunks submitted to the pool, in order, awaiting their hashed rows.
+    chunks: Deque[List[LabelRow]] = deque()
+
+    def unhashed() -> Iterator[List[LabelRow]]:
+        for chunk in _chunk_unhashed(rows):
+            chunks.append(chunk)
+            yield [row for row in chunk if not row.content_hash]
+
+    for hashed in _map_chunks(_hash_chunk, unhashed(), workers, initargs):
+        filled = iter(hashed)
+        for row in chunks.popleft():
+            yield row if row.content_hash else next(filled)
+
+
+def _map_chunks(
+    func: Callable[[List[T]], List[LabelRow]],
+    chunks: Iterable[List[T]],
+    workers: int,
+    initargs: tuple,
+) -> Iterator[List[LabelRow]]:
+    """Run ``func`` over ``chunks`` in parser processes, yielding results in order."""
+    if workers <= 1:
+        _init_parser(*initargs)
+        for chunk in chunks:
+            yield func(chunk)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_parser,
+        initargs=initargs,
+    ) as pool:
+        in_flight: Deque[Future] = deque()
+        for chunk in chunks:
+            in_flight.append(pool.submit(func, chunk))
+            if len(in_flight) >= 2 * workers:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def _replace_atomically(output_path: Path, write) -> None:
+    """Write ``output_path`` through a temporary sibling and rename it in place."""
     output_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(
+        dir=output_path.parent, prefix=f".{output_path.name}.", suffix=".tmp"
+    )
+    # mkstemp creates private files; keep the permissions a plain open() gives.
+    mode = output_path.stat().st_mode & 0o777 if output_path.exists() else 0o644
+    try:
+        with os.fdopen(
+            fd, "w", encoding="utf-8", newline="", buffering=1 << 20
+        ) as handle:
+            write(handle)
+        os.chmod(tmp_name, mode)
+        os.replace(tmp_name, output_path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
 
-    with output_path.open("w", encoding="utf-8", newline="") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=CSV_COLUMNS)
-        writer.writeheader()
-        for row in rows:
-            writer.writerow(row.to_csv_row())
+def write_csv(rows: Iterable[LabelRow], output_path: Path) -> int:
+    """Stream ``rows`` to ``output_path`` in batches and return the row count.
+
+    Rows are consumed lazily, so memory stays flat for any number of rows.
+    """
+    written = 0
+
+    def write(csvfile) -> None:
+        nonlocal written
+        writer = csv.writer(csvfile)
+        writer.writerow(CSV_COLUMNS)
+        for batch in _chunked(rows, WRITE_BATCH_SIZE):
+            writer.writerows(batch)
+            written += len(batch)
+
+    _replace_atomically(output_path, write)
+    return written
+
+
+def read_csv(path: Path) -> Iterator[LabelRow]:
+    """Yield the rows of a previously generated labels CSV."""
+    with path.open("r", encoding="utf-8", newline="") as csvfile:
+        for record in csv.DictReader(csvfile):
+            yield LabelRow(
+                **{column: record.get(column) or "" for column in CSV_COLUMNS}
+            )
+
+
+class _DictionaryEncoder:
+    """Dictionary-encode string batches against one growing dictionary.
+
+    A value keeps its index once seen, so each batch's dictionary extends
+    the previous one and the IPC writer emits dictionary deltas, which the
+    file format allows, instead of replacements, which it does not.
+    """
+
+    def __init__(self) -> None:
+        self._index: Dict[str, int] = {}
+        self._values: List[str] = []
+
+    def encode(self, column):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        local = pc.dictionary_encode(column)
+        mapping = []
+        for value in local.dictionary.to_pylist():
+            position = self._index.get(value)
+            if position is None:
+                position = self._index[value] = len(self._values)
+                self._values.append(value)
+            mapping.append(position)
+        indices = pc.take(pa.array(mapping, pa.int32()), local.indices)
+        return pa.DictionaryArray.from_arrays(
+            indices, pa.array(self._values, pa.string())
+        )
+
+
+def write_arrow(csv_path: Path, arrow_path: Path) -> bool:
+    """Convert the labels CSV into a dictionary-encoded Arrow IPC file.
+
+    The app memory-maps this artifact instead of parsing the CSV. The CSV
+    is converted one block of ``ARROW_BLOCK_BYTES`` at a time, so memory
+    stays bounded like ``write_csv``. Numeric spec columns are stored as
+    nullable int32, which ``MAX_SPEC_DIGITS`` keeps them within. Returns
+    ``False`` when pyarrow is not installed.
+    """
+    try:
+        import pyarrow as pa
+        from pyarrow import csv as pa_csv
+        from pyarrow import ipc
+    except ImportError:
+        return False
+
+    reader = pa_csv.open_csv(
+        csv_path,
+        read_options=pa_csv.ReadOptions(block_size=ARROW_BLOCK_BYTES),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={
+                column: pa.int32() if column in NUMERIC_SPEC_COLUMNS else pa.string()
+                for column in CSV_COLUMNS
+            },
+            strings_can_be_null=False,
+        ),
+    )
+    schema = pa.schema(
+        [
+            pa.field(field.name, pa.dictionary(pa.int32(), field.type))
+            if field.name in DICTIONARY_COLUMNS
+            else field
+            for field in reader.schema
+        ]
+    )
+    encoders = {name: _DictionaryEncoder() for name in DICTIONARY_COLUMNS}
+
+    tmp_path = arrow_path.with_name(f".{arrow_path.name}.tmp")
+    try:
+        with ipc.new_file(
+            str(tmp_path),
+            schema,
+            options=ipc.IpcWriteOptions(emit_dictionary_deltas=True),
+        ) as writer:
+            for batch in reader:
+                writer.write_batch(
+                    pa.record_batch(
+                        [
+                            encoders[name].encode(column)
+                            if name in encoders
+                            else column
+                            for name, column in zip(batch.schema.names, batch.columns)
+                        ],
+                        schema=schema,
+                    )
+                )
+        os.replace(tmp_path, arrow_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return True
+
+
+def pregenerate_renditions(
+    image_paths: Iterable[str],
+    dataset_root: Path,
+    width: Optional[int],
+    workers: int,
+    shard_dir: Optional[Path] = None,
+) -> None:
+    """Render the app's display renditions ahead of time."""
+    from car_picker.app import images, shards
+
+    images.pregenerate(
+        image_paths,
+        dataset_dir=dataset_root,
+        width=width or images.RENDITION_WIDTH,
+        workers=workers,
+        shard_dir=shard_dir or shards.SHARD_DIR,
+    )
+
+
+def default_manifest_path(output_path: Path) -> Path:
+    return output_path.with_name(f"{output_path.stem}.manifest.csv")
+
+
+def _csv_header(path: Path) -> List[str]:
+    with path.open("r", encoding="utf-8", newline="") as handle:
+        return next(csv.reader(handle), [])
+
+
+def load_manifest(path: Path) -> Dict[str, tuple[int, int]]:
+    """Load ``image_path -> (size, mtime_ns)`` from a manifest, if it exists."""
+    if not path.exists():
+        return {}
+    with path.open("r", encoding="utf-8", newline="") as handle:
+        return {
+            record["image_path"]: (int(record["size"]), int(record["mtime_ns"]))
+            for record in csv.DictReader(handle)
+        }
+
+
+def write_manifest(entries: Dict[str, tuple[int, int]], path: Path) -> None:
+    def write(handle) -> None:
+        writer = csv.writer(handle)
+        writer.writerow(MANIFEST_COLUMNS)
+        for image_path, (size, mtime_ns) in entries.items():
+            writer.writerow([image_path, size, mtime_ns])
+
+    _replace_atomically(path, write)
+
+
+# A manifest record: image path relative to the dataset, size and mtime_ns.
+ManifestEntry = Tuple[str, int, int]
+
+
+def _record_stats(
+    stats: Iterable[tuple[Path, int, int]],
+    dataset_root: Path,
+    scanned: Deque[ManifestEntry],
+) -> Iterator[Path]:
+    """Yield the scanned paths, queueing their manifest entries in ``scanned``."""
+    for path, size, mtime_ns in stats:
+        scanned.append((path.relative_to(dataset_root).as_posix(), size, mtime_ns))
+        yield path
+
+
+def write_csv_and_manifest(
+    rows: Iterable[LabelRow],
+    output_path: Path,
+    scanned: Deque[ManifestEntry],
+    manifest_path: Path,
+) -> int:
+    """Stream ``rows`` to ``output_path`` and their entries to ``manifest_path``.
+
+    ``scanned`` is filled, in row order, by the scan that produced ``rows``;
+    entries of rows left out of the CSV are skipped. An entry only waits
+    there while its row is parsed, so memory stays flat like ``write_csv``.
+    Returns the number of rows written.
+    """
+    written = 0
+
+    def write(handle) -> None:
+        nonlocal written
+        writer = csv.writer(handle)
+        writer.writerow(MANIFEST_COLUMNS)
+
+        def recorded() -> Iterator[LabelRow]:
+            for row in rows:
+                entry = scanned.popleft()
+                while entry[0] != row.image_path:
+                    entry = scanned.popleft()
+                writer.writerow(entry)
+                yield row
+
+        written = write_csv(recorded(), output_path)
+
+    _replace_atomically(manifest_path, write)
+    return written
+
+
+def _report_progress(rows: Iterable[LabelRow]) -> Iterator[LabelRow]:
+    for idx, row in enumerate(rows, start=1):
+        yield row
+        if idx % 500 == 0:
+            print(f"Processed {idx} images...", flush=True)
+
+
+def _refresh_row(
+    row: LabelRow,
+    make_trans: Dict[str, str],
+    model_trans: Dict[str, str],
+    hash_images: bool,
+) -> LabelRow:
+    """Re-derive what an unchanged row owes to this run's settings.
+
+    Translations may have changed since the row was written. Without
+    hashing the hash columns are cleared, as a full build leaves them;
+    with it ``mark_duplicates`` recomputes ``duplicate_of``.
+    """
+    row = row._replace(
+        make_ko=make_trans.get(row.make_en, row.make_en),
+        model_ko=model_trans.get(row.model_en, row.model_en),
+    )
+    if not hash_images:
+        row = row._replace(content_hash="", phash="", duplicate_of="")
+    return row
+
+
+def _merge_rows(
+    output_path: Path,
+    manifest: Dict[str, tuple[int, int]],
+    parsed: Dict[str, LabelRow],
+    dataset_root: Path,
+    make_trans: Dict[str, str],
+    model_trans: Dict[str, str],
+    hash_images: bool,
+    shard_dir: Optional[Path] = None,
+    workers: int = DEFAULT_WORKERS,
+) -> Iterator[LabelRow]:
+    def kept_rows() -> Iterator[LabelRow]:
+        if output_path.exists():
+            for row in read_csv(output_path):
+                if row.image_path not in manifest:
+                    continue
+                new_row = parsed.pop(row.image_path, None)
+                if new_row is None:
+                    new_row = _refresh_row(row, make_trans, model_trans, hash_images)
+                yield new_row
+
+    rows = kept_rows()
+    if hash_images:
+        # Rows written before hashing was enabled.
+        rows = iter_hashed_rows(rows, dataset_root, workers, shard_dir)
+    yield from rows
+    yield from parsed.values()
+
+
+def build_incremental(
+    dataset_root: Path,
+    output_path: Path,
+    manifest_path: Path,
+    make_trans: Dict[str, str],
+    model_trans: Dict[str, str],
+    workers: int = DEFAULT_WORKERS,
+    hash_images: bool = False,
+    shard_dir: Optional[Path] = None,
+) -> tuple[Iterator[LabelRow], Dict[str, tuple[int, int]], int]:
+    """Re-parse only new or changed files and merge them into the existing CSV.
+
+    Files are compared against the manifest by size and mtime. Rows of
+    deleted files are dropped, changed rows are replaced in place and new
+    rows are appended in scan order. Unchanged rows pick up the current
+    translations and hashing settings. Returns a lazy iterator over the merged
+    rows (it reads ``output_path`` while being consumed), the new manifest
+    entries and the number of re-parsed files. A CSV written with older
+    columns is re-parsed in full. With ``shard_dir`` the files are listed
+    from that pack, so repacking re-parses every image.
+    """
+    previous = {}
+    if output_path.exists() and _csv_header(output_path) == CSV_COLUMNS:
+        previous = load_manifest(manifest_path)
+
+    manifest: Dict[str, tuple[int, int]] = {}
+    changed: List[Path] = []
+    if shard_dir is not None:
+        stats = iter_shard_stats(shard_dir, dataset_root)
+    else:
+        stats = iter_image_stats(dataset_root, workers=workers)
+    for path, size, mtime_ns in stats:
+        relative = path.relative_to(dataset_root).as_posix()
+        manifest[relative] = (size, mtime_ns)
+        if previous.get(relative) != (size, mtime_ns):
+            changed.append(path)
+
+    parsed = {
+        row.image_path: row
+        for row in _report_progress(
+            iter_label_rows(
+                changed,
+                dataset_root,
+                make_trans,
+                model_trans,
+                workers,
+                hash_images,
+                shard_dir,
+            )
+        )
+    }
+
+    merged = _merge_rows(
+        output_path,
+        manifest,
+        parsed,
+        dataset_root,
+        make_trans,
+        model_trans,
+        hash_images,
+        shard_dir,
+        workers,
+    )
+    return merged, manifest, len(changed)
+
+
+def _near_duplicate_distance(value: str) -> int:
+    distance = int(value)
+    if not 0 <= distance <= MAX_NEAR_DUPLICATE_DISTANCE:
+        raise argparse.ArgumentTypeError(
+            f"must be between 0 and {MAX_NEAR_DUPLICATE_DISTANCE}, got {distance}"
+        )
+    return distance
 
 
 def main() -> None:
@@ -223,38 +1077,133 @@ def main() -> None:
         type=Path,
         help="Optional JSON file with make/model translation overrides",
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only re-parse new or changed files and merge them into --output",
+    )
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        help="Manifest written by every build and read by --incremental "
+        "(default: <output>.manifest.csv)",
+    )
+    parser.add_argument(
+        "--no-arrow",
+        action="store_true",
+        help="Skip writing the columnar <output>.arrow artifact",
+    )
+    parser.add_argument(
+        "--hash",
+        action="store_true",
+        help="Record content and perceptual hashes and flag duplicate images",
+    )
+    parser.add_argument(
+        "--drop-duplicates",
+        action="store_true",
+        help="Leave duplicate images out of the CSV (implies --hash)",
+    )
+    parser.add_argument(
+        "--near-duplicate-distance",
+        type=_near_duplicate_distance,
+        default=DEFAULT_NEAR_DUPLICATE_DISTANCE,
+        help="Max perceptual-hash bit distance for near duplicates (0: exact only)",
+    )
+    parser.add_argument(
+        "--renditions",
+        action="store_true",
+        help="Pre-render width-bounded display images into the app's cache",
+    )
+    parser.add_argument(
+        "--rendition-width",
+        type=int,
+        help="Maximum rendition width in pixels (default: the app's setting)",
+    )
+    parser.add_argument(
+        "--shards",
+        type=Path,
+        help="List (and hash) images from the pack in this shard directory",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="Scanner threads and parser processes (default: CPU count)",
+    )
     args = parser.parse_args()
 
     make_trans, model_trans = load_translations(args.translations)
     dataset_root = args.dataset.resolve()
+    hash_images = args.hash or args.drop_duplicates
 
-    rows = []
-    for idx, image_path in enumerate(iter_image_files(dataset_root), start=1):
-        try:
-            row = build_row(image_path, dataset_root, make_trans, model_trans)
-            rows.append(row)
-        except ValueError as exc:
-            # Include the reason in the notes column to preserve the record.
-            relative = image_path.relative_to(dataset_root).as_posix()
-            rows.append(
-                LabelRow(
-                    image_path=relative,
-                    make_ko="",
-                    make_en="",
-                    model_ko="",
-                    model_en="",
-                    year="",
-                    variant="",
-                    source_url=SOURCE_URL,
-                    notes=f"parse_error: {exc}",
-                )
+    manifest_path = args.manifest or default_manifest_path(args.output)
+    manifest: Optional[Dict[str, tuple[int, int]]] = None
+    scanned: Deque[ManifestEntry] = deque()
+    if args.incremental:
+        rows, manifest, reparsed = build_incremental(
+            dataset_root,
+            args.output,
+            manifest_path,
+            make_trans,
+            model_trans,
+            workers=args.workers,
+            hash_images=hash_images,
+            shard_dir=args.shards,
+        )
+        print(f"Re-parsed {reparsed} new or changed images")
+    else:
+        # scan -> parse/translate/hash (process pool) -> batched write, lazily.
+        if args.shards is not None:
+            stats = iter_shard_stats(args.shards, dataset_root)
+        else:
+            stats = iter_image_stats(dataset_root, workers=args.workers)
+        # Entries for the next --incremental run, written next to their rows.
+        image_files = _record_stats(stats, dataset_root, scanned)
+        rows = _report_progress(
+            iter_label_rows(
+                image_files,
+                dataset_root,
+                make_trans,
+                model_trans,
+                workers=args.workers,
+                hash_images=hash_images,
+                shard_dir=args.shards,
             )
+        )
 
-        if idx % 500 == 0:
-            print(f"Processed {idx} images...", flush=True)
+    if hash_images:
+        rows = mark_duplicates(rows, args.near_duplicate_distance)
+        if args.drop_duplicates:
+            rows = _drop_duplicates(rows, manifest)
+
+    if manifest is None:
+        written = write_csv_and_manifest(rows, args.output, scanned, manifest_path)
+    else:
+        written = write_csv(rows, args.output)
+        write_manifest(manifest, manifest_path)
+    print(f"Wrote {written} rows to {args.output}")
+
+    if not args.no_arrow:
+        from car_picker.app.catalog import columnar_path
+
+        arrow_path = columnar_path(args.output)
+        if write_arrow(args.output, arrow_path):
+            print(f"Wrote columnar catalog to {arrow_path}")
+        else:
+            print("pyarrow is not installed; skipped the columnar catalog")
 
-    write_csv(rows, args.output)
-    print(f"Wrote {len(rows)} rows to {args.output}")
+    if args.renditions:
+        written_paths = (
+            row.image_path for row in read_csv(args.output) if not row.notes
+        )
+        pregenerate_renditions(
+            written_paths,
+            dataset_root,
+            args.rendition_width,
+            args.workers,
+            args.shards,
+        )
+        print("Pre-rendered display images")
 
 
 if __name__ == "__main__":
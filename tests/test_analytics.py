@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from car_picker.app import analytics, log_archive, storage
+
+MAKES = ["Kia", "Acura", "Audi"]
+
+
+def _row(i: int) -> dict:
+    make = MAKES[i % len(MAKES)]
+    selected = make if i % 4 else MAKES[(i + 1) % len(MAKES)]
+    return {
+        "session_id": f"s{i // 5}",
+        "timestamp": f"2024-05-{1 + i % 3:02d}T10:00:00+00:00",
+        "question_idx": i % 5,
+        "image_path": f"{make}/{make}_Model_{2000 + i % 2}_{i}.jpg",
+        "selected_make_en": selected,
+        "selected_model_en": "Model",
+        "selected_year": 2000 + i % 2,
+        "selected_variant": "",
+        "correct_make_en": make,
+        "correct_model_en": "Model",
+        "correct_year": 2000 + i % 2,
+        "correct_variant": "",
+        "is_correct": int(selected == make),
+        "score_after_question": i,
+        "response_time_sec": 0.5 + (i * 7 % 23) / 4,
+    }
+
+
+class _Logs:
+    """CSV quiz logs under ``root`` that rotate only when asked to."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.paths = {
+            "quiz_log": root / "quiz_log.csv",
+            "summary": root / "summary.csv",
+        }
+        self.segment_dir = root / "segments"
+        self.archive_dir = root / "archive"
+        self.checkpoint_path = root / "analytics" / "checkpoint.json"
+        self.backend = storage.CsvBackend(
+            self.paths, self.segment_dir, rotate_bytes=0, rotate_daily=False
+        )
+        self.written = 0
+
+    def write(self, count: int) -> None:
+        rows = [_row(i) for i in range(self.written, self.written + count)]
+        self.backend.write("quiz_log", rows)
+        self.written += count
+
+    def rotate(self) -> None:
+        self.backend._rotate("quiz_log")
+        self.backend.close()
+
+    def compact(self) -> int:
+        return log_archive.compact(
+            "quiz_log", self.paths, self.segment_dir, self.archive_dir
+        )
+
+    def update(self, chunk_bytes: int = analytics.CHUNK_BYTES) -> int:
+        # Every run starts from the saved checkpoint, as the CLI does.
+        checkpoint = analytics.Checkpoint.load(self.checkpoint_path)
+        return analytics.update(
+            checkpoint,
+            self.paths,
+            self.segment_dir,
+            self.archive_dir,
+            chunk_bytes=chunk_bytes,
+            checkpoint_path=self.checkpoint_path,
+        )
+
+    def aggregates(self) -> analytics.Aggregates:
+        return analytics.Checkpoint.load(self.checkpoint_path).aggregates
+
+
+def _expected(count: int) -> dict:
+    aggregates = analytics.Aggregates()
+    frame = pd.DataFrame([_row(i) for i in range(count)])
+    aggregates.update(frame[analytics.ANALYTICS_COLUMNS])
+    return aggregates.to_dict()
+
+
+@pytest.fixture
+def logs(tmp_path):
+    logs = _Logs(tmp_path)
+    yield logs
+    logs.backend.close()
+
+
+def test_rotation_between_runs_resumes_the_segment(logs):
+    logs.write(7)
+    assert logs.update() == 7
+    logs.write(3)
+    logs.rotate()
+    logs.write(4)
+    # The rotated file keeps its inode: only its 3 new rows are read.
+    assert logs.update() == 7
+    assert logs.aggregates().to_dict() == _expected(14)
+    assert logs.update() == 0
+
+
+def test_compacting_a_partly_counted_segment_skips_counted_rows(logs):
+    logs.write(6)
+    assert logs.update() == 6
+    logs.write(5)
+    logs.rotate()
+    assert logs.compact() == 11
+    assert not storage.segment_paths("quiz_log", logs.segment_dir)
+    logs.write(2)
+    assert logs.update() == 7
+    assert logs.aggregates().to_dict() == _expected(13)
+    assert logs.update() == 0
+
+
+def test_compacting_a_fully_counted_segment_adds_nothing(logs):
+    logs.write(6)
+    logs.rotate()
+    assert logs.update() == 6
+    assert logs.compact() == 6
+    assert logs.update() == 0
+    assert logs.aggregates().to_dict() == _expected(6)
+
+
+def test_archived_segments_not_seen_as_csv_are_read_in_full(logs):
+    logs.write(6)
+    logs.rotate()
+    logs.compact()
+    logs.write(2)
+    assert logs.update() == 8
+    assert logs.aggregates().to_dict() == _expected(8)
+
+
+@pytest.mark.parametrize("chunk_bytes", [analytics.CHUNK_BYTES, 64])
+def test_partial_trailing_line_waits_for_the_next_run(logs, chunk_bytes):
+    logs.write(5)
+    path = logs.paths["quiz_log"]
+    data = path.read_bytes()
+    start = data.rindex(b"\n", 0, len(data) - 1) + 1
+    # The last row is only half written.
+    path.write_bytes(data[: start + 20])
+    assert logs.update(chunk_bytes) == 4
+    assert logs.aggregates().to_dict() == _expected(4)
+
+    with path.open("ab") as handle:
+        handle.write(data[start + 20 :])
+    assert logs.update(chunk_bytes) == 1
+    assert logs.aggregates().to_dict() == _expected(5)
+
+
+def test_chunked_reads_match_one_pass(logs):
+    logs.write(40)
+    frames = list(analytics.iter_csv_chunks(logs.paths["quiz_log"], 0, 100))
+    assert len(frames) > 1
+    assert sum(len(frame) for frame, _ in frames) == 40
+    assert frames[-1][1] == logs.paths["quiz_log"].stat().st_size
+
+
+def test_merged_sketches_match_one_sketch():
+    values = np.random.default_rng(0).lognormal(0.5, 1.0, 10_000)
+    values[::97] = 0.0
+    whole = analytics.QuantileSketch()
+    whole.add_many(values)
+    left, right = analytics.QuantileSketch(), analytics.QuantileSketch()
+    left.add_many(values[:3_000])
+    right.add_many(values[3_000:])
+    left.merge(right)
+    merged = analytics.QuantileSketch.from_dict(left.to_dict())
+
+    assert merged.count == whole.count == len(values)
+    for q in (0.0, 0.01, 0.5, 0.9, 0.95, 0.99, 1.0):
+        assert merged.quantile(q) == whole.quantile(q)
+        exact = np.quantile(values, q, method="lower")
+        if exact:
+            assert abs(merged.quantile(q) - exact) <= whole.alpha * exact
+        else:
+            assert merged.quantile(q) == 0.0
+
+
+def test_sketches_with_different_accuracy_do_not_merge():
+    with pytest.raises(ValueError):
+        analytics.QuantileSketch(0.01).merge(analytics.QuantileSketch(0.02))
+    assert analytics.QuantileSketch().quantile(0.5) is None
@@ -0,0 +1,325 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+from collections import deque
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from car_picker.data import build_metadata
+from car_picker.data.build_metadata import LabelRow
+
+EXAMPLE = "Acura_ILX_2013_28_16_110_15_4_70_55_179_39_FWD_5_4_4dr_aWg.jpg"
+EXAMPLE_SPEC = {
+    "msrp": "28",
+    "wheel_size": "16",
+    "horsepower": "110",
+    "displacement": "15",
+    "cylinders": "4",
+    "width": "70",
+    "height": "55",
+    "length": "179",
+    "mpg": "39",
+    "drivetrain": "FWD",
+    "passengers": "5",
+    "doors": "4",
+    "body": "4dr",
+}
+
+
+def test_parse_filenames_reads_every_spec_field():
+    parsed = build_metadata.parse_filenames([Path(EXAMPLE)])
+    row = {field: values[0] for field, values in parsed.items()}
+    assert row == {
+        "make": "Acura",
+        "model": "ILX",
+        "year": "2013",
+        **EXAMPLE_SPEC,
+        "variant": "FWD 4dr",
+        "error": "",
+    }
+
+
+def test_parse_filenames_leaves_malformed_specs_empty():
+    names = [
+        "Kia_Soul_2012_nan_16_nan_x_4_70_55_179_39_nan_5_4_4dr_q1.jpg",
+        "Kia_Soul_2012_q2.jpg",
+        "Kia_Soul_2012.jpg",
+    ]
+    parsed = build_metadata.parse_filenames([Path(name) for name in names])
+    assert parsed["year"] == ["2012"] * 3
+    assert parsed["msrp"] == ["", "", ""]
+    assert parsed["wheel_size"] == ["16", "", ""]
+    assert parsed["horsepower"] == ["", "", ""]
+    assert parsed["displacement"] == ["", "", ""]
+    assert parsed["drivetrain"] == ["", "", ""]
+    assert parsed["variant"] == ["4dr", "", ""]
+    assert parsed["error"] == ["", "", ""]
+
+
+def test_parse_filenames_reports_errors():
+    paths = [Path("Acura.jpg"), Path("Acura_ILX_20x3_28_aWg.jpg")]
+    parsed = build_metadata.parse_filenames(paths)
+    assert parsed["make"] == ["", ""]
+    assert parsed["variant"] == ["", ""]
+    assert parsed["error"] == [
+        "Unexpected filename format: Acura.jpg",
+        "Could not parse year from: Acura_ILX_20x3_28_aWg.jpg",
+    ]
+    with pytest.raises(ValueError, match="Could not parse year"):
+        build_metadata.parse_metadata_from_filename(paths[1])
+
+
+def test_parse_filenames_of_no_paths():
+    parsed = build_metadata.parse_filenames([])
+    assert set(parsed) == {*build_metadata.FILENAME_FIELDS, "variant", "error"}
+    assert all(values == [] for values in parsed.values())
+
+
+def test_build_rows(tmp_path):
+    paths = [tmp_path / "Acura" / EXAMPLE, tmp_path / "broken.jpg"]
+    rows = build_metadata.build_rows(paths, tmp_path, {"Acura": "어큐라"}, {})
+    good, bad = (row._asdict() for row in rows)
+
+    assert good["image_path"] == f"Acura/{EXAMPLE}"
+    assert good["make_ko"] == "어큐라"
+    assert good["make_en"] == "Acura"
+    assert good["model_ko"] == good["model_en"] == "ILX"
+    assert good["year"] == "2013"
+    assert good["variant"] == "FWD 4dr"
+    assert good["notes"] == ""
+    assert good["source_url"] == build_metadata.SOURCE_URL
+    assert {column: good[column] for column in EXAMPLE_SPEC} == EXAMPLE_SPEC
+
+    assert bad["image_path"] == "broken.jpg"
+    assert bad["notes"] == "parse_error: Unexpected filename format: broken.jpg"
+    assert bad["make_en"] == bad["year"] == bad["variant"] == ""
+    assert all(bad[column] == "" for column in build_metadata.SPEC_COLUMNS)
+
+
+def test_rows_round_trip_through_csv(tmp_path):
+    dataset = tmp_path / "dataset"
+    (dataset / "Acura").mkdir(parents=True)
+    (dataset / "Acura" / EXAMPLE).write_bytes(b"not an image")
+    (dataset / "broken.jpg").write_bytes(b"")
+    paths = list(build_metadata.iter_image_files(dataset, workers=1))
+    rows = list(build_metadata.iter_label_rows(paths, dataset, {}, {}, workers=1))
+
+    output = tmp_path / "car_labels.csv"
+    assert build_metadata.write_csv(rows, output) == 2
+    assert list(build_metadata.read_csv(output)) == rows
+
+
+def _write_image(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    # Give every write a distinct mtime, whatever the filesystem resolution.
+    _write_image.clock += 10**9
+    os.utime(path, ns=(_write_image.clock, _write_image.clock))
+
+
+_write_image.clock = 1_700_000_000 * 10**9
+
+
+def _build(monkeypatch, capsys, dataset: Path, output: Path, *args: str) -> str:
+    argv = ["build_metadata", "--dataset", str(dataset), "--output", str(output)]
+    argv += ["--workers", "1", "--no-arrow", *args]
+    monkeypatch.setattr(sys, "argv", argv)
+    build_metadata.main()
+    return capsys.readouterr().out
+
+
+def _rows(path: Path) -> List[LabelRow]:
+    return list(build_metadata.read_csv(path))
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    root = tmp_path / "dataset"
+    _write_image(root / "Acura" / EXAMPLE, b"acura")
+    _write_image(root / "Kia" / "Kia_Soul_2012_a.jpg", b"soul")
+    _write_image(root / "Kia" / "Kia_Rio_2015_b.jpg", b"rio")
+    return root
+
+
+def _assert_matches_full_build(monkeypatch, capsys, dataset, output, *args):
+    full = output.with_name("full.csv")
+    _build(monkeypatch, capsys, dataset, full, *args)
+    assert _rows(output) == _rows(full)
+
+
+def test_incremental_rebuilds(monkeypatch, capsys, tmp_path, dataset):
+    output = tmp_path / "car_labels.csv"
+    out = _build(monkeypatch, capsys, dataset, output, "--incremental")
+    assert "Re-parsed 3 new or changed images" in out
+    assert build_metadata.default_manifest_path(output).exists()
+
+    out = _build(monkeypatch, capsys, dataset, output, "--incremental")
+    assert "Re-parsed 0 new or changed images" in out
+    _assert_matches_full_build(monkeypatch, capsys, dataset, output)
+
+    # Add one file, rename another (a delete plus an add) and modify a third.
+    _write_image(dataset / "Kia" / "Kia_Soul_2013_c.jpg", b"soul 2013")
+    (dataset / "Kia" / "Kia_Rio_2015_b.jpg").rename(
+        dataset / "Kia" / "Kia_Rio_2016_b.jpg"
+    )
+    _write_image(dataset / "Acura" / EXAMPLE, b"acura, retouched")
+    out = _build(monkeypatch, capsys, dataset, output, "--incremental")
+    assert "Re-parsed 3 new or changed images" in out
+    assert [row.image_path for row in _rows(output)] == [
+        f"Acura/{EXAMPLE}",
+        "Kia/Kia_Soul_2012_a.jpg",
+        "Kia/Kia_Rio_2016_b.jpg",
+        "Kia/Kia_Soul_2013_c.jpg",
+    ]
+
+    (dataset / "Kia" / "Kia_Soul_2012_a.jpg").unlink()
+    out = _build(monkeypatch, capsys, dataset, output, "--incremental")
+    assert "Re-parsed 0 new or changed images" in out
+    _assert_matches_full_build(monkeypatch, capsys, dataset, output)
+
+
+def test_incremental_applies_new_translations(monkeypatch, capsys, tmp_path, dataset):
+    output = tmp_path / "car_labels.csv"
+    _build(monkeypatch, capsys, dataset, output)
+    translations = tmp_path / "translations.json"
+    translations.write_text(
+        json.dumps({"make": {"Kia": "기아차"}, "model": {"Soul": "쏘울"}}),
+        encoding="utf-8",
+    )
+    args = ["--translations", str(translations)]
+    out = _build(monkeypatch, capsys, dataset, output, "--incremental", *args)
+    assert "Re-parsed 0 new or changed images" in out
+    soul = next(row for row in _rows(output) if row.model_en == "Soul")
+    assert (soul.make_ko, soul.model_ko) == ("기아차", "쏘울")
+    _assert_matches_full_build(monkeypatch, capsys, dataset, output, *args)
+
+
+def test_incremental_follows_hash_settings(monkeypatch, capsys, tmp_path, dataset):
+    output = tmp_path / "car_labels.csv"
+    _write_image(dataset / "Kia" / "Kia_Soul_2012_copy.jpg", b"soul")
+    _build(monkeypatch, capsys, dataset, output)
+
+    # Hashing unchanged rows fills in their hashes and duplicates.
+    _build(monkeypatch, capsys, dataset, output, "--incremental", "--hash")
+    copy = next(row for row in _rows(output) if row.image_path.endswith("copy.jpg"))
+    assert copy.content_hash
+    assert copy.duplicate_of == "Kia/Kia_Soul_2012_a.jpg"
+    _assert_matches_full_build(monkeypatch, capsys, dataset, output, "--hash")
+
+    # Without --hash, stale hashes and duplicate marks are cleared.
+    _build(monkeypatch, capsys, dataset, output, "--incremental")
+    assert not any(
+        row.content_hash or row.phash or row.duplicate_of for row in _rows(output)
+    )
+    _assert_matches_full_build(monkeypatch, capsys, dataset, output)
+
+
+def test_hashing_only_dispatches_rows_without_a_hash(monkeypatch, tmp_path):
+    sent = []
+
+    def hash_chunk(rows):
+        sent.extend(row.image_path for row in rows)
+        return [row._replace(content_hash="new") for row in rows]
+
+    monkeypatch.setattr(build_metadata, "_hash_chunk", hash_chunk)
+    hashes = ["", "old", "", "old", "old", ""]
+    rows = [
+        LabelRow(f"{i}.jpg", "", "", "", "", "", "", "", "", content_hash=hashed)
+        for i, hashed in enumerate(hashes)
+    ]
+    hashed = list(build_metadata.iter_hashed_rows(rows, tmp_path, workers=1))
+    assert sent == ["0.jpg", "2.jpg", "5.jpg"]
+    assert [row.image_path for row in hashed] == [row.image_path for row in rows]
+    assert [row.content_hash for row in hashed] == [
+        hashed or "new" for hashed in hashes
+    ]
+
+
+def test_near_duplicate_chains_link_to_the_first_image():
+    # Each image is 3 bits from the one before it; C is 6 bits from A.
+    images = [
+        ("A.jpg", "a", 0x0),
+        ("B.jpg", "b", 0x7),
+        ("C.jpg", "c", 0x3F),
+        ("C-copy.jpg", "c", 0x3F),
+        ("D.jpg", "d", 0x1FF),
+        ("E.jpg", "e", 0xFFFF0000),
+    ]
+    rows = [
+        LabelRow(path, "", "", "", "", "", "", "", "", content_hash=hashed)._replace(
+            phash=f"{value:016x}"
+        )
+        for path, hashed, value in images
+    ]
+    marked = build_metadata.mark_duplicates(rows, max_distance=3)
+    assert [row.duplicate_of for row in marked] == [
+        "",
+        "A.jpg",
+        "A.jpg",
+        "A.jpg",
+        "A.jpg",
+        "",
+    ]
+
+
+def test_full_build_streams_the_manifest(monkeypatch, capsys, tmp_path, dataset):
+    _write_image(dataset / "Kia" / "Kia_Soul_2012_copy.jpg", b"soul")
+    for i in range(20):
+        _write_image(dataset / "Mini" / f"Mini_Cooper_2010_{i:02d}.jpg", b"%d" % i)
+    queued = []
+
+    class Scanned(deque):
+        def append(self, entry) -> None:
+            super().append(entry)
+            queued.append(len(self))
+
+    monkeypatch.setattr(build_metadata, "deque", Scanned)
+    monkeypatch.setattr(build_metadata, "HASH_CHUNK_SIZE", 4)
+    output = tmp_path / "car_labels.csv"
+    _build(monkeypatch, capsys, dataset, output, "--drop-duplicates")
+
+    manifest = build_metadata.load_manifest(
+        build_metadata.default_manifest_path(output)
+    )
+    expected = {}
+    for path in dataset.rglob("*.jpg"):
+        stat = path.stat()
+        expected[path.relative_to(dataset).as_posix()] = (
+            stat.st_size,
+            stat.st_mtime_ns,
+        )
+    # The dropped duplicate is left out, to be re-examined next time.
+    del expected["Kia/Kia_Soul_2012_copy.jpg"]
+    assert manifest == expected
+    assert [row.image_path for row in _rows(output)] == list(manifest)
+    # Entries only wait for the chunk being parsed, not the whole scan.
+    assert len(queued) == 24
+    assert max(queued) <= 2 * build_metadata.HASH_CHUNK_SIZE
+
+
+def test_overlong_spec_numbers_stay_empty(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    from pyarrow import ipc
+
+    long_msrp = "9" * (build_metadata.MAX_SPEC_DIGITS + 1)
+    name = EXAMPLE.replace("_28_", f"_{long_msrp}_")
+    parsed = build_metadata.parse_filenames([Path(name)])
+    assert parsed["msrp"] == [""]
+    assert parsed["wheel_size"] == ["16"]
+    assert parsed["variant"] == ["FWD 4dr"]
+
+    output = tmp_path / "car_labels.csv"
+    rows = build_metadata.build_rows(
+        [tmp_path / name, tmp_path / EXAMPLE], tmp_path, {}, {}
+    )
+    build_metadata.write_csv(rows, output)
+    arrow_path = tmp_path / "car_labels.arrow"
+    assert build_metadata.write_arrow(output, arrow_path)
+    with ipc.open_file(str(arrow_path)) as reader:
+        table = reader.read_all()
+    assert table.schema.field("msrp").type == pa.int32()
+    assert table.column("msrp").to_pylist() == [None, 28]
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import json
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from car_picker.app import confusion, options, storage
+from car_picker.benchmarks.synthetic import make_catalog
+
+# Wrong answers logged for the first car, per confused car.
+CONFUSED_COUNTS = [12, 6, 3, 2, 1]
+
+
+def _answer(correct: tuple, selected: tuple, is_correct: object) -> dict:
+    return {
+        "correct_make_en": correct[0],
+        "correct_model_en": correct[1],
+        "correct_year": correct[2],
+        "selected_make_en": selected[0],
+        "selected_model_en": selected[1],
+        "selected_year": selected[2],
+        "is_correct": is_correct,
+        "response_time_sec": 1.5,
+    }
+
+
+@pytest.fixture
+def logged(tmp_path):
+    """A catalog, its car keys and a confusion index built from its logs."""
+    df = make_catalog(2_000, seed=9)
+    _, _, cars = options.group_cars(df)
+    keys = list(cars.itertuples(index=False, name=None))
+    car = keys[0]
+    rows = []
+    for other, count in zip(keys[1:], CONFUSED_COUNTS):
+        rows += [_answer(car, other, 0)] * count
+    rows += [_answer(car, car, 1)] * 20
+    # Unparseable outcomes must not count as wrong answers.
+    for is_correct in ["", "yes", "<NA>"]:
+        rows += [_answer(car, keys[10], is_correct)] * 5
+
+    paths = {
+        "quiz_log": tmp_path / "quiz_log.csv",
+        "summary": tmp_path / "summary.csv",
+    }
+    backend = storage.CsvBackend(paths, tmp_path / "segments", rotate_bytes=0)
+    backend.write("quiz_log", rows)
+    backend.close()
+    output = tmp_path / "confusion_index.json"
+    built = confusion.build(
+        top_k=8,
+        min_support=3,
+        output=output,
+        paths=paths,
+        segment_dir=tmp_path / "segments",
+        archive_dir=tmp_path / "archive",
+    )
+    assert built == 1
+    entries = json.loads(output.read_text(encoding="utf-8"))["entries"]
+    return df, keys, entries
+
+
+def test_unparseable_outcomes_are_not_counted():
+    frame = pd.DataFrame(
+        [
+            _answer(("A", "a", "1"), ("B", "b", "1"), value)
+            for value in ["0", "", "nan", "<NA>", "x", "1"]
+        ]
+    )
+    counts = confusion.count_confusions(iter([frame]))
+    assert counts == {("A", "a", "1"): {("B", "b", "1"): 1}}
+
+
+def test_index_keeps_the_logged_weights(logged):
+    _, keys, entries = logged
+    (entry,) = entries
+    assert tuple(entry["car"]) == keys[0]
+    assert entry["confused"] == [
+        [*other, count] for other, count in zip(keys[1:], CONFUSED_COUNTS)
+    ]
+
+
+def test_hard_distractors_follow_the_confusion_weights(logged):
+    df, keys, entries = logged
+    table = confusion.resolve(entries, df)
+    correct_idx = int(table.by_car[0][0])
+    others, probabilities = table.neighbors[0]
+    assert others.tolist() == [1, 2, 3, 4, 5]
+    expected = np.asarray(CONFUSED_COUNTS) / sum(CONFUSED_COUNTS)
+    np.testing.assert_allclose(probabilities, expected)
+
+    index = options.build_catalog_index(df)
+    sampler = options._OptionSampler(index, 10, "hard", random.Random(0), table)
+    draws = 6_000
+    seen = np.zeros(len(keys), dtype=int)
+    for _ in range(draws):
+        selected = {correct_idx}
+        sampler._add_confused(correct_idx, selected, 1)
+        (row,) = selected - {correct_idx}
+        seen[table.car_codes[row]] += 1
+    assert seen.sum() == seen[1:6].sum()
+    np.testing.assert_allclose(seen[1:6] / draws, expected, atol=0.025)
+
+    # Whole option sets still hold the plan's share of confused cars.
+    rng = random.Random(1)
+    wanted = options.DIFFICULTY_PLANS["hard"]["confused"]
+    for _ in range(50):
+        items = options.generate_options(
+            df, correct_idx, difficulty="hard", rng=rng, index=index, confusion=table
+        )
+        codes = {int(table.car_codes[item.row_idx]) for item in items}
+        assert len(codes & set(others.tolist())) >= wanted
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import io
+import os
+import threading
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from car_picker.app import images, shards
+
+
+def _jpeg(size, orientation: int = 1) -> bytes:
+    image = Image.new("RGB", size, "red")
+    # Mark the left quarter so the applied rotation can be checked.
+    image.paste((0, 0, 255), (0, 0, size[0] // 4, size[1]))
+    exif = Image.Exif()
+    if orientation != 1:
+        exif[images.EXIF_ORIENTATION] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", exif=exif)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    dataset = tmp_path / "dataset"
+    dataset.mkdir()
+    return images.RenditionCache(
+        dataset,
+        tmp_path / "renditions",
+        width=50,
+        store=shards.ShardStore(tmp_path / "shards", check_interval=0),
+    )
+
+
+def _add(cache: images.RenditionCache, name: str, data: bytes) -> str:
+    (cache.dataset_dir / name).write_bytes(data)
+    return name
+
+
+@pytest.mark.parametrize(
+    "size, expected", [((200, 100), (50, 25)), ((40, 30), (40, 30))]
+)
+def test_renditions_are_capped_at_the_width(cache, size, expected):
+    name = _add(cache, "car.jpg", _jpeg(size))
+    found = cache.get(name)
+    assert isinstance(found, Path)
+    with Image.open(found) as image:
+        assert image.size == expected
+    assert cache.get(name) == found
+
+
+def test_renditions_apply_the_exif_orientation(cache):
+    # Orientation 6: the stored landscape pixels are shown rotated clockwise.
+    name = _add(cache, "rotated.jpg", _jpeg((200, 100), orientation=6))
+    with Image.open(cache.get(name)) as image:
+        assert image.size == (50, 100)
+        assert not image.getexif()
+        # The marked left quarter of the stored pixels is now at the top.
+        red, _, blue = image.getpixel((25, 5))
+        assert blue > red
+        red, _, blue = image.getpixel((25, 95))
+        assert red > blue
+
+
+def test_replaced_original_gets_a_new_rendition(cache):
+    name = _add(cache, "car.jpg", _jpeg((200, 100)))
+    first = cache.get(name)
+    path = cache.dataset_dir / name
+    path.write_bytes(_jpeg((100, 100)))
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    second = cache.get(name)
+    assert second != first
+    with Image.open(second) as image:
+        assert image.size == (50, 50)
+
+
+def test_undecodable_originals_are_served_as_they_are(cache):
+    name = _add(cache, "broken.jpg", b"not an image")
+    assert cache.get(name) == cache.dataset_dir / name
+    assert cache.read(name) == b"not an image"
+
+
+def test_decompression_bombs_are_served_as_they_are(cache, monkeypatch):
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1_000)
+    name = _add(cache, "huge.jpg", _jpeg((200, 100)))
+    assert cache.get(name) == cache.dataset_dir / name
+
+    images.pregenerate(
+        [name, "missing.jpg"],
+        cache.dataset_dir,
+        cache.cache_dir,
+        cache.width,
+        workers=1,
+        shard_dir=cache.store.shard_dir,
+    )
+    assert not list(cache.cache_dir.rglob("*.jpg"))
+
+
+def test_missing_originals_raise(cache):
+    with pytest.raises(FileNotFoundError):
+        cache.get("missing.jpg")
+
+
+class _FailingRenditions:
+    """Fails every read once ``release`` is set."""
+
+    def __init__(self, error: Exception) -> None:
+        self.error = error
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def read(self, image_path: str) -> bytes:
+        self.started.set()
+        self.release.wait()
+        raise self.error
+
+
+def test_prefetch_fills_the_byte_cache(cache):
+    name = _add(cache, "car.jpg", _jpeg((200, 100)))
+    byte_cache = images.ImageByteCache()
+    prefetcher = images.Prefetcher(cache, byte_cache, workers=1)
+    assert prefetcher.prefetch(name)
+    prefetcher._pool.shutdown(wait=True)
+    assert byte_cache.get(name) == cache.read(name)
+    assert not prefetcher.prefetch(name)
+    assert prefetcher.take(name) is None
+
+
+@pytest.mark.parametrize(
+    "error", [FileNotFoundError("gone"), ValueError("bad"), RuntimeError("?")]
+)
+def test_failed_prefetch_leaves_the_request_to_load(error):
+    renditions = _FailingRenditions(error)
+    byte_cache = images.ImageByteCache()
+    prefetcher = images.Prefetcher(renditions, byte_cache, workers=1)
+    assert prefetcher.prefetch("car.jpg")
+    assert renditions.started.wait(5)
+    # The load is running, so take waits for it instead of cancelling it.
+    threading.Timer(0.05, renditions.release.set).start()
+    assert prefetcher.take("car.jpg") is None
+    assert "car.jpg" not in byte_cache
+    assert prefetcher._in_flight == {}
+
+
+def test_hits_leave_the_rendition_untouched(cache):
+    name = _add(cache, "car.jpg", _jpeg((200, 100)))
+    found = cache.get(name)
+    cache._loader.join()
+    os.utime(found, ns=(0, 0))
+    assert cache.get(name) == found
+    assert found.stat().st_mtime_ns == 0
+
+
+def test_renditions_evicted_by_another_process_are_rendered_again(cache):
+    name = _add(cache, "car.jpg", _jpeg((200, 100)))
+    found = cache.get(name)
+    cache._loader.join()
+    data = found.read_bytes()
+    found.unlink()
+    assert cache.read(name) == data
+    assert found.exists()
+    assert cache._total_bytes == len(data)
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import logging
+
+from car_picker.app import metrics
+
+
+def test_failed_export_is_logged_and_the_rerun_ends(monkeypatch, caplog):
+    registry = metrics.MetricsRegistry()
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics, "REGISTRY", registry)
+
+    def export(phases, directory=None):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(registry, "export", export)
+    metrics.begin_rerun()
+    with metrics.timer("submit"):
+        pass
+    with caplog.at_level(logging.ERROR, logger=metrics.__name__):
+        phases = metrics.end_rerun()
+    assert set(phases) == {"submit", "rerun"}
+    assert "Exporting metrics failed" in caplog.text
+    assert registry.counter_values() == {"metrics_export_error": 1}
+
+
+def test_export_writes_one_file_per_process(tmp_path):
+    registry = metrics.MetricsRegistry()
+    registry.begin_rerun()
+    registry.observe("submit", 0.01)
+    registry.export(registry.end_rerun(), tmp_path)
+    (path,) = tmp_path.iterdir()
+    assert path.suffix == ".prom"
+    assert 'phase="submit"' in path.read_text(encoding="utf-8")
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import random
+
+import numpy as np
+import pytest
+
+from car_picker.app import options
+from car_picker.benchmarks.synthetic import make_catalog
+
+DIFFICULTIES = sorted(options.DIFFICULTY_PLANS)
+
+
+def _assert_valid(rows: np.ndarray, order: np.ndarray, total_options: int) -> None:
+    assert rows.shape == (len(order), total_options)
+    for correct_idx, picked in zip(order.tolist(), rows.tolist()):
+        assert correct_idx in picked
+        assert len(set(picked)) == total_options
+
+
+def test_index_groups_rows_by_make_model_and_year():
+    df = make_catalog(500, seed=1)
+    index = options.build_catalog_index(df)
+    assert len(index) == len(df)
+    groups = {
+        "by_make": (index.make_codes, ["make_en"]),
+        "by_make_model": (index.make_model_codes, ["make_en", "model_en"]),
+        "by_model": (index.model_codes, ["model_en"]),
+        "by_year": (index.year_codes, ["year"]),
+    }
+    for name, (codes, columns) in groups.items():
+        expected = df.groupby(columns, sort=False).indices
+        buckets = getattr(index, name)
+        assert len(buckets) == len(expected)
+        for rows in expected.values():
+            np.testing.assert_array_equal(buckets[codes[rows[0]]], rows)
+
+
+def test_index_requires_a_range_index():
+    df = make_catalog(20, seed=1).iloc[::2]
+    with pytest.raises(ValueError):
+        options.build_catalog_index(df)
+
+
+@pytest.mark.parametrize("difficulty", DIFFICULTIES)
+def test_generate_options_includes_answer(difficulty):
+    df = make_catalog(500, seed=3)
+    index = options.build_catalog_index(df)
+    rng = random.Random(3)
+    for correct_idx in range(0, len(df), 25):
+        items = options.generate_options(
+            df, correct_idx, difficulty=difficulty, rng=rng, index=index
+        )
+        picked = [item.row_idx for item in items]
+        _assert_valid(np.asarray([picked]), np.asarray([correct_idx]), 10)
+        assert [item.label for item in items] == [
+            options.option_label(df, row) for row in picked
+        ]
+
+
+def test_generate_options_rejects_rows_outside_the_frame():
+    df = make_catalog(20, seed=1)
+    with pytest.raises(KeyError):
+        options.generate_options(df, len(df))
+
+
+@pytest.mark.parametrize("difficulty", DIFFICULTIES)
+def test_options_when_one_make_dominates(difficulty, monkeypatch):
+    # Other makes are rarer than MIN_FILL_ACCEPTANCE, so easy mode scans.
+    events = []
+    monkeypatch.setattr(options.metrics, "increment", events.append)
+    n_rows = 400
+    make = ["Kia"] * (n_rows - 5) + [f"Make{i}" for i in range(5)]
+    model = [f"Model{i % 3}" for i in range(n_rows)]
+    year = [str(2000 + i % 4) for i in range(n_rows)]
+    index = options.index_from_columns(make, model, year)
+    labels = [f"{a} {b} {c}" for a, b, c in zip(make, model, year)]
+    rng = random.Random(0)
+    for correct_idx in range(n_rows):
+        items = options.generate_options(
+            labels, correct_idx, difficulty=difficulty, rng=rng, index=index
+        )
+        picked = [item.row_idx for item in items]
+        _assert_valid(np.asarray([picked]), np.asarray([correct_idx]), 10)
+    if difficulty == "easy":
+        assert "option_fill_scan" in events
+
+
+@pytest.mark.parametrize("other_make", [None, 0])
+def test_reject_sample_draws_distinct_rows_outside_exclude(other_make):
+    df = make_catalog(1_000, seed=4)
+    index = options.build_catalog_index(df)
+    sampler = options._OptionSampler(index, 10, "medium", random.Random(4))
+    exclude = set(range(50))
+    picked = sampler._reject_sample(20, exclude, other_make=other_make)
+    assert picked is not None
+    assert len(set(picked)) == 20
+    assert not exclude & set(picked)
+    if other_make is not None:
+        assert (index.make_codes[picked] != other_make).all()
+
+
+def test_reject_sample_gives_up_when_too_few_rows():
+    index = options.index_from_columns(["A"] * 9 + ["B"], ["m"] * 10, ["2000"] * 10)
+    sampler = options._OptionSampler(index, 5, "easy", random.Random(0))
+    assert sampler._reject_sample(2, {0}, other_make=0) is None
+    assert sampler._reject_sample(10, {0}) is None
+
+
+def test_easy_fill_prefers_other_makes():
+    df = make_catalog(2_000, seed=2)
+    index = options.build_catalog_index(df)
+    sampler = options._OptionSampler(index, 10, "easy", random.Random(2))
+    make_code = int(index.make_codes[0])
+    picked = sampler._fill_remaining({0}, 9, make_code)
+    assert len(set(picked)) == 9
+    assert 0 not in picked
+    assert (index.make_codes[picked] != make_code).all()
+
+
+@pytest.mark.parametrize("difficulty", DIFFICULTIES)
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_batch_options_are_distinct_and_include_answer(difficulty, seed):
+    df = make_catalog(2_000, seed=seed)
+    index = options.build_catalog_index(df)
+    order = np.random.default_rng(seed).choice(len(df), size=200, replace=False)
+    rows = options.generate_options_batch(
+        df, order, difficulty, random.Random(seed), index=index
+    )
+    assert rows.dtype == np.int32
+    _assert_valid(rows, order, 10)
+
+
+def test_batch_honours_total_options():
+    df = make_catalog(500, seed=7)
+    index = options.build_catalog_index(df)
+    order = [3, 99, 250]
+    rows = options.generate_options_batch(
+        df, order, "medium", random.Random(7), total_options=4, index=index
+    )
+    assert rows.shape == (3, 4)
+    _assert_valid(rows, np.asarray(order), 4)
+
+
+def test_batch_rejects_rows_outside_the_frame():
+    df = make_catalog(20, seed=1)
+    with pytest.raises(KeyError):
+        options.generate_options_batch(df, [0, len(df)])
+    with pytest.raises(ValueError):
+        options.generate_options_batch(df.iloc[:0], [])
+
+
+@pytest.mark.parametrize("n_rows", [2, 3, 5, 12])
+@pytest.mark.parametrize("difficulty", DIFFICULTIES)
+def test_tiny_catalog_pool_falls_back_to_every_row(n_rows, difficulty):
+    # One row per make: no row can fill any plan's make bucket.
+    index = options.index_from_columns(
+        [f"Make{i}" for i in range(n_rows)],
+        [f"Model{i}" for i in range(n_rows)],
+        ["2000"] * n_rows,
+    )
+    assert len(index.question_pools[difficulty]) == 0
+    pool = options.question_pool(index, difficulty, wanted=10)
+    np.testing.assert_array_equal(pool, np.arange(n_rows))
+
+    labels = [f"Car {i}" for i in range(n_rows)]
+    rows = options.generate_options_batch(
+        labels, pool, difficulty, random.Random(0), index=index
+    )
+    _assert_valid(rows, pool, min(10, n_rows))
+
+
+def test_question_pool_keeps_feasible_rows_when_enough():
+    df = make_catalog(2_000, seed=5)
+    index = options.build_catalog_index(df)
+    for difficulty in DIFFICULTIES:
+        pool = index.question_pools[difficulty]
+        assert 0 < len(pool) < len(df)
+        assert options.question_pool(index, difficulty, wanted=10) is pool
+        # Asking for more questions than feasible rows widens the pool.
+        wanted = len(pool) + 1
+        assert len(options.question_pool(index, difficulty, wanted)) == len(df)
+
+
+def test_question_pools_match_bucket_sizes():
+    df = make_catalog(300, seed=6)
+    index = options.build_catalog_index(df)
+    make = df["make_en"].to_numpy()
+    model = df["model_en"].to_numpy()
+    year = df["year"].to_numpy()
+    for difficulty, plan in options.DIFFICULTY_PLANS.items():
+        expected = []
+        for row in range(len(df)):
+            same_make = (make == make[row]).sum() - 1
+            same_model = ((model == model[row]) & (year != year[row])).sum()
+            same_year = (year == year[row]).sum() - 1
+            if difficulty == "easy":
+                same_year = ((year == year[row]) & (make != make[row])).sum()
+            if (
+                same_make >= plan["same_make"]
+                and same_model >= plan["same_model"]
+                and same_year >= plan["same_year"]
+            ):
+                expected.append(row)
+        np.testing.assert_array_equal(index.question_pools[difficulty], expected)
+
+
+@pytest.mark.parametrize("difficulty", DIFFICULTIES)
+def test_pool_questions_fill_without_scanning(difficulty, monkeypatch):
+    events = []
+    monkeypatch.setattr(options.metrics, "increment", events.append)
+    df = make_catalog(5_000, seed=8)
+    index = options.build_catalog_index(df)
+    pool = options.question_pool(index, difficulty, wanted=200)
+    order = np.random.default_rng(8).choice(pool, size=200, replace=False)
+    rows = options.generate_options_batch(
+        df, order, difficulty, random.Random(8), index=index
+    )
+    _assert_valid(rows, order, 10)
+    assert "option_fill_scan" not in events
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import json
+import tarfile
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from car_picker.app import shards
+
+IMAGES = {
+    "Acura/Acura_ILX_2013_a.jpg": b"ilx" * 10,
+    "Kia/Kia_Soul_2012_b.jpg": b"soul" * 7,
+    "Kia/Kia_Rio_2015_c.png": b"rio",
+}
+
+
+def _write_tree(root: Path) -> Path:
+    for image_path, data in IMAGES.items():
+        path = root / image_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    return root
+
+
+def _pack_files(shard_dir: Path) -> set[str]:
+    return {path.name for path in shard_dir.iterdir()}
+
+
+@pytest.mark.parametrize("shard_bytes", [shards.DEFAULT_SHARD_BYTES, 16])
+def test_round_trip_from_directory(tmp_path, shard_bytes):
+    shard_dir = tmp_path / "shards"
+    source = _write_tree(tmp_path / "images")
+    manifest = shards.pack(shards.iter_source(source), shard_dir, shard_bytes)
+
+    assert manifest["images"] == len(IMAGES)
+    assert manifest["bytes"] == sum(map(len, IMAGES.values()))
+    if shard_bytes == 16:
+        assert len(manifest["shards"]) == len(IMAGES)
+
+    store = shards.ShardStore(shard_dir, check_interval=0)
+    assert len(store) == len(IMAGES)
+    for image_path, data in IMAGES.items():
+        assert image_path in store
+        assert store.get(image_path) == data
+        assert store.pack_id(image_path) == manifest["pack"]
+    assert store.get("Kia/missing.jpg") is None
+    assert store.pack_id("Kia/missing.jpg") is None
+    entries = {path: length for path, length, _ in store.iter_entries()}
+    assert entries == {path: len(data) for path, data in IMAGES.items()}
+
+
+def test_round_trip_from_archives(tmp_path):
+    source = _write_tree(tmp_path / "images")
+    zip_path = tmp_path / "images.zip"
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        for image_path in IMAGES:
+            archive.write(source / image_path, f"images/{image_path}")
+    tar_path = tmp_path / "images.tar.gz"
+    with tarfile.open(tar_path, "w:gz") as archive:
+        archive.add(source, arcname="images")
+
+    for archive_path in (zip_path, tar_path):
+        shard_dir = tmp_path / archive_path.name.replace(".", "-")
+        images = shards.iter_source(archive_path, strip_components=1)
+        shards.pack(images, shard_dir)
+        store = shards.ShardStore(shard_dir, check_interval=0)
+        assert {path: store.get(path) for path in IMAGES} == IMAGES
+
+
+def test_duplicate_paths_keep_the_first_image(tmp_path):
+    images = [("a.jpg", b"first"), ("a.jpg", b"second"), ("b.jpg", b"b")]
+    manifest = shards.pack(iter(images), tmp_path)
+    store = shards.ShardStore(tmp_path, check_interval=0)
+    assert manifest["images"] == 2
+    assert store.get("a.jpg") == b"first"
+
+
+def test_repack_replaces_files_and_keeps_open_stores_readable(tmp_path):
+    first = shards.pack(iter([("a.jpg", b"old-a"), ("b.jpg", b"old-b")]), tmp_path)
+    # A store that does not check the manifest again keeps the old pack.
+    stale = shards.ShardStore(tmp_path, check_interval=3600)
+    fresh = shards.ShardStore(tmp_path, check_interval=0)
+    assert stale.get("a.jpg") == fresh.get("a.jpg") == b"old-a"
+
+    second = shards.pack(iter([("a.jpg", b"new-a"), ("c.jpg", b"new-c")]), tmp_path)
+    assert second["pack"] != first["pack"]
+    assert _pack_files(tmp_path) == {
+        shards.MANIFEST_NAME,
+        *shards._pack_files(second),
+    }
+
+    assert stale.get("a.jpg") == b"old-a"
+    assert stale.get("b.jpg") == b"old-b"
+    assert fresh.get("a.jpg") == b"new-a"
+    assert fresh.get("b.jpg") is None
+    assert fresh.get("c.jpg") == b"new-c"
+    assert fresh.pack_id("a.jpg") == second["pack"]
+
+    stale.reload()
+    assert stale.get("a.jpg") == b"new-a"
+    assert stale.get("b.jpg") is None
+
+
+def test_back_to_back_packs_do_not_clobber_each_other(tmp_path):
+    manifests = [
+        shards.pack(iter([("a.jpg", f"v{i}".encode())]), tmp_path) for i in range(3)
+    ]
+    assert len({manifest["pack"] for manifest in manifests}) == 3
+    store = shards.ShardStore(tmp_path, check_interval=0)
+    assert store.get("a.jpg") == b"v2"
+
+
+def test_missing_or_broken_manifest_is_an_empty_store(tmp_path):
+    store = shards.ShardStore(tmp_path / "absent", check_interval=0)
+    assert len(store) == 0
+    assert store.get("a.jpg") is None
+    assert list(store.iter_entries()) == []
+
+    manifest = shards.pack(iter([("a.jpg", b"a")]), tmp_path)
+    store = shards.ShardStore(tmp_path, check_interval=0)
+    assert store.get("a.jpg") == b"a"
+    (tmp_path / manifest["keys"]).unlink()
+    broken = {**manifest, "images": 0, "note": "keys removed"}
+    (tmp_path / shards.MANIFEST_NAME).write_text(json.dumps(broken), encoding="utf-8")
+    assert len(store) == 0
+    assert store.get("a.jpg") is None
+
+
+def test_failed_pack_leaves_the_current_pack(tmp_path):
+    shards.pack(iter([("a.jpg", b"a")]), tmp_path)
+    before = _pack_files(tmp_path)
+
+    def images():
+        yield "b.jpg", b"b"
+        raise RuntimeError("source went away")
+
+    with pytest.raises(RuntimeError):
+        shards.pack(images(), tmp_path)
+    assert _pack_files(tmp_path) == before
+    store = shards.ShardStore(tmp_path, check_interval=0)
+    assert store.get("a.jpg") == b"a"
+    assert store.get("b.jpg") is None
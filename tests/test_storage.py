@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from car_picker.app import storage
+
+
+def _response(i: int) -> dict:
+    return {
+        "session_id": f"s{i // 4}",
+        "timestamp": f"2024-05-01T10:00:{i % 60:02d}+00:00",
+        "question_idx": i % 4,
+        "image_path": f"Kia/Kia_Soul_2012_{i}.jpg",
+        "selected_make_en": "Kia",
+        "selected_model_en": 'Soul "EV", 2nd gen' if i % 3 == 0 else "Soul",
+        "selected_year": 2012,
+        "selected_variant": "쏘울" if i % 2 else "",
+        "correct_make_en": "Kia",
+        "correct_model_en": "Soul",
+        "correct_year": 2012,
+        "correct_variant": "",
+        "is_correct": int(i % 3 != 0),
+        "score_after_question": i,
+        "response_time_sec": round(0.25 + i / 8, 2),
+    }
+
+
+def _summary(i: int) -> dict:
+    return {
+        "session_id": f"s{i}",
+        "timestamp": f"2024-05-01T11:00:{i % 60:02d}+00:00",
+        "total_questions": 4,
+        "correct_answers": i % 5,
+        "total_score": i * 10,
+        "total_time_sec": round(3.5 + i, 2),
+        "average_response_time_sec": round(0.875 + i / 4, 2),
+        "difficulty": "hard" if i % 2 else "easy",
+        "ended_early": i % 2,
+    }
+
+
+def _log(backend: storage.LogBackend, n_responses: int, n_summaries: int) -> None:
+    writer = storage._LogWriter(backend, batch_size=7, durability="flush")
+    for i in range(n_responses):
+        writer.log_response(_response(i))
+        if i % 4 == 3 and i // 4 < n_summaries:
+            writer.log_summary(_summary(i // 4))
+    writer.close()
+
+
+def _db_rows(db_path: Path) -> dict:
+    with sqlite3.connect(db_path) as conn:
+        return {
+            table: conn.execute(
+                f"SELECT {', '.join(columns)} FROM {table} ORDER BY rowid"
+            ).fetchall()
+            for table, columns in storage.TABLES.items()
+        }
+
+
+@pytest.mark.parametrize("rotate_bytes", [0, 2_000])
+def test_csv_logs_migrate_to_the_rows_sqlite_would_hold(tmp_path, rotate_bytes):
+    paths = {
+        "quiz_log": tmp_path / "quiz_log.csv",
+        "summary": tmp_path / "summary.csv",
+    }
+    segment_dir = tmp_path / "segments"
+    csv_backend = storage.CsvBackend(
+        paths, segment_dir, rotate_bytes=rotate_bytes, rotate_daily=False
+    )
+    _log(csv_backend, 60, 15)
+    if rotate_bytes:
+        assert storage.segment_paths("quiz_log", segment_dir)
+
+    migrated = tmp_path / "migrated.sqlite3"
+    imported = storage.migrate_csv_to_sqlite(migrated, paths, segment_dir, 16)
+    assert imported == {"quiz_log": 60, "summary": 15}
+
+    direct = tmp_path / "direct.sqlite3"
+    _log(storage.SQLiteBackend(direct), 60, 15)
+    rows = _db_rows(migrated)
+    assert rows == _db_rows(direct)
+
+    first = dict(zip(storage.QUIZ_LOG_COLUMNS, rows["quiz_log"][0]))
+    assert first["selected_model_en"] == 'Soul "EV", 2nd gen'
+    assert first["question_idx"] == 0
+    assert first["response_time_sec"] == 0.25
+    assert first["selected_year"] == "2012"
+    summary = dict(zip(storage.SUMMARY_COLUMNS, rows["summary"][-1]))
+    assert summary == _summary(14)
+
+
+def test_writer_keeps_rows_across_rotations(tmp_path):
+    paths = {
+        "quiz_log": tmp_path / "quiz_log.csv",
+        "summary": tmp_path / "summary.csv",
+    }
+    segment_dir = tmp_path / "segments"
+    backend = storage.CsvBackend(
+        paths, segment_dir, rotate_bytes=1_000, rotate_daily=False
+    )
+    _log(backend, 40, 0)
+    sources = storage.csv_sources("quiz_log", paths, segment_dir)
+    assert len(sources) > 2
+    read = []
+    for source in sources:
+        lines = source.read_text(encoding="utf-8").splitlines()
+        assert lines[0] == ",".join(storage.QUIZ_LOG_COLUMNS)
+        read.extend(line.split(",")[3] for line in lines[1:])
+    assert read == [_response(i)["image_path"] for i in range(40)]